@@ -43,11 +43,13 @@ from collections import OrderedDict
 from cookielib import MozillaCookieJar
 from datetime import datetime
 from getpass import getpass
+from itertools import chain
 from itertools import cycle
 from threading import Event
 from threading import Thread
 import base64
 import glob
+import hashlib
 import json
 import locale
 import os.path
@@ -55,6 +57,7 @@ import re
 import subprocess
 import sys
 import time
+import urllib
 import urlparse
 import webbrowser
 
@@ -204,6 +207,67 @@ class Settings(dict):
         return data
 
 
+class ETagCache(object):
+    """
+    Bodies of GET responses kept by their ETag under ~/.deis/etags
+
+    A request repeated with the kept ETag in If-None-Match lets the
+    controller answer 304 Not Modified instead of sending the body again.
+    Only the most recently used bodies are kept.
+    """
+
+    MAX_ENTRIES = 100
+    # operations and long polls change too often to be worth keeping, and
+    # config values may hold secrets that should not be left on disk
+    UNCACHEABLE = re.compile(r'/operations(/|\?|$)|/config(\?|$)|[?&]wait=')
+
+    def __init__(self):
+        self._path = os.path.expanduser('~/.deis/etags')
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path, 0700)
+
+    def _file(self, url):
+        return os.path.join(self._path, hashlib.sha1(url).hexdigest())
+
+    def cacheable(self, url):
+        """
+        Whether responses to a URL may be kept
+        """
+        return not self.UNCACHEABLE.search(url)
+
+    def get(self, url):
+        """
+        Return the {'etag', 'content'} kept for a URL, or None
+        """
+        try:
+            with open(self._file(url)) as f:
+                cached = json.load(f)
+            # mark it used, so it is among the last dropped
+            os.utime(self._file(url), None)
+            return cached
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, url, etag, content):
+        """
+        Keep the body of a response to a URL along with its ETag, dropping
+        the least recently used bodies past MAX_ENTRIES
+        """
+        tmp = self._file(url) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'etag': etag, 'content': content.decode('utf-8')}, f)
+        os.rename(tmp, self._file(url))
+        files = [os.path.join(self._path, name) for name in os.listdir(self._path)
+                 if not name.endswith('.tmp')]
+        if len(files) > self.MAX_ENTRIES:
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.MAX_ENTRIES]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
 _counter = 0
 
 
@@ -361,8 +425,9 @@ class DeisClient(object):
     def __init__(self):
         self._session = Session()
         self._settings = Settings()
+        self._etags = ETagCache()
 
-    def _dispatch(self, method, path, body=None, **kwargs):
+    def _dispatch(self, method, path, body=None, stream=False, **kwargs):
         """
         Dispatch an API request to the active Deis controller
         """
@@ -376,9 +441,98 @@ class DeisClient(object):
             raise EnvironmentError(
                 'No active controller. Use `deis login` or `deis register` to get started.')
         url = urlparse.urljoin(controller, path, **kwargs)
-        response = func(url, data=body, headers=headers)
+        cacheable = method.lower() == 'get' and not stream and self._etags.cacheable(url)
+        cached = self._etags.get(url) if cacheable else None
+        if cached:
+            headers['If-None-Match'] = cached['etag']
+        response = func(url, data=body, headers=headers, stream=stream)
+        if cached and response.status_code == requests.codes.not_modified:  # @UndefinedVariable
+            # nothing changed since the kept copy, so answer with that
+            response.status_code = requests.codes.ok  # @UndefinedVariable
+            response._content = cached['content'].encode('utf-8')
+        elif (cacheable and 'ETag' in response.headers and
+                response.status_code == requests.codes.ok):  # @UndefinedVariable
+            self._etags.set(url, response.headers['ETag'], response.content)
         return response
 
+    def _list(self, path):
+        """
+        List a paginated API collection
+
+        The first page is fetched right away, so any error is raised before
+        output starts. The iterator returned yields every result, fetching
+        each later page by the `next` cursor of the one before only once the
+        results so far have been consumed.
+        """
+        response = self._dispatch('get', path)
+        if response.status_code != requests.codes.ok:  # @UndefinedVariable
+            raise ResponseError(response)
+        return self._follow(response.json())
+
+    def _wait(self, response):
+        """
+        Wait for the operation a response started to finish
+
+        The operation is long-polled until it succeeds, returning it, or
+        fails, raising its error. A controller too busy to hold the poll
+        open is asked again after the delay it gives.
+        """
+        url = response.headers['x-deis-operation']
+        while True:
+            response = self._dispatch('get', url + '?wait=30')
+            if response.status_code == requests.codes.unavailable:  # @UndefinedVariable
+                # the controller has no room to wait right now, so come back
+                time.sleep(int(response.headers.get('retry-after', 1)))
+                continue
+            if response.status_code != requests.codes.ok:  # @UndefinedVariable
+                raise ResponseError(response)
+            operation = response.json()
+            if operation['state'] == 'succeeded':
+                return operation
+            if operation['state'] == 'failed':
+                raise EnvironmentError(operation['error'])
+
+    def _watch(self, app, response):
+        """
+        Watch an application's events until the operation a response started finishes
+
+        Yields each event the controller streams, reconnecting from the last
+        one seen whenever a stream ends. Returns straight away if the
+        controller cannot stream events.
+        """
+        url = response.headers['x-deis-operation']
+        path = '/api/apps/{}/events?operation={}'.format(app, response.json()['uuid'])
+        last = None
+        while True:
+            stream = self._dispatch(
+                'get', path + ('&last={}'.format(last) if last else ''), stream=True)
+            if stream.status_code != requests.codes.ok:  # @UndefinedVariable
+                return
+            # read a byte at a time so each event shows as soon as it arrives
+            for line in stream.iter_lines(chunk_size=1):
+                if not line.startswith('data: '):
+                    continue
+                event = json.loads(line[6:])
+                last = event['id']
+                yield event
+            # the stream ends when the operation does, or when it timed out
+            operation = self._dispatch('get', url)
+            if operation.status_code != requests.codes.ok:  # @UndefinedVariable
+                raise ResponseError(operation)
+            if operation.json()['state'] in ('succeeded', 'failed'):
+                return
+
+    def _follow(self, data):
+        while True:
+            for item in data['results']:
+                yield item
+            if not data.get('next'):
+                return
+            response = self._dispatch('get', data['next'])
+            if response.status_code != requests.codes.ok:  # @UndefinedVariable
+                raise ResponseError(response)
+            data = response.json()
+
     def apps(self, args):
         """
         Valid commands for apps:
@@ -522,14 +676,10 @@ class DeisClient(object):
 
         Usage: deis apps:list
         """
-        response = self._dispatch('get', '/api/apps')
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            data = response.json()
-            print('=== Apps')
-            for item in data['results']:
-                print('{id}'.format(**item))
-        else:
-            raise ResponseError(response)
+        apps = self._list('/api/apps')
+        print('=== Apps')
+        for item in apps:
+            print('{id}'.format(**item))
 
     def apps_info(self, args):
         """
@@ -592,16 +742,53 @@ class DeisClient(object):
         Options:
           -a --app=<app>
             the uniquely identifiable name for the application.
+          -f --follow
+            keep printing log events as they are logged.
+          --since=<time>
+            only show log events since a UTC time, or a duration ago such as 10m, 2h or 1d.
+          --until=<time>
+            only show log events until a UTC time, or a duration ago.
+          --ps=<process>
+            only show log events from a process type, such as web, or a process, such as web.1.
         """
         app = args.get('--app')
         if not app:
             app = self._session.app
-        response = self._dispatch('post',
-                                  "/api/apps/{}/logs".format(app))
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            sys.stdout.write(response.json())
-        else:
+        filters = dict((param, args[option]) for param, option in (
+            ('since', '--since'), ('until', '--until'), ('process', '--ps'))
+            if args.get(option))
+        if args.get('--follow') and ('until' in filters or 'process' in filters):
+            raise DocoptExit('--follow can only be combined with --since')
+        path = "/api/apps/{}/logs".format(app)
+        query = '?' + urllib.urlencode(filters) if filters else ''
+        response = self._dispatch('post', path + query)
+        if response.status_code != requests.codes.ok:  # @UndefinedVariable
             raise ResponseError(response)
+        sys.stdout.write(response.json())
+        sys.stdout.flush()
+        offset = int(response.headers['x-deis-log-offset'])
+        while args.get('--follow'):
+            # each request streams what is logged for a while, then ends
+            response = self._dispatch(
+                'post', path + '?follow=1&offset={}'.format(offset), stream=True)
+            if response.status_code == requests.codes.unavailable:  # @UndefinedVariable
+                # the controller is serving all the streams it can, so poll for now
+                time.sleep(int(response.headers.get('retry-after', 1)))
+            elif response.status_code != requests.codes.ok:  # @UndefinedVariable
+                raise ResponseError(response)
+            else:
+                # read a byte at a time so each line shows as soon as it arrives
+                for byte in response.iter_content(chunk_size=1):
+                    offset += len(byte)
+                    sys.stdout.write(byte)
+                    if byte == '\n':
+                        sys.stdout.flush()
+            # catch up from the offset, or start over if the logs were rotated
+            response = self._dispatch('post', path + '?offset={}'.format(offset))
+            if response.status_code != requests.codes.ok:  # @UndefinedVariable
+                raise ResponseError(response)
+            sys.stdout.write(response.json())
+            offset = int(response.headers['x-deis-log-offset'])
 
     def apps_run(self, args):
         """
@@ -624,8 +811,9 @@ class DeisClient(object):
         response = self._dispatch('post',
                                   "/api/apps/{}/run".format(app),
                                   json.dumps(body))
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            rc, output = json.loads(response.content)
+        if response.status_code == requests.codes.accepted:  # @UndefinedVariable
+            result = json.loads(self._wait(response)['result'])
+            rc, output = result['rc'], result['output']
             sys.stdout.write(output)
             sys.stdout.flush()
             sys.exit(rc)
@@ -820,10 +1008,12 @@ class DeisClient(object):
             progress = TextProgress()
             progress.start()
             response = self._dispatch('post', "/api/apps/{}/builds".format(app), json.dumps(body))
+            if response.status_code == requests.codes.accepted:  # @UndefinedVariable
+                self._wait(response)
         finally:
             progress.cancel()
             progress.join()
-        if response.status_code == requests.codes.created:  # @UndefinedVariable
+        if response.status_code == requests.codes.accepted:  # @UndefinedVariable
             version = response.headers['x-deis-release']
             print("done, v{}".format(version))
         else:
@@ -842,14 +1032,10 @@ class DeisClient(object):
         app = args.get('--app')
         if not app:
             app = self._session.app
-        response = self._dispatch('get', "/api/apps/{}/builds".format(app))
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            print("=== {} Builds".format(app))
-            data = response.json()
-            for item in data['results']:
-                print("{0[uuid]:<23} {0[created]}".format(item))
-        else:
-            raise ResponseError(response)
+        builds = self._list("/api/apps/{}/builds".format(app))
+        print("=== {} Builds".format(app))
+        for item in builds:
+            print("{0[uuid]:<23} {0[created]}".format(item))
 
     def clusters(self, args):
         """
@@ -943,14 +1129,10 @@ class DeisClient(object):
 
         Usage: deis clusters:list
         """
-        response = self._dispatch('get', '/api/clusters')
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            data = response.json()
-            print("=== Clusters")
-            for item in data['results']:
-                print("{id}".format(**item))
-        else:
-            raise ResponseError(response)
+        clusters = self._list('/api/clusters')
+        print("=== Clusters")
+        for item in clusters:
+            print("{id}".format(**item))
 
     def clusters_destroy(self, args):
         """
@@ -1126,12 +1308,17 @@ class DeisClient(object):
             progress = TextProgress()
             progress.start()
             response = self._dispatch('post', "/api/apps/{}/config".format(app), json.dumps(body))
+            if response.status_code == requests.codes.accepted:  # @UndefinedVariable
+                self._wait(response)
         finally:
             progress.cancel()
             progress.join()
-        if response.status_code == requests.codes.created:  # @UndefinedVariable
+        if response.status_code == requests.codes.accepted:  # @UndefinedVariable
             version = response.headers['x-deis-release']
             print("done, v{}\n".format(version))
+            response = self._dispatch('get', "/api/apps/{}/config".format(app))
+            if response.status_code != requests.codes.ok:  # @UndefinedVariable
+                raise ResponseError(response)
             config = response.json()
             values = json.loads(config['values'])
             print("=== {}".format(app))
@@ -1171,12 +1358,17 @@ class DeisClient(object):
             progress = TextProgress()
             progress.start()
             response = self._dispatch('post', "/api/apps/{}/config".format(app), json.dumps(body))
+            if response.status_code == requests.codes.accepted:  # @UndefinedVariable
+                self._wait(response)
         finally:
             progress.cancel()
             progress.join()
-        if response.status_code == requests.codes.created:  # @UndefinedVariable
+        if response.status_code == requests.codes.accepted:  # @UndefinedVariable
             version = response.headers['x-deis-release']
             print("done, v{}\n".format(version))
+            response = self._dispatch('get', "/api/apps/{}/config".format(app))
+            if response.status_code != requests.codes.ok:  # @UndefinedVariable
+                raise ResponseError(response)
             config = response.json()
             values = json.loads(config['values'])
             print("=== {}".format(app))
@@ -1332,18 +1524,14 @@ class DeisClient(object):
         app = args.get('--app')
         if not app:
             app = self._session.app
-        response = self._dispatch(
-            'get', "/api/apps/{app}/domains".format(app=app))
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            domains = response.json()['results']
-            print("=== {} Domains".format(app))
-            if len(domains) == 0:
-                print('No domains')
-                return
-            for domain in domains:
-                print(domain['domain'])
-        else:
-            raise ResponseError(response)
+        domains = self._list("/api/apps/{app}/domains".format(app=app))
+        print("=== {} Domains".format(app))
+        domain = next(domains, None)
+        if domain is None:
+            print('No domains')
+            return
+        for domain in chain([domain], domains):
+            print(domain['domain'])
 
     def ps(self, args):
         """
@@ -1372,14 +1560,10 @@ class DeisClient(object):
             app = args.get('--app')
             if not app:
                 app = self._session.app
-        response = self._dispatch('get',
-                                  "/api/apps/{}/containers".format(app))
-        if response.status_code != requests.codes.ok:  # @UndefinedVariable
-            raise ResponseError(response)
-        processes = response.json()
+        processes = self._list("/api/apps/{}/containers".format(app))
         print("=== {} Processes".format(app))
         c_map = {}
-        for item in processes['results']:
+        for item in processes:
             c_map.setdefault(item['type'], []).append(item)
         print()
         for c_type in c_map.keys():
@@ -1416,17 +1600,16 @@ class DeisClient(object):
             body.update({typ: int(count)})
         sys.stdout.write('Scaling processes... but first, coffee!\n')
         sys.stdout.flush()
-        try:
-            progress = TextProgress()
-            progress.start()
-            before = time.time()
-            response = self._dispatch('post',
-                                      "/api/apps/{}/scale".format(app),
-                                      json.dumps(body))
-        finally:
-            progress.cancel()
-            progress.join()
-        if response.status_code == requests.codes.no_content:  # @UndefinedVariable
+        before = time.time()
+        response = self._dispatch('post',
+                                  "/api/apps/{}/scale".format(app),
+                                  json.dumps(body))
+        if response.status_code == requests.codes.accepted:  # @UndefinedVariable
+            # show each container change as it happens
+            for event in self._watch(app, response):
+                if event['kind'] == 'container':
+                    print('{name}: {source} -> {state}'.format(**event))
+            self._wait(response)
             print('done in {}s'.format(int(time.time() - before)))
             self.ps_list({}, app)
         else:
@@ -1526,19 +1709,16 @@ class DeisClient(object):
 
         Usage: deis keys:list
         """
-        response = self._dispatch('get', '/api/keys')
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            data = response.json()
-            if data['count'] == 0:
-                print('No keys found')
-                return
-            print("=== {owner} Keys".format(**data['results'][0]))
-            for key in data['results']:
-                public = key['public']
-                print("{0} {1}...{2}".format(
-                    key['id'], public[0:16], public[-10:]))
-        else:
-            raise ResponseError(response)
+        keys = self._list('/api/keys')
+        key = next(keys, None)
+        if key is None:
+            print('No keys found')
+            return
+        print("=== {owner} Keys".format(**key))
+        for key in chain([key], keys):
+            public = key['public']
+            print("{0} {1}...{2}".format(
+                key['id'], public[0:16], public[-10:]))
 
     def keys_remove(self, args):
         """
@@ -1724,15 +1904,11 @@ class DeisClient(object):
         app = args.get('--app')
         if not app:
             app = self._session.app
-        response = self._dispatch('get', "/api/apps/{app}/releases".format(**locals()))
-        if response.status_code == requests.codes.ok:  # @UndefinedVariable
-            print("=== {} Releases".format(app))
-            data = response.json()
-            for item in data['results']:
-                item['created'] = readable_datetime(item['created'])
-                print("v{version:<6} {created:<24} {summary}".format(**item))
-        else:
-            raise ResponseError(response)
+        releases = self._list("/api/apps/{app}/releases".format(**locals()))
+        print("=== {} Releases".format(app))
+        for item in releases:
+            item['created'] = readable_datetime(item['created'])
+            print("v{version:<6} {created:<24} {summary}".format(**item))
 
     def releases_rollback(self, args):
         """
@@ -1768,11 +1944,13 @@ class DeisClient(object):
             progress = TextProgress()
             progress.start()
             response = self._dispatch('post', url, json.dumps(body))
+            if response.status_code == requests.codes.accepted:  # @UndefinedVariable
+                self._wait(response)
         finally:
             progress.cancel()
             progress.join()
-        if response.status_code == requests.codes.created:  # @UndefinedVariable
-            new_version = response.json()['version']
+        if response.status_code == requests.codes.accepted:  # @UndefinedVariable
+            new_version = response.headers['x-deis-release']
             print("done, v{}".format(new_version))
         else:
             raise ResponseError(response)
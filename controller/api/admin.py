@@ -10,12 +10,14 @@ from django.contrib import admin
 from guardian.admin import GuardedModelAdmin
 
 from .models import App
+from .models import AppAccess
 from .models import Build
 from .models import Cluster
 from .models import Config
 from .models import Container
 from .models import Domain
 from .models import Key
+from .models import Operation
 from .models import Release
 
 
@@ -26,9 +28,20 @@ class AppAdmin(GuardedModelAdmin):
     date_hierarchy = 'created'
     list_display = ('id', 'owner', 'cluster')
     list_filter = ('owner', 'cluster')
+    list_select_related = ('owner', 'cluster')
 admin.site.register(App, AppAdmin)
 
 
+class AppAccessAdmin(admin.ModelAdmin):
+    """Set presentation options for :class:`~api.models.AppAccess` models
+    in the Django admin.
+    """
+    list_display = ('app', 'user', 'role')
+    list_filter = ('role', 'user')
+    list_select_related = ('app', 'user')
+admin.site.register(AppAccess, AppAccessAdmin)
+
+
 class BuildAdmin(admin.ModelAdmin):
     """Set presentation options for :class:`~api.models.Build` models
     in the Django admin.
@@ -36,6 +49,7 @@ class BuildAdmin(admin.ModelAdmin):
     date_hierarchy = 'created'
     list_display = ('created', 'owner', 'app')
     list_filter = ('owner', 'app')
+    list_select_related = ('owner', 'app')
 admin.site.register(Build, BuildAdmin)
 
 
@@ -46,6 +60,7 @@ class ClusterAdmin(admin.ModelAdmin):
     date_hierarchy = 'created'
     list_display = ('id', 'owner', 'domain')
     list_filter = ('owner',)
+    list_select_related = ('owner',)
 admin.site.register(Cluster, ClusterAdmin)
 
 
@@ -56,6 +71,7 @@ class ConfigAdmin(admin.ModelAdmin):
     date_hierarchy = 'created'
     list_display = ('created', 'owner', 'app')
     list_filter = ('owner', 'app')
+    list_select_related = ('owner', 'app')
 admin.site.register(Config, ConfigAdmin)
 
 
@@ -66,6 +82,7 @@ class ContainerAdmin(admin.ModelAdmin):
     date_hierarchy = 'created'
     list_display = ('short_name', 'owner', 'app', 'state')
     list_filter = ('owner', 'app', 'state')
+    list_select_related = ('owner', 'app')
 admin.site.register(Container, ContainerAdmin)
 
 
@@ -76,6 +93,7 @@ class DomainAdmin(admin.ModelAdmin):
     date_hierarchy = 'created'
     list_display = ('owner', 'app', 'domain')
     list_filter = ('owner', 'app')
+    list_select_related = ('owner', 'app')
 admin.site.register(Domain, DomainAdmin)
 
 
@@ -86,9 +104,21 @@ class KeyAdmin(admin.ModelAdmin):
     date_hierarchy = 'created'
     list_display = ('id', 'owner', '__str__')
     list_filter = ('owner',)
+    list_select_related = ('owner',)
 admin.site.register(Key, KeyAdmin)
 
 
+class OperationAdmin(admin.ModelAdmin):
+    """Set presentation options for :class:`~api.models.Operation` models
+    in the Django admin.
+    """
+    date_hierarchy = 'created'
+    list_display = ('created', 'type', 'state', 'owner', 'app')
+    list_filter = ('type', 'state', 'app')
+    list_select_related = ('owner', 'app')
+admin.site.register(Operation, OperationAdmin)
+
+
 class ReleaseAdmin(admin.ModelAdmin):
     """Set presentation options for :class:`~api.models.Release` models
     in the Django admin.
@@ -97,4 +127,5 @@ class ReleaseAdmin(admin.ModelAdmin):
     list_display = ('created', 'version', 'owner', 'app')
     list_display_links = ('created', 'version')
     list_filter = ('owner', 'app')
+    list_select_related = ('owner', 'app')
 admin.site.register(Release, ReleaseAdmin)
@@ -0,0 +1,107 @@
+"""
+Live events for an application, carried over Redis pub/sub.
+
+Container state transitions, operation progress, new releases and logged
+app events are published to a channel per app as they happen, so clients
+can watch them instead of re-listing. Each event is numbered and the most
+recent are kept in a short backlog, so a client that reconnects can pass
+the last number it saw and miss nothing in between.
+
+Events are a convenience: when Redis is not configured or cannot be
+reached, publishing silently does nothing.
+"""
+
+from __future__ import unicode_literals
+import json
+import time
+
+import redis
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+_client = None
+
+
+def _key(app_id, suffix=None):
+    key = 'deis:events:{}'.format(app_id)
+    return '{}:{}'.format(key, suffix) if suffix else key
+
+
+def _get_client():
+    global _client
+    url = getattr(settings, 'EVENTS_URL', None)
+    if not url:
+        return None
+    if _client is None:
+        _client = redis.StrictRedis.from_url(url)
+    return _client
+
+
+def publish(app_id, kind, **data):
+    """
+    Publish an event of the given kind to an app's channel
+    """
+    client = _get_client()
+    if client is None:
+        return
+    backlog = settings.EVENTS_BACKLOG
+    try:
+        data.update({'id': client.incr(_key(app_id, 'seq')), 'kind': kind,
+                     'time': timezone.now()})
+        event = json.dumps(data, cls=DjangoJSONEncoder)
+        pipe = client.pipeline(transaction=False)
+        pipe.rpush(_key(app_id, 'backlog'), event)
+        pipe.ltrim(_key(app_id, 'backlog'), -backlog, -1)
+        pipe.publish(_key(app_id), event)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def subscribe(app_id, last=None, timeout=30):
+    """
+    Return an iterator of the events published to an app's channel, as dicts.
+
+    With last, events after that number still in the backlog come first.
+    The iterator ends once no event has arrived for timeout seconds, or
+    soon after it has been open that long. Raises EnvironmentError when
+    events are unavailable.
+    """
+    url = getattr(settings, 'EVENTS_URL', None)
+    if not url:
+        raise EnvironmentError('Events are not configured')
+    # a connection of its own, whose reads give up after the timeout
+    client = redis.StrictRedis.from_url(url, socket_timeout=timeout)
+    pubsub = client.pubsub()
+    try:
+        pubsub.subscribe(_key(app_id))
+        # subscribing first means nothing published meanwhile is missed
+        backlog = client.lrange(_key(app_id, 'backlog'), 0, -1) if last is not None else []
+    except redis.RedisError as e:
+        pubsub.close()
+        raise EnvironmentError('Events are unavailable: {}'.format(e))
+    return _listen(pubsub, backlog, last or 0, time.time() + timeout)
+
+
+def _listen(pubsub, backlog, last, deadline):
+    try:
+        for event in (json.loads(e) for e in backlog):
+            if event['id'] > last:
+                last = event['id']
+                yield event
+        for message in pubsub.listen():
+            if message['type'] != 'message':
+                continue
+            event = json.loads(message['data'])
+            if event['id'] > last:
+                last = event['id']
+                yield event
+            if time.time() > deadline:
+                return
+    except redis.RedisError:
+        # the read timed out, or the connection dropped
+        return
+    finally:
+        pubsub.close()
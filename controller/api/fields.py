@@ -3,14 +3,31 @@ Deis API custom fields for representing data in Django forms.
 """
 
 from __future__ import unicode_literals
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from django import forms
-from django.db import models
+from django.db import connections, models, router
+
+
+def format_uuid(value):
+    """Return a UUID in the dashed form the API shows, whatever form it is stored in."""
+    if not value:
+        return value
+    try:
+        return str(UUID(value))
+    except ValueError:
+        return value
 
 
 class UuidField(models.CharField):
-    """A univerally unique ID field."""
+    """A univerally unique ID field.
+
+    PostgreSQL stores the value in its native 16-byte uuid type, in which it
+    is read back in its dashed form. Elsewhere it is stored as 32 hex digits,
+    which exactly fill the char(32) column, and dashed values are compacted
+    on their way into the database, so foreign keys join on the same compact
+    form. Lookups match either form, and the API always shows the dashed one.
+    """
 
     description = __doc__
 
@@ -21,23 +38,44 @@ class UuidField(models.CharField):
         kwargs.setdefault('unique', True)
         super(UuidField, self).__init__(*args, **kwargs)
 
+    @staticmethod
+    def is_native(connection):
+        """Return True if the backend has a native uuid column type."""
+        return connection is not None and 'postgres' in connection.vendor
+
     def db_type(self, connection=None):
         """Return the database column type for a UuidField."""
-        if connection and 'postgres' in connection.vendor:
+        if self.is_native(connection):
             return 'uuid'
         else:
             return "char({})".format(self.max_length)
 
+    def get_db_prep_value(self, value, connection, prepared=False):
+        """Compact dashed UUIDs for backends that store them as hex."""
+        value = super(UuidField, self).get_db_prep_value(value, connection, prepared)
+        if value and len(value) == 36 and not self.is_native(connection):
+            try:
+                value = UUID(value).hex
+            except ValueError:
+                pass
+        return value
+
     def pre_save(self, model_instance, add):
         """Initialize an empty field with a new UUID before it is saved."""
         value = getattr(model_instance, self.get_attname(), None)
         if not value and add:
-            uuid = str(uuid4())
+            connection = connections[router.db_for_write(
+                model_instance.__class__, instance=model_instance)]
+            uuid = str(uuid4()) if self.is_native(connection) else uuid4().hex
             setattr(model_instance, self.get_attname(), uuid)
             return uuid
         else:
             return super(UuidField, self).pre_save(model_instance, add)
 
+    def value_to_string(self, obj):
+        """Serialize the value in its dashed form on every backend."""
+        return format_uuid(self._get_val_from_obj(obj))
+
     def formfield(self, **kwargs):
         """Tell forms how to represent this UuidField."""
         kwargs.update({
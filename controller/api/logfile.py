@@ -0,0 +1,254 @@
+"""
+Reading the aggregated log file of an application.
+
+Log files only ever grow, until they are rotated, so rather than reading
+a whole file or forking `tail`, the end of a file is found by seeking
+backwards from EOF a block at a time, and byte offsets into the file
+serve as cursors that later reads continue from.
+
+Lines are written in time order, so a sparse index of the time logged at
+regular offsets lets a search for a time range binary search its way to
+the few blocks that cover it rather than reading the whole file.
+"""
+
+import bisect
+import os
+import re
+import time
+from datetime import datetime
+
+
+# the logger starts each line with the time and the app's process, as in
+# "2014-08-15 12:41:25 host myapp[web.1]: message"
+TIME_RE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) ')
+PROCESS_RE = re.compile(r'^\S+ \S+ \S+ [-a-z0-9]+\[([a-z0-9.]+)\]')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def tail(path, lines, block_size=4096):
+    """
+    Return the last lines of a file, and the offset of its end
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = pos = f.tell()
+        data = b''
+        # read back until the start of the file, or one newline past the
+        # lines wanted so the first of them is known to be whole
+        while pos > 0 and data.count(b'\n') <= lines:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    # a final newline ends the last line rather than starting another
+    start = len(data) - 1 if data.endswith(b'\n') else len(data)
+    for _ in range(lines):
+        start = data.rfind(b'\n', 0, start)
+        if start == -1:
+            break
+    return data[start + 1:], end
+
+
+def read(path, offset, limit, lines=1000, block_size=4096):
+    """
+    Return what was written to a file after offset, and the offset it ends at
+
+    At most limit bytes are read, cut back to the last whole line, so a
+    reader far behind catches up over several reads. A file now shorter
+    than offset was rotated, so its last lines are returned instead.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < offset:
+            return tail(path, lines, block_size)
+        f.seek(offset)
+        data = f.read(limit)
+    if len(data) == limit and b'\n' in data:
+        data = data[:data.rfind(b'\n') + 1]
+    return data, offset + len(data)
+
+
+def follow(path, offset, timeout, interval=1, block_size=4096):
+    """
+    Yield what is written to a file after offset as it is written
+
+    The file is held open and checked for more every interval seconds.
+    Stops after timeout seconds, or once the file is rotated.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        deadline = time.time() + timeout
+        while True:
+            data = f.read(block_size)
+            if data:
+                yield data
+                continue
+            if time.time() >= deadline or _rotated(path, f):
+                return
+            time.sleep(interval)
+
+
+def _rotated(path, f):
+    """Whether the open file f is no longer, or no longer all of, the file at path."""
+    try:
+        current = os.stat(path)
+    except OSError:
+        return True
+    opened = os.fstat(f.fileno())
+    return current.st_ino != opened.st_ino or opened.st_size < f.tell()
+
+
+def _parse_time(line):
+    """Return the time a log line was logged, or None for a line that does not say."""
+    match = TIME_RE.match(line)
+    if match is None:
+        return None
+    try:
+        return datetime.strptime(match.group(1), TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def _matches_process(line, process):
+    """Whether a line was logged by a process, like web.1, or any of a type, like web."""
+    match = PROCESS_RE.match(line)
+    return match is not None and (
+        match.group(1) == process or match.group(1).startswith(process + '.'))
+
+
+def _next_entry(f, offset):
+    """
+    Return the (time, offset) of the first whole, timed line starting at or
+    after offset, or None if there is none yet
+    """
+    if offset > 0:
+        # skip to the start of the next line, unless offset is one already
+        f.seek(offset - 1)
+        offset += len(f.readline()) - 1
+    else:
+        f.seek(0)
+    while True:
+        line = f.readline()
+        if not line.endswith(b'\n'):
+            return None
+        logged = _parse_time(line)
+        if logged is not None:
+            return logged, offset
+        offset += len(line)
+
+
+def _load_index(index_path):
+    entries = []
+    try:
+        with open(index_path, 'rb') as f:
+            for line in f:
+                try:
+                    offset, logged = line.rstrip(b'\n').split(b' ', 1)
+                    entry = datetime.strptime(logged, TIME_FORMAT), int(offset)
+                except ValueError:
+                    continue
+                # a concurrent update may have appended the same entries again
+                if not entries or entry[1] > entries[-1][1]:
+                    entries.append(entry)
+    except IOError:
+        pass
+    return entries
+
+
+def index(path, index_path, interval=64 * 1024):
+    """
+    Bring the sparse time index of a log file up to date, and return it
+
+    The index holds the (time, offset) of the first timed line at or after
+    every interval bytes of the log. It is kept in a file of its own that is
+    only appended to as the log grows, and started over once the log is
+    rotated. Finding each entry costs one seek, so the log is never read
+    through.
+    """
+    entries = _load_index(index_path)
+    new = []
+    with open(path, 'rb') as f:
+        if entries and _next_entry(f, entries[-1][1]) != entries[-1]:
+            entries = []
+            if os.path.exists(index_path):
+                os.remove(index_path)
+        offset = (entries[-1][1] // interval + 1) * interval if entries else 0
+        while True:
+            entry = _next_entry(f, offset)
+            if entry is None:
+                break
+            new.append(entry)
+            offset = (entry[1] // interval + 1) * interval
+    if new:
+        if not os.path.isdir(os.path.dirname(index_path)):
+            os.makedirs(os.path.dirname(index_path))
+        with open(index_path, 'ab') as f:
+            f.write(b''.join('{} {}\n'.format(offset, logged.strftime(TIME_FORMAT))
+                             for logged, offset in new))
+    return entries + new
+
+
+def _reversed_lines(f, start, stop, limit, block_size=4096):
+    """
+    Yield the lines of a file between offsets start and stop, last first,
+    reading back a block at a time and at most limit bytes
+    """
+    pos, rest = stop, b''
+    while pos > start and stop - pos < limit:
+        step = min(block_size, pos - start)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + rest
+        if pos > start:
+            # the first line read may have begun in an earlier block
+            cut = data.find(b'\n') + 1
+            if not cut:
+                rest = data
+                continue
+            rest, data = data[:cut], data[cut:]
+        pieces = data.split(b'\n')
+        if pieces[-1]:
+            yield pieces[-1]
+        for piece in reversed(pieces[:-1]):
+            yield piece + b'\n'
+
+
+def search(path, index_path, since=None, until=None, process=None, lines=1000,
+           interval=64 * 1024, limit=1024 * 1024, block_size=4096):
+    """
+    Return the last lines of a file logged between since and until, by
+    process when given, and the offset of the file's end
+
+    The file is read back from the index entry after until, or from its
+    end, until enough lines match, a line older than since is reached, or
+    limit bytes have been read. Lines that carry no time belong with the
+    line before them.
+    """
+    entries = index(path, index_path, interval)
+    times = [logged for logged, _ in entries]
+    start, stop = 0, None
+    if since is not None:
+        i = bisect.bisect_left(times, since)
+        start = entries[i - 1][1] if i > 0 else 0
+    if until is not None:
+        i = bisect.bisect_right(times, until)
+        stop = entries[i][1] if i < len(entries) else None
+    matched, pending = [], []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        stop = end if stop is None else stop
+        for line in _reversed_lines(f, start, stop, limit, block_size):
+            pending.append(line)
+            logged = _parse_time(line)
+            if logged is None:
+                continue
+            if since is not None and logged < since:
+                break
+            if ((until is None or logged <= until) and
+                    (process is None or _matches_process(line, process))):
+                matched.extend(pending)
+                if len(matched) >= lines:
+                    break
+            pending = []
+    return b''.join(reversed(matched[:lines])), end
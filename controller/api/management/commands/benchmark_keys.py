@@ -0,0 +1,131 @@
+"""
+Compare join keys: dashed and hex UUID strings, native uuids and integers.
+
+For each key type the command builds a parent table and a child table with
+an indexed foreign key column, and fills both with the same number of rows.
+It reports the size of the key indexes and the latency of point joins and a
+full grouped join, then rolls everything back::
+
+    ./manage.py benchmark_keys --parents 10000 --children 8
+
+The native uuid type is only measured on PostgreSQL. Index sizes come from
+pg_relation_size on PostgreSQL, and from the dbstat table where SQLite has
+it compiled in.
+"""
+
+from __future__ import unicode_literals
+import random
+import time
+import uuid
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from api.management.commands.benchmark_queries import Rollback
+
+
+# (name, column type, new key) for each way of storing a key; integer
+# keys are numbered instead
+KEY_TYPES = (
+    ('char(36) dashed', 'char(36)', lambda: str(uuid.uuid4())),
+    ('char(32) hex', 'char(32)', lambda: uuid.uuid4().hex),
+    ('native uuid', 'uuid', lambda: str(uuid.uuid4())),
+    ('integer', 'integer', None),
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare index size and join latency for UUID and integer keys'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--parents', type='int', default=10000,
+                    help='parent rows to seed per key type'),
+        make_option('--children', type='int', default=8,
+                    help='child rows to seed per parent'),
+        make_option('--samples', type='int', default=500,
+                    help='point joins to time per key type'),
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError('Rolling back created tables needs PostgreSQL or SQLite')
+        results = []
+        try:
+            with transaction.atomic():
+                cursor = connection.cursor()
+                for n, (name, column_type, new_key) in enumerate(KEY_TYPES):
+                    if column_type == 'uuid' and connection.vendor != 'postgresql':
+                        continue
+                    results.append((name,) + self.measure(
+                        cursor, 'bench_keys_{}'.format(n), column_type, new_key, options))
+                raise Rollback()
+        except Rollback:
+            pass
+        self.stdout.write('{:<18}{:>16}{:>16}{:>16}{:>16}'.format(
+            'key', 'pk index (KB)', 'fk index (KB)', 'point join (ms)', 'full join (ms)'))
+        for name, pk_size, fk_size, point, full in results:
+            self.stdout.write('{:<18}{:>16}{:>16}{:>16.3f}{:>16.1f}'.format(
+                name, self.kilobytes(pk_size), self.kilobytes(fk_size), point, full))
+
+    def measure(self, cursor, prefix, column_type, new_key, options):
+        """
+        Seed one key type's tables and return its index sizes and join timings
+        """
+        parent, child = prefix + '_parent', prefix + '_child'
+        cursor.execute('CREATE TABLE {} (pk {} PRIMARY KEY, name varchar(64) NOT NULL)'.format(
+            parent, column_type))
+        cursor.execute('CREATE TABLE {} (id integer PRIMARY KEY, parent {} NOT NULL, '
+                       'num integer NOT NULL)'.format(child, column_type))
+        cursor.execute('CREATE INDEX {0}_parent ON {0} (parent)'.format(child))
+        if new_key is None:
+            keys = range(1, options['parents'] + 1)
+        else:
+            keys = [new_key() for _ in range(options['parents'])]
+        cursor.executemany('INSERT INTO {} (pk, name) VALUES (%s, %s)'.format(parent),
+                           [(key, 'app-{}'.format(i)) for i, key in enumerate(keys)])
+        cursor.executemany(
+            'INSERT INTO {} (id, parent, num) VALUES (%s, %s, %s)'.format(child),
+            [(i * options['children'] + num + 1, key, num)
+             for i, key in enumerate(keys) for num in range(options['children'])])
+        cursor.execute('ANALYZE')
+        samples = [random.choice(keys) for _ in range(options['samples'])]
+        start = time.time()
+        for key in samples:
+            cursor.execute('SELECT c.id, c.num, p.name FROM {} c JOIN {} p ON p.pk = c.parent '
+                           'WHERE p.pk = %s'.format(child, parent), [key])
+            cursor.fetchall()
+        point = (time.time() - start) * 1000 / len(samples)
+        start = time.time()
+        cursor.execute('SELECT p.name, COUNT(*) FROM {} p JOIN {} c ON c.parent = p.pk '
+                       'GROUP BY p.name'.format(parent, child))
+        cursor.fetchall()
+        full = (time.time() - start) * 1000
+        if connection.vendor == 'postgresql':
+            pk_index = parent + '_pkey'
+        elif column_type == 'integer':
+            # an integer primary key is SQLite's rowid and needs no index
+            pk_index = None
+        else:
+            pk_index = 'sqlite_autoindex_{}_1'.format(parent)
+        return (self.index_size(cursor, pk_index),
+                self.index_size(cursor, child + '_parent'), point, full)
+
+    def index_size(self, cursor, index):
+        """
+        Return the size of an index in bytes, or None if it cannot be measured
+        """
+        if index is None:
+            return 0
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_relation_size(%s)', [index])
+            return cursor.fetchone()[0]
+        try:
+            cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [index])
+        except DatabaseError:
+            return None
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def kilobytes(size):
+        return 'n/a' if size is None else '{:.0f}'.format(size / 1024.0)
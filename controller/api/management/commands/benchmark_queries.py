@@ -0,0 +1,149 @@
+"""
+Time the controller's hot queries against a large seeded database.
+
+The command seeds users, apps and their history inside a transaction. It shows
+the plan and timing of each query shape with the composite indexes, drops them,
+shows the same again, then rolls everything back::
+
+    ./manage.py benchmark_queries --apps 10000
+
+Dropping indexes inside a transaction needs transactional DDL, so run it
+against PostgreSQL or SQLite after migrating.
+"""
+
+from __future__ import unicode_literals
+import random
+import time
+import uuid
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from south.db import db
+
+from api.models import App, Build, Cluster, Config, Container, Release
+
+
+PROCESS_TYPES = ('web', 'worker')
+
+
+class Rollback(Exception):
+    """Raised to throw away everything the benchmark seeded."""
+
+
+# (name, queryset for an app) for each query the controller runs per app
+QUERY_SHAPES = (
+    ('containers of a type', lambda app: Container.objects.filter(
+        app=app, type='web').order_by('created')),
+    ('container counts by type', lambda app: Container.objects.filter(app=app).order_by().values(
+        'type').annotate(count=Count('uuid'), max_num=Max('num'))),
+    ('container by number', lambda app: Container.objects.filter(app=app, type='web', num=1)),
+    ('latest build', lambda app: Build.objects.filter(app=app).order_by('-created')[:1]),
+    ('latest config', lambda app: Config.objects.filter(app=app).order_by('-created')[:1]),
+    ('latest release', lambda app: Release.objects.filter(app=app).order_by('-created')[:1]),
+)
+
+
+def composite_indexes():
+    """
+    Return (table, columns) for every index_together on the benchmarked models
+    """
+    for model in (Container, Build, Config, Release):
+        for fields in model._meta.index_together:
+            yield model._meta.db_table, [model._meta.get_field(f).column for f in fields]
+
+
+class Command(BaseCommand):
+    help = "Time the controller's per-app queries with and without composite indexes"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--apps', type='int', default=10000,
+                    help='number of apps to seed'),
+        make_option('--releases', type='int', default=5,
+                    help='builds, configs and releases to seed per app'),
+        make_option('--containers', type='int', default=8,
+                    help='containers to seed per app'),
+        make_option('--samples', type='int', default=200,
+                    help='apps each query is timed against'),
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError('Dropping indexes in a transaction needs PostgreSQL or SQLite')
+        try:
+            with transaction.atomic():
+                apps = self.seed(options)
+                samples = random.sample(apps, min(options['samples'], len(apps)))
+                with_indexes = self.measure(samples, 'with composite indexes')
+                for table, columns in composite_indexes():
+                    db.delete_index(table, columns)
+                without_indexes = self.measure(samples, 'without composite indexes')
+                raise Rollback()
+        except Rollback:
+            pass
+        self.stdout.write('\n{:<28}{:>14}{:>14}'.format('query', 'without (ms)', 'with (ms)'))
+        for name, _ in QUERY_SHAPES:
+            self.stdout.write('{:<28}{:>14.3f}{:>14.3f}'.format(
+                name, without_indexes[name], with_indexes[name]))
+
+    def seed(self, options):
+        """
+        Bulk insert the apps and their history, returning the apps
+        """
+        self.stdout.write('Seeding {apps} apps...'.format(**options))
+        owner = User.objects.create(username='bench-{}'.format(uuid.uuid4().hex[:16]))
+        cluster = Cluster.objects.create(owner=owner, id=owner.username, domain='bench.local',
+                                         hosts='', auth='', type='mock')
+        apps = [App(owner=owner, cluster=cluster, id='{}-{}'.format(owner.username, i))
+                for i in range(options['apps'])]
+        App.objects.bulk_create(apps, batch_size=1000)
+        builds, configs, releases, containers = [], [], [], []
+        for app in apps:
+            for version in range(1, options['releases'] + 1):
+                build = Build(owner=owner, app=app, image='deis/bench')
+                config = Config(owner=owner, app=app, values={})
+                builds.append(build)
+                configs.append(config)
+                releases.append(Release(owner=owner, app=app, version=version,
+                                        build=build, config=config))
+            for num in range(options['containers']):
+                containers.append(Container(
+                    owner=owner, app=app, release=releases[-1],
+                    type=PROCESS_TYPES[num % len(PROCESS_TYPES)],
+                    num=num // len(PROCESS_TYPES) + 1))
+        # each bulk insert fills in the uuids of its rows, which the rows
+        # pointing at them have to pick up before they are inserted
+        Build.objects.bulk_create(builds, batch_size=1000)
+        Config.objects.bulk_create(configs, batch_size=1000)
+        for release in releases:
+            release.build_id, release.config_id = release.build.pk, release.config.pk
+        Release.objects.bulk_create(releases, batch_size=1000)
+        for container in containers:
+            container.release_id = container.release.pk
+        Container.objects.bulk_create(containers, batch_size=1000)
+        return apps
+
+    def measure(self, apps, label):
+        """
+        Print each query shape's plan and return its mean time in milliseconds
+        """
+        cursor = connection.cursor()
+        cursor.execute('ANALYZE')
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN ANALYZE '
+        self.stdout.write('\n=== {}'.format(label))
+        timings = {}
+        for name, shape in QUERY_SHAPES:
+            sql, params = shape(apps[0]).query.sql_with_params()
+            cursor.execute(explain + sql, params)
+            self.stdout.write('\n--- {}'.format(name))
+            for row in cursor.fetchall():
+                self.stdout.write('    ' + ' '.join(str(col) for col in row))
+        for name, shape in QUERY_SHAPES:
+            querysets = [shape(app) for app in apps]
+            start = time.time()
+            for queryset in querysets:
+                list(queryset)
+            timings[name] = (time.time() - start) * 1000 / len(apps)
+        return timings
@@ -0,0 +1,31 @@
+"""
+Delete app history outside of each app's retention policy.
+
+Celery beat runs the same pruning on the CELERYBEAT_SCHEDULE; this command
+runs it by hand, for every app or just the ones named::
+
+    ./manage.py prune_history myapp
+"""
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import App
+
+
+class Command(BaseCommand):
+    args = '[app ...]'
+    help = "Delete releases, builds, configs and pushes outside each app's retention policy"
+
+    def handle(self, *app_ids, **options):
+        apps = App.objects.order_by('uuid')
+        if app_ids:
+            apps = apps.filter(id__in=app_ids)
+            missing = set(app_ids) - set(apps.values_list('id', flat=True))
+            if missing:
+                raise CommandError('No such app: {}'.format(', '.join(sorted(missing))))
+        for app in apps.iterator():
+            pruned = app.prune()
+            self.stdout.write('{}: {}'.format(app.id, ', '.join(
+                '{} {}'.format(v, k) for k, v in sorted(pruned.items()))))
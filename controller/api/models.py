@@ -6,24 +6,31 @@ Data models for the Deis API.
 
 from __future__ import unicode_literals
 import etcd
+import gzip
+import hashlib
 import importlib
+import json
 import logging
 import os
-import subprocess
+import threading
+from datetime import timedelta
 
-from celery.canvas import group
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models, connections
-from django.db.models import Max
+from django.core import serializers
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Count, Max
 from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django_fsm import FSMField, transition
 from django_fsm.signals import post_transition
 from json_field.fields import JSONField
 
-from api import fields, tasks
+from api import events, fields, logfile, tasks
 from registry import publish_release
 from utils import dict_diff, fingerprint
 
@@ -32,22 +39,49 @@ logger = logging.getLogger(__name__)
 
 
 def log_event(app, msg, level=logging.INFO):
+    events.publish(app.id, 'log', level=logging.getLevelName(level), message=msg)
     msg = "{}: {}".format(app.id, msg)
     logger.log(level, msg)
 
 
-def close_db_connections(func, *args, **kwargs):
+def _prune(queryset, archive=None):
     """
-    Decorator to close db connections during threaded execution
+    Delete the rows of a queryset oldest first, a batch at a time.
 
-    Note this is necessary to work around:
-    https://code.djangoproject.com/ticket/22420
+    Each batch starts after the last row of the one before by (created, pk),
+    so no batch rescans what was already deleted. If archive names a file,
+    every batch is appended to it before it is deleted. Returns the number
+    of rows deleted.
     """
-    def _inner(*args, **kwargs):
-        func(*args, **kwargs)
-        for conn in connections.all():
-            conn.close()
-    return _inner
+    model, deleted, last = queryset.model, 0, None
+    while True:
+        batch = queryset.order_by('created', 'pk')
+        if last is not None:
+            batch = batch.filter(models.Q(created__gt=last.created) |
+                                 models.Q(created=last.created, pk__gt=last.pk))
+        batch = list(batch[:settings.RETENTION_BATCH_SIZE])
+        if not batch:
+            return deleted
+        if archive:
+            _archive(archive, batch)
+        model.objects.filter(pk__in=[obj.pk for obj in batch]).delete()
+        deleted += len(batch)
+        last = batch[-1]
+
+
+def _archive(path, objs):
+    """Append model instances to a gzipped file as JSON, one per line."""
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with gzip.open(path, 'ab') as f:
+        for record in serializers.serialize('python', objs):
+            f.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+
+
+# scheduler clients are shared process-wide, keyed by cluster id and a
+# hash of the cluster's settings so edits always yield a fresh client
+_schedulers = {}
+_schedulers_lock = threading.Lock()
 
 
 class AuditedModel(models.Model):
@@ -79,6 +113,7 @@ class Cluster(UuidAuditedModel):
 
     CLUSTER_TYPES = (('mock', 'Mock Cluster'),
                      ('coreos', 'CoreOS Cluster'),
+                     ('fleet_api', 'Fleet API Cluster'),
                      ('faulty', 'Faulty Cluster'))
 
     owner = models.ForeignKey(settings.AUTH_USER_MODEL)
@@ -94,10 +129,18 @@ class Cluster(UuidAuditedModel):
         return self.id
 
     def _get_scheduler(self, *args, **kwargs):
-        module_name = 'scheduler.' + self.type
-        mod = importlib.import_module(module_name)
-        return mod.SchedulerClient(self.id, self.hosts, self.auth,
-                                   self.domain, self.options)
+        settings_hash = hashlib.sha1(json.dumps(
+            [self.type, self.hosts, self.auth, self.domain, self.options],
+            sort_keys=True)).hexdigest()
+        key = (self.id, settings_hash)
+        with _schedulers_lock:
+            client = _schedulers.get(key)
+            if client is None:
+                module_name = 'scheduler.' + self.type
+                mod = importlib.import_module(module_name)
+                client = _schedulers[key] = mod.SchedulerClient(
+                    self.id, self.hosts, self.auth, self.domain, self.options)
+        return client
 
     _scheduler = property(_get_scheduler)
 
@@ -124,6 +167,26 @@ class App(UuidAuditedModel):
     id = models.SlugField(max_length=64, unique=True)
     cluster = models.ForeignKey('Cluster')
     structure = JSONField(default='{}', blank=True)
+    # rolling deploy settings for the whole app, optionally overridden per
+    # process type, e.g. {"batch_size": 4, "web": {"max_surge": 1}}
+    strategy = JSONField(default='{}', blank=True)
+    # history kept when the app is pruned, e.g. {"releases": 20, "archive": true}
+    retention = JSONField(default='{}', blank=True)
+    # the newest release, kept up to date by Release.save
+    current_release = models.ForeignKey('Release', null=True, blank=True, related_name='+',
+                                        on_delete=models.SET_NULL)
+
+    # batch_size: containers of a process type replaced per batch (0 for all)
+    # max_surge: containers per batch started before their old one is
+    #   destroyed; the rest of the batch is replaced in place
+    STRATEGY_OPTIONS = ('batch_size', 'max_surge')
+
+    # releases: how many of the newest releases to keep (0 for all)
+    # archive: whether pruned rows are saved to DEIS_ARCHIVE_DIR first
+    RETENTION_OPTIONS = ('releases', 'archive')
+
+    # one-off containers only outlive their command if its worker died
+    ADMIN_CONTAINER_TTL = timedelta(days=1)
 
     class Meta:
         permissions = (('use_app', 'Can use app'),)
@@ -131,6 +194,14 @@ class App(UuidAuditedModel):
     def __str__(self):
         return self.id
 
+    def save(self, *args, **kwargs):
+        # current_release is only ever moved by Release.save, so never write
+        # back a copy of it that may have gone stale in memory
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [f.name for f in self._meta.fields
+                                       if not f.primary_key and f.name != 'current_release']
+        return super(App, self).save(*args, **kwargs)
+
     def create(self, *args, **kwargs):
         config = Config.objects.create(owner=self.owner, app=self, values={})
         build = Build.objects.create(owner=self.owner, app=self, image=settings.DEFAULT_BUILD)
@@ -141,8 +212,14 @@ class App(UuidAuditedModel):
             c.destroy()
         return super(App, self).delete(*args, **kwargs)
 
-    def deploy(self, release, initial=False):
-        tasks.deploy_release.delay(self, release).get()
+    def deploy(self, release, initial=False, operation=None):
+        # a deploy always rolls out the app's newest release
+        self.current_release = release
+        # each batch must come up before the next one is touched
+        batches = self._rollout(self.container_set.order_by('num'))
+        for i, (batch, in_place) in enumerate(batches, 1):
+            self._fan_out(tasks.chunk(tasks.deploy_containers, batch, release, in_place),
+                          operation, 'deploying batch {} of {}'.format(i, len(batches)))
         if initial:
             # if there is no SHA, assume a docker image is being promoted
             if not release.build.sha:
@@ -157,68 +234,204 @@ class App(UuidAuditedModel):
             else:
                 self.structure = {'web': 1}
             self.save()
-            self.scale()
+            self.scale(operation=operation)
 
     def destroy(self, *args, **kwargs):
         return self.delete(*args, **kwargs)
 
-    def scale(self, **kwargs):  # noqa
-        """Scale containers up or down to match requested."""
-        requested_containers = self.structure.copy()
-        release = self.release_set.latest()
-        # test for available process types
-        available_process_types = release.build.procfile or {}
-        for container_type in requested_containers.keys():
+    def check_structure(self, structure):
+        """Raise EnvironmentError unless the current build has every process type."""
+        available_process_types = self.current_release.build.procfile or {}
+        for container_type in structure.keys():
             if container_type == 'cmd':
                 continue  # allow docker cmd types in case we don't have the image source
             if not container_type in available_process_types:
                 raise EnvironmentError(
                     'Container type {} does not exist in application'.format(container_type))
+
+    def scale(self, operation=None, **kwargs):  # noqa
+        """Scale containers up or down to match requested."""
+        requested_containers = self.structure.copy()
+        release = self.current_release
+        # test for available process types
+        self.check_structure(requested_containers)
         msg = 'Containers scaled ' + ' '.join(
             "{}={}".format(k, v) for k, v in requested_containers.items())
-        # iterate and scale by container type (web, worker, etc)
+        # count and number the containers of every process type in one query
+        current = dict((row['type'], row) for row in self.container_set.order_by().values(
+            'type').annotate(count=Count('uuid'), max_num=Max('num')))
         changed = False
-        to_add, to_remove = [], []
-        for container_type in requested_containers.keys():
-            containers = list(self.container_set.filter(type=container_type).order_by('created'))
-            # increment new container nums off the most recent container
-            results = self.container_set.filter(type=container_type).aggregate(Max('num'))
-            container_num = (results.get('num__max') or 0) + 1
-            requested = requested_containers.pop(container_type)
-            diff = requested - len(containers)
+        to_add, to_shrink = [], {}
+        for container_type, requested in requested_containers.items():
+            row = current.get(container_type, {'count': 0, 'max_num': 0})
+            diff = requested - row['count']
             if diff == 0:
                 continue
             changed = True
-            while diff < 0:
-                c = containers.pop()
-                to_remove.append(c)
-                diff += 1
-            while diff > 0:
-                c = Container.objects.create(owner=self.owner,
-                                             app=self,
-                                             release=release,
-                                             type=container_type,
-                                             num=container_num)
-                to_add.append(c)
-                container_num += 1
-                diff -= 1
+            if diff < 0:
+                to_shrink[container_type] = -diff
+            # increment new container nums off the most recent container
+            container_num = (row['max_num'] or 0) + 1
+            to_add.extend(Container(owner=self.owner,
+                                    app=self,
+                                    release=release,
+                                    type=container_type,
+                                    num=container_num + n) for n in range(diff))
+        # remove the most recent containers of each type scaled down
+        to_remove = []
+        if to_shrink:
+            for c in self.container_set.filter(type__in=to_shrink.keys()).order_by('-created'):
+                if to_shrink[c.type]:
+                    to_remove.append(c)
+                    to_shrink[c.type] -= 1
+        if to_add:
+            Container.objects.bulk_create(to_add)
         if changed:
-            subtasks = []
-            if to_add:
-                subtasks.append(tasks.start_containers.s(to_add))
-            if to_remove:
-                subtasks.append(tasks.stop_containers.s(to_remove))
-            group(*subtasks).apply_async().join()
+            try:
+                self._fan_out(tasks.chunk(tasks.start_containers, to_add) +
+                              tasks.chunk(tasks.stop_containers, to_remove),
+                              operation, 'scaling')
+            finally:
+                # containers scaled away are dropped even if their jobs failed to stop
+                if to_remove:
+                    Container.objects.filter(uuid__in=[c.uuid for c in to_remove]).delete()
             log_event(self, msg)
         return changed
 
-    def logs(self):
-        """Return aggregated log data for this application."""
+    def _rollout(self, containers):
+        """
+        Split containers into the batches of a rolling deploy.
+
+        Process types roll in parallel, each by its own strategy. Returns a
+        list of (containers, in_place) batches where in_place holds the uuids
+        of containers whose old job is destroyed before the new one starts.
+        """
+        by_type = {}
+        for c in containers:
+            by_type.setdefault(c.type, []).append(c)
+        batches = []
+        for c_type, group in sorted(by_type.items()):
+            strategy = dict((k, v) for k, v in self.strategy.items() if k in self.STRATEGY_OPTIONS)
+            strategy.update(self.strategy.get(c_type, {}))
+            size = strategy.get('batch_size') or len(group)
+            surge = strategy.get('max_surge', size)
+            for i, start in enumerate(range(0, len(group), size)):
+                if i == len(batches):
+                    batches.append(([], []))
+                batch = group[start:start + size]
+                batches[i][0].extend(batch)
+                batches[i][1].extend(c.uuid for c in batch[surge:])
+        return batches
+
+    def _fan_out(self, subtasks, operation=None, phase=None):
+        """
+        Run chunked container subtasks across the workers, reporting any
+        failures, and the phase and outcome to the operation if there is one.
+        """
+        if operation:
+            operation.report(phase)
+        summary = tasks.fan_out(subtasks)
+        if operation:
+            operation.report(phase, summary)
+        if summary['failed']:
+            failed = ', '.join('{} ({})'.format(*f) for f in summary['failed'])
+            log_event(self, 'Containers failed: {}'.format(failed), logging.ERROR)
+            raise EnvironmentError('{} of {} containers failed: {}'.format(
+                len(summary['failed']), len(summary['failed']) + len(summary['done']), failed))
+        return summary
+
+    def _log_path(self):
         path = os.path.join(settings.DEIS_LOG_DIR, self.id + '.log')
         if not os.path.exists(path):
             raise EnvironmentError('Could not locate logs')
-        data = subprocess.check_output(['tail', '-n', str(settings.LOG_LINES), path])
-        return data
+        return path
+
+    def logs(self, offset=None):
+        """
+        Return aggregated log data for this application, and the offset it ends at.
+
+        Without an offset, the last LOG_LINES lines are returned; with one,
+        only what was logged after it.
+        """
+        path = self._log_path()
+        if offset is None:
+            return logfile.tail(path, settings.LOG_LINES, settings.LOG_BLOCK_SIZE)
+        return logfile.read(path, offset, settings.LOG_MAX_READ,
+                            settings.LOG_LINES, settings.LOG_BLOCK_SIZE)
+
+    def search_logs(self, since=None, until=None, process=None):
+        """
+        Return the last LOG_LINES lines logged between since and until, by
+        process when given, and the offset the logs end at. At most
+        LOG_MAX_READ bytes are searched.
+
+        Times are naive and in UTC, like those the logger writes.
+        """
+        index_path = os.path.join(settings.DEIS_LOG_INDEX_DIR, self.id + '.idx')
+        return logfile.search(self._log_path(), index_path, since, until, process,
+                              settings.LOG_LINES, settings.LOG_INDEX_INTERVAL,
+                              settings.LOG_MAX_READ, settings.LOG_BLOCK_SIZE)
+
+    def follow_logs(self, offset, timeout):
+        """Return an iterator of what is logged after offset as it is logged."""
+        return logfile.follow(self._log_path(), offset, timeout,
+                              block_size=settings.LOG_BLOCK_SIZE)
+
+    def prune(self):
+        """
+        Delete the history that falls outside this app's retention policy.
+
+        Options missing from the app's policy fall back to RETENTION_RELEASES
+        and RETENTION_ARCHIVE. Returns the number of rows deleted per model.
+        """
+        policy = {'releases': settings.RETENTION_RELEASES, 'archive': settings.RETENTION_ARCHIVE}
+        policy.update((k, v) for k, v in self.retention.items() if k in self.RETENTION_OPTIONS)
+        now = timezone.now()
+        archive = None
+        if policy['archive']:
+            archive = os.path.join(settings.DEIS_ARCHIVE_DIR, '{}-{}.jsonl.gz'.format(
+                self.id, now.strftime('%Y%m%d%H%M%S')))
+        pruned = {'container': _prune(self.container_set.filter(
+            type='admin', created__lt=now - self.ADMIN_CONTAINER_TTL), archive)}
+        if policy['releases']:
+            pruned.update(self._prune_releases(policy['releases'], archive))
+        log_event(self, 'History pruned: {}'.format(
+            ', '.join('{} {}'.format(v, k) for k, v in sorted(pruned.items()))))
+        return pruned
+
+    def _prune_releases(self, keep, archive=None):
+        """
+        Delete all but the newest releases, keeping any a container runs,
+        along with the builds, configs and pushes older than those left.
+        """
+        newest = list(self.release_set.order_by('-version').values_list('pk', 'created')[:keep])
+        if len(newest) < keep:
+            return {}
+        # rows newer than the oldest kept release are never touched, so
+        # nothing a push or config change is still creating can be caught
+        old = {'app': self, 'created__lt': newest[-1][1]}
+        in_use = set(pk for pk, _ in newest)
+        in_use.update(self.container_set.values_list('release', flat=True))
+        pruned = {
+            'release': _prune(Release.objects.filter(**old).exclude(pk__in=in_use), archive),
+            'build': _prune(Build.objects.filter(release=None, **old), archive),
+        }
+        # configs are deltas against a snapshot, so keep every config that
+        # the values of one still in use are derived from
+        used = dict(Config.objects.filter(
+            models.Q(release__isnull=False) | models.Q(created__gte=old['created__lt']),
+            app=self).values_list('pk', 'base'))
+        bases = set(base for base in used.values() if base)
+        parents = dict(Config.objects.filter(base__in=bases).values_list('pk', 'parent'))
+        needed = set(used) | bases
+        for pk in used:
+            while pk in parents:
+                pk = parents[pk]
+                needed.add(pk)
+        pruned['config'] = _prune(
+            Config.objects.filter(release=None, **old).exclude(pk__in=needed), archive)
+        pruned['push'] = _prune(Push.objects.filter(**old), archive)
+        return pruned
 
     def run(self, command):
         """Run a one-off command in an ephemeral app container."""
@@ -227,13 +440,39 @@ class App(UuidAuditedModel):
         c_num = max([c.num for c in self.container_set.filter(type='admin')] or [0]) + 1
         c = Container.objects.create(owner=self.owner,
                                      app=self,
-                                     release=self.release_set.latest(),
+                                     release=self.current_release,
                                      type='admin',
                                      num=c_num)
         rc, output = tasks.run_command.delay(c, command).get()
         return rc, output
 
 
+@python_2_unicode_compatible
+class AppAccess(models.Model):
+    """
+    A user's access to an app, one row per owner or collaborator.
+
+    This mirrors App.owner and the guardian use_app grants in a table indexed
+    by user, so listing someone's apps is a join rather than a scan of the
+    generic object permissions. Rows go away with their app.
+    """
+
+    OWNER = 'owner'
+    COLLABORATOR = 'collaborator'
+    ROLES = ((OWNER, 'Owner'),
+             (COLLABORATOR, 'Collaborator'))
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    app = models.ForeignKey('App')
+    role = models.CharField(max_length=16, choices=ROLES)
+
+    class Meta:
+        unique_together = (('user', 'app'),)
+
+    def __str__(self):
+        return "{} {} of {}".format(self.user, self.role, self.app)
+
+
 @python_2_unicode_compatible
 class Container(UuidAuditedModel):
     """
@@ -260,7 +499,7 @@ class Container(UuidAuditedModel):
     state = FSMField(default=INITIALIZED, choices=STATE_CHOICES, protected=True)
 
     def short_name(self):
-        return "{}.{}.{}".format(self.release.app.id, self.type, self.num)
+        return "{}.{}.{}".format(self.app.id, self.type, self.num)
     short_name.short_description = 'Name'
 
     def __str__(self):
@@ -269,6 +508,9 @@ class Container(UuidAuditedModel):
     class Meta:
         get_latest_by = '-created'
         ordering = ['created']
+        # containers are looked up by process type, numbered within it and
+        # listed in creation order
+        index_together = (('app', 'type', 'num'), ('app', 'type', 'created'))
 
     def _get_job_id(self):
         app = self.app.id
@@ -297,32 +539,47 @@ class Container(UuidAuditedModel):
     def _command_announceable(self):
         return self._command.lower() in ['start web', '']
 
-    @close_db_connections
+    def _get_job(self):
+        return {'name': self._job_id,
+                'image': self.release.image,
+                'command': self._command,
+                'use_announcer': self._command_announceable()}
+
+    _job = property(_get_job)
+
+    # NOTE: each transition below accepts an optional future, a scheduler call
+    # already queued on this container's behalf (possibly shared with others);
+    # the container then records its outcome instead of calling the scheduler
+
     @transition(field=state, source=INITIALIZED, target=CREATED)
-    def create(self):
+    def create(self, future=None):
+        if future is not None:
+            return future.result()
         image = self.release.image
         self._scheduler.create(name=self._job_id,
                                image=image,
                                command=self._command,
                                use_announcer=self._command_announceable())
 
-    @close_db_connections
     @transition(field=state,
                 source=[CREATED, UP, DOWN],
                 target=UP, crashed=DOWN)
-    def start(self):
+    def start(self, future=None):
+        if future is not None:
+            return future.result()
         self._scheduler.start(self._job_id, self._command_announceable())
 
-    @close_db_connections
     @transition(field=state,
                 source=[INITIALIZED, CREATED, UP, DOWN],
                 target=UP,
                 crashed=DOWN)
-    def deploy(self, release):
+    def deploy(self, release, future=None):
         old_job_id = self._job_id
         # update release
         self.release = release
         self.save()
+        if future is not None:
+            return future.result()
         # deploy new container
         new_job_id = self._job_id
         image = self.release.image
@@ -335,16 +592,18 @@ class Container(UuidAuditedModel):
         # destroy old container
         self._scheduler.destroy(old_job_id, self._command_announceable())
 
-    @close_db_connections
     @transition(field=state, source=UP, target=DOWN)
-    def stop(self):
+    def stop(self, future=None):
+        if future is not None:
+            return future.result()
         self._scheduler.stop(self._job_id, self._command_announceable())
 
-    @close_db_connections
     @transition(field=state,
                 source=[INITIALIZED, CREATED, UP, DOWN],
                 target=DESTROYED)
-    def destroy(self):
+    def destroy(self, future=None):
+        if future is not None:
+            return future.result()
         # TODO: add check for active connections before killing
         self._scheduler.destroy(self._job_id, self._command_announceable())
 
@@ -401,6 +660,7 @@ class Build(UuidAuditedModel):
         get_latest_by = 'created'
         ordering = ['-created']
         unique_together = (('app', 'uuid'),)
+        index_together = (('app', 'created'),)
 
     def __str__(self):
         return "{0}-{1}".format(self.app.id, self.uuid[:7])
@@ -411,20 +671,118 @@ class Config(UuidAuditedModel):
     """
     Set of configuration values applied as environment variables
     during runtime execution of the Application.
+
+    Each config records only what changed since its parent, with a full
+    snapshot every CONFIG_SNAPSHOT_INTERVAL generations, so storage grows
+    with the size of each change. Configs never change once saved, so their
+    materialized values are cached by uuid.
     """
 
     owner = models.ForeignKey(settings.AUTH_USER_MODEL)
     app = models.ForeignKey('App')
-    values = JSONField(default='{}', blank=True)
+    # the full values for a snapshot, or else the keys changed since the
+    # parent config with None marking the ones that were unset
+    data = JSONField(default='{}', blank=True, db_column='values')
+    parent = models.ForeignKey('self', null=True, blank=True, related_name='+',
+                               on_delete=models.SET_NULL)
+    # the snapshot a delta is applied to, and how many deltas lie between
+    base = models.ForeignKey('self', null=True, blank=True, related_name='+',
+                             on_delete=models.SET_NULL)
+    depth = models.PositiveIntegerField(default=0)
 
     class Meta:
         get_latest_by = 'created'
         ordering = ['-created']
         unique_together = (('app', 'uuid'),)
+        index_together = (('app', 'created'),)
+
+    def __init__(self, *args, **kwargs):
+        self._values = None
+        super(Config, self).__init__(*args, **kwargs)
 
     def __str__(self):
         return "{}-{}".format(self.app.id, self.uuid[:7])
 
+    @staticmethod
+    def _cache_key(pk):
+        return 'api.config.values.{}'.format(pk)
+
+    def _get_values(self):
+        if self._values is None:
+            self._values = cache.get(self._cache_key(self.pk)) if self.pk else None
+            if self._values is None:
+                self._values = self._materialize()
+                if self.pk:
+                    cache.set(self._cache_key(self.pk), self._values, None)
+        return self._values
+
+    def _set_values(self, values):
+        # stored as a snapshot until save() finds a parent to diff against
+        self._values = dict(values)
+        self.data = self._values
+
+    values = property(_get_values, _set_values)
+
+    def _materialize(self):
+        """Apply the chain of deltas between this config and its snapshot."""
+        if not self.depth:
+            return dict(self.data)
+        deltas = [self.data]
+        values = cache.get(self._cache_key(self.parent_id))
+        if values is None:
+            # load the whole family of the snapshot at once and walk it back
+            chain = dict((c.pk, c) for c in Config.objects.filter(
+                models.Q(pk=self.base_id) | models.Q(base=self.base_id)).only(
+                'uuid', 'data', 'parent', 'depth'))
+            config = chain[self.parent_id]
+            while config.depth:
+                deltas.append(config.data)
+                config = chain[config.parent_id]
+            values = config.data
+        values = dict(values)
+        for delta in reversed(deltas):
+            for k, v in delta.items():
+                if v is None:
+                    values.pop(k, None)
+                else:
+                    values[k] = v
+        return values
+
+    def changes(self):
+        """
+        Return the keys added, changed and deleted since the parent config,
+        in the form of :func:`api.utils.dict_diff`.
+        """
+        old = self.parent.values if self.parent_id else {}
+        if not self.depth:
+            return dict_diff(self.values, old)
+        diff = {'added': {}, 'changed': {}, 'deleted': {}}
+        for k, v in self.data.items():
+            if v is None:
+                diff['deleted'][k] = old[k]
+            elif k in old:
+                diff['changed'][k] = v
+            else:
+                diff['added'][k] = v
+        return dict((k, diff[k]) for k in diff if diff[k])
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self._values is not None:
+            parent = self.parent if self.parent_id else None
+            if parent and parent.depth + 1 < settings.CONFIG_SNAPSHOT_INTERVAL:
+                old = parent.values
+                delta = dict((k, v) for k, v in self._values.items()
+                             if k not in old or old[k] != v)
+                delta.update((k, None) for k in old if k not in self._values)
+                self.data = delta
+                self.base_id = parent.base_id if parent.depth else parent.pk
+                self.depth = parent.depth + 1
+            else:
+                self.data, self.base, self.depth = self._values, None, 0
+        super(Config, self).save(*args, **kwargs)
+        if self._values is not None:
+            cache.set(self._cache_key(self.pk), self._values, None)
+
 
 @python_2_unicode_compatible
 class Release(UuidAuditedModel):
@@ -448,6 +806,7 @@ class Release(UuidAuditedModel):
         get_latest_by = 'created'
         ordering = ['-created']
         unique_together = (('app', 'version'),)
+        index_together = (('app', 'created'),)
 
     def __str__(self):
         return "{0}-v{1}".format(self.app.id, self.version)
@@ -497,55 +856,216 @@ class Release(UuidAuditedModel):
 
         :return: the previous :class:`Release`, or None
         """
-        releases = self.app.release_set
-        if self.pk:
-            releases = releases.exclude(pk=self.pk)
+        if not self.pk:
+            # a release being created follows the app's current one
+            return self.app.current_release
         try:
             # Get the Release previous to this one
-            prev_release = releases.latest()
+            prev_release = self.app.release_set.filter(version__lt=self.version).latest('version')
         except Release.DoesNotExist:
             prev_release = None
         return prev_release
 
+    def _config_changes(self, old_config):
+        """Return the dict_diff of this release's config against old_config."""
+        if old_config and self.config.parent_id == old_config.pk:
+            # a config made from the last one already knows its changes
+            return self.config.changes()
+        return dict_diff(self.config.values, old_config.values if old_config else {})
+
+    def _config_summary(self, old_config):
+        """Describe the config keys added, changed and deleted since old_config."""
+        diff = self._config_changes(old_config)
+        # try to be as succinct as possible
+        added = ', '.join(k for k in diff.get('added', {}))
+        added = 'added ' + added if added else ''
+        changed = ', '.join(k for k in diff.get('changed', {}))
+        changed = 'changed ' + changed if changed else ''
+        deleted = ', '.join(k for k in diff.get('deleted', {}))
+        deleted = 'deleted ' + deleted if deleted else ''
+        return ', '.join(i for i in (added, changed, deleted) if i)
+
+    def _summarize(self):
+        """Describe what this release changed since the one before it."""
+        summary = ''
+        prev_release = self.previous()
+        # compare this build to the previous build
+        old_build = prev_release.build if prev_release else None
+        # if the build changed, log it and who pushed it
+        if self.version == 1:
+            summary += "{} created initial release".format(self.app.owner)
+        elif self.build != old_build:
+            if self.build.sha:
+                summary += "{} deployed {}".format(self.build.owner, self.build.sha[:7])
+            else:
+                summary += "{} deployed {}".format(self.build.owner, self.build.image)
+        # compare this config to the previous config
+        old_config = prev_release.config if prev_release else None
+        # if the config data changed, log the dict diff
+        if self.config != old_config:
+            changes = self._config_summary(old_config)
+            if changes:
+                if summary:
+                    summary += ' and '
+                summary += "{} {}".format(self.config.owner, changes)
+            if not summary:
+                if self.version == 1:
+                    summary = "{} created the initial release".format(self.owner)
+                else:
+                    summary = "{} changed nothing".format(self.owner)
+        return summary
+
     def save(self, *args, **kwargs):
         if not self.summary:
-            self.summary = ''
-            prev_release = self.previous()
-            # compare this build to the previous build
-            old_build = prev_release.build if prev_release else None
-            # if the build changed, log it and who pushed it
-            if self.version == 1:
-                self.summary += "{} created initial release".format(self.app.owner)
-            elif self.build != old_build:
-                if self.build.sha:
-                    self.summary += "{} deployed {}".format(self.build.owner, self.build.sha[:7])
-                else:
-                    self.summary += "{} deployed {}".format(self.build.owner, self.build.image)
-            # compare this config to the previous config
-            old_config = prev_release.config if prev_release else None
-            # if the config data changed, log the dict diff
-            if self.config != old_config:
-                dict1 = self.config.values
-                dict2 = old_config.values if old_config else {}
-                diff = dict_diff(dict1, dict2)
-                # try to be as succinct as possible
-                added = ', '.join(k for k in diff.get('added', {}))
-                added = 'added ' + added if added else ''
-                changed = ', '.join(k for k in diff.get('changed', {}))
-                changed = 'changed ' + changed if changed else ''
-                deleted = ', '.join(k for k in diff.get('deleted', {}))
-                deleted = 'deleted ' + deleted if deleted else ''
-                changes = ', '.join(i for i in (added, changed, deleted) if i)
-                if changes:
-                    if self.summary:
-                        self.summary += ' and '
-                    self.summary += "{} {}".format(self.config.owner, changes)
-                if not self.summary:
-                    if self.version == 1:
-                        self.summary = "{} created the initial release".format(self.owner)
-                    else:
-                        self.summary = "{} changed nothing".format(self.owner)
-        super(Release, self).save(*args, **kwargs)
+            self.summary = self._summarize()
+        adding = self._state.adding
+        with transaction.atomic():
+            super(Release, self).save(*args, **kwargs)
+            if adding:
+                # bump the app's updated stamp too, which its ETag is made from
+                App.objects.filter(pk=self.app_id).update(
+                    current_release=self, updated=timezone.now())
+        if adding:
+            self.app.current_release = self
+
+
+@python_2_unicode_compatible
+class Operation(UuidAuditedModel):
+    """
+    A change to an application carried out in the background.
+
+    Scaling, deploying, rolling back and running a command can take as long
+    as the slowest container, so rather than holding a request open until
+    then, each is recorded here and run by a celery worker, and clients
+    follow its phase and per-container progress.
+    """
+
+    SCALE = 'scale'
+    DEPLOY = 'deploy'
+    ROLLBACK = 'rollback'
+    RUN = 'run'
+    TYPE_CHOICES = (
+        (SCALE, 'scale'),
+        (DEPLOY, 'deploy'),
+        (ROLLBACK, 'rollback'),
+        (RUN, 'run')
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = (
+        (PENDING, 'pending'),
+        (RUNNING, 'running'),
+        (SUCCEEDED, 'succeeded'),
+        (FAILED, 'failed')
+    )
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL)
+    app = models.ForeignKey('App')
+    type = models.CharField(max_length=16, choices=TYPE_CHOICES)
+    state = FSMField(default=PENDING, choices=STATE_CHOICES, protected=True)
+    # what the operation is doing right now, e.g. "deploying batch 2 of 3"
+    phase = models.CharField(max_length=64, blank=True)
+    # the arguments it runs with, e.g. {"structure": {"web": 4}} for a scale
+    params = JSONField(default='{}', blank=True)
+    # the containers done so far, and [container, error] for those that failed
+    progress = JSONField(default='{"done": [], "failed": []}', blank=True)
+    # what it returned, e.g. {"rc": 0, "output": "..."} for a run
+    result = JSONField(default='{}', blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        get_latest_by = 'created'
+        ordering = ['-created']
+        index_together = (('app', 'created'),)
+
+    def __str__(self):
+        return "{}-{}-{}".format(self.app.id, self.type, self.uuid[:7])
+
+    @property
+    def finished(self):
+        return self.state in (self.SUCCEEDED, self.FAILED)
+
+    def enqueue(self):
+        """Hand the operation to a celery worker."""
+        tasks.run_operation.delay(self)
+
+    def report(self, phase=None, summary=None):
+        """Record the current phase and the outcome of containers just handled."""
+        if phase:
+            self.phase = phase
+        if summary:
+            self.progress['done'].extend(summary['done'])
+            self.progress['failed'].extend(summary['failed'])
+        self.save(update_fields=['phase', 'progress', 'updated'])
+        self.publish()
+
+    def publish(self):
+        """Tell anyone watching the app how the operation is getting on."""
+        events.publish(self.app.id, 'operation', uuid=fields.format_uuid(self.uuid),
+                       type=self.type, state=self.state, phase=self.phase,
+                       progress=self.progress)
+
+    def execute(self):
+        """
+        Carry out the operation, recording whether it succeeded.
+
+        Operations on an app run one at a time, in the order they were
+        started, so this returns False without starting anything while an
+        earlier one is still under way. Commands run alongside the rest.
+        """
+        with transaction.atomic():
+            # lock the app so that two workers cannot both find it free
+            app = App.objects.select_for_update().get(pk=self.app_id)
+            if self.type != self.RUN and self._earlier().exists():
+                return False
+            # work on the app as it is now, not as it was when this was queued
+            self.app = app
+            self.start()
+        try:
+            result = getattr(self, '_' + self.type)(app)
+        except Exception as e:
+            log_event(app, 'Operation {} failed: {}'.format(self, e), logging.ERROR)
+            self.fail(str(e) or e.__class__.__name__)
+        else:
+            self.succeed(result)
+        return True
+
+    def _earlier(self):
+        """Return the app's unfinished operations started before this one."""
+        lost = timezone.now() - timedelta(seconds=settings.OPERATION_TIMEOUT)
+        return Operation.objects.filter(
+            app_id=self.app_id, created__lt=self.created, updated__gt=lost,
+            state__in=(self.PENDING, self.RUNNING)).exclude(type=self.RUN)
+
+    @transition(field=state, source=PENDING, target=RUNNING)
+    def start(self):
+        pass
+
+    @transition(field=state, source=RUNNING, target=SUCCEEDED)
+    def succeed(self, result=None):
+        self.phase = ''
+        self.result = result or {}
+
+    @transition(field=state, source=[PENDING, RUNNING], target=FAILED)
+    def fail(self, error):
+        self.error = error
+
+    def _scale(self, app):
+        app.structure = self.params['structure']
+        app.scale(operation=self)
+
+    def _deploy(self, app):
+        release = app.release_set.get(uuid=self.params['release'])
+        app.deploy(release, initial=self.params.get('initial', False), operation=self)
+
+    _rollback = _deploy
+
+    def _run(self, app):
+        rc, output = app.run(self.params['command'])
+        return {'rc': rc, 'output': output}
 
 
 @python_2_unicode_compatible
@@ -587,6 +1107,8 @@ def _log_release_created(**kwargs):
     if kwargs.get('created'):
         release = kwargs['instance']
         log_event(release.app, "Release {} created".format(release))
+        events.publish(release.app.id, 'release', version=release.version,
+                       summary=release.summary)
 
 
 def _log_config_updated(**kwargs):
@@ -655,12 +1177,40 @@ post_save.connect(_log_domain_added, sender=Domain, dispatch_uid='api.models.log
 post_delete.connect(_log_domain_removed, sender=Domain, dispatch_uid='api.models.log')
 
 
-# save FSM transitions as they happen
+def _purge_scheduler(**kwargs):
+    cluster_id = kwargs['instance'].id
+    with _schedulers_lock:
+        for key in [k for k in _schedulers if k[0] == cluster_id]:
+            del _schedulers[key]
+
+
+# drop cached scheduler clients whenever a cluster changes
+post_save.connect(_purge_scheduler, sender=Cluster, dispatch_uid='api.models')
+post_delete.connect(_purge_scheduler, sender=Cluster, dispatch_uid='api.models')
+
+
+# save FSM transitions as they happen, and tell anyone watching the app
 def _save_transition(**kwargs):
-    kwargs['instance'].save()
+    instance = kwargs['instance']
+    instance.save()
+    if isinstance(instance, Container):
+        events.publish(instance.app.id, 'container', name=instance.short_name(),
+                       type=instance.type, num=instance.num,
+                       source=kwargs['source'], state=kwargs['target'])
+    elif isinstance(instance, Operation):
+        instance.publish()
 
 post_transition.connect(_save_transition)
 
+
+# index each new app under its owner
+def _grant_owner_access(**kwargs):
+    if kwargs['created']:
+        app = kwargs['instance']
+        AppAccess.objects.create(user=app.owner, app=app, role=AppAccess.OWNER)
+
+post_save.connect(_grant_owner_access, sender=App, dispatch_uid='api.models.access')
+
 # wire up etcd publishing if we can connect
 try:
     _etcd_client = etcd.Client(host=settings.ETCD_HOST, port=int(settings.ETCD_PORT))
@@ -12,6 +12,7 @@ from rest_framework import serializers
 
 from api import models
 from api import utils
+from api.fields import format_uuid
 
 
 class OwnerSlugRelatedField(serializers.SlugRelatedField):
@@ -25,6 +26,17 @@ class OwnerSlugRelatedField(serializers.SlugRelatedField):
         return serializers.SlugRelatedField.from_native(self, data)
 
 
+class UuidRelatedField(serializers.SlugRelatedField):
+    """Show a related object by its UUID, in the same dashed form on every backend."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('slug_field', 'uuid')
+        super(UuidRelatedField, self).__init__(*args, **kwargs)
+
+    def to_native(self, obj):
+        return format_uuid(super(UuidRelatedField, self).to_native(obj))
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serialize a :class:`~api.models.User` model."""
 
@@ -88,17 +100,29 @@ class BuildSerializer(serializers.ModelSerializer):
         read_only_fields = ('uuid', 'created', 'updated')
 
 
+class ConfigValuesField(serializers.WritableField):
+    """Serialize the materialized values of a :class:`~api.models.Config` as JSON."""
+
+    model_field = models.Config._meta.get_field('data')
+
+    def to_native(self, value):
+        return self.model_field.get_db_prep_value(value)
+
+    def from_native(self, value):
+        return self.model_field.to_python(value)
+
+
 class ConfigSerializer(serializers.ModelSerializer):
     """Serialize a :class:`~api.models.Config` model."""
 
     owner = serializers.Field(source='owner.username')
     app = serializers.SlugRelatedField(slug_field='id')
-    values = serializers.ModelField(
-        model_field=models.Config()._meta.get_field('values'), required=False)
+    values = ConfigValuesField(required=False)
 
     class Meta:
         """Metadata options for a :class:`ConfigSerializer`."""
         model = models.Config
+        exclude = ('data', 'parent', 'base', 'depth')
         read_only_fields = ('uuid', 'created', 'updated')
 
 
@@ -107,8 +131,8 @@ class ReleaseSerializer(serializers.ModelSerializer):
 
     owner = serializers.Field(source='owner.username')
     app = serializers.SlugRelatedField(slug_field='id')
-    config = serializers.SlugRelatedField(slug_field='uuid')
-    build = serializers.SlugRelatedField(slug_field='uuid')
+    config = UuidRelatedField()
+    build = UuidRelatedField()
 
     class Meta:
         """Metadata options for a :class:`ReleaseSerializer`."""
@@ -116,17 +140,30 @@ class ReleaseSerializer(serializers.ModelSerializer):
         read_only_fields = ('uuid', 'created', 'updated')
 
 
+class OperationSerializer(serializers.ModelSerializer):
+    """Serialize a :class:`~api.models.Operation` model."""
+
+    owner = serializers.Field(source='owner.username')
+    app = serializers.SlugRelatedField(slug_field='id')
+
+    class Meta:
+        """Metadata options for a :class:`OperationSerializer`."""
+        model = models.Operation
+        read_only_fields = ('uuid', 'created', 'updated')
+
+
 class AppSerializer(serializers.ModelSerializer):
     """Serialize a :class:`~api.models.App` model."""
 
     owner = serializers.Field(source='owner.username')
     id = serializers.SlugField(default=utils.generate_app_name)
     cluster = serializers.SlugRelatedField(slug_field='id')
+    current_release = UuidRelatedField(read_only=True)
 
     class Meta:
         """Metadata options for a :class:`AppSerializer`."""
         model = models.App
-        read_only_fields = ('created', 'updated')
+        read_only_fields = ('created', 'updated', 'strategy', 'retention')
 
     def validate_id(self, attrs, source):
         """
@@ -146,7 +183,7 @@ class ContainerSerializer(serializers.ModelSerializer):
 
     owner = serializers.Field(source='owner.username')
     app = OwnerSlugRelatedField(slug_field='id')
-    release = serializers.SlugRelatedField(slug_field='uuid')
+    release = UuidRelatedField()
 
     class Meta:
         """Metadata options for a :class:`ContainerSerializer`."""
@@ -0,0 +1,63 @@
+"""
+Limiting how many long-lived streams the controller serves at once.
+
+Each gunicorn worker serves one request at a time, so a stream held open
+for its full wait keeps a worker from every other request. A stream first
+takes one of a fixed number of slots shared by all the workers on a host,
+and is turned away when none is free, so the remaining workers are always
+left for ordinary requests. Slots are locks on files, which the kernel
+releases even when a worker dies mid-stream.
+"""
+
+from __future__ import unicode_literals
+import errno
+import fcntl
+import os
+
+
+class StreamsBusy(EnvironmentError):
+    """Raised when every stream slot is taken."""
+
+
+def acquire(slot_dir, slots):
+    """
+    Take a free slot, and return the open file that holds it
+
+    Raises StreamsBusy if all slots are taken.
+    """
+    if not os.path.isdir(slot_dir):
+        try:
+            os.makedirs(slot_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    for i in range(slots):
+        f = open(os.path.join(slot_dir, '{}.lock'.format(i)), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as e:
+            f.close()
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            continue
+        return f
+    raise StreamsBusy('All {} streams are in use'.format(slots))
+
+
+class Held(object):
+    """
+    Iterate over a stream while holding a slot, which is freed once the
+    response is closed, whether or not the client read it all.
+    """
+
+    def __init__(self, slot, stream):
+        self.slot = slot
+        self.stream = stream
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def close(self):
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+        self.slot.close()
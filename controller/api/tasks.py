@@ -8,11 +8,66 @@ functions are decorated to run as asynchronous celery tasks.
 from __future__ import unicode_literals
 
 import requests
-import threading
 
-from celery import task
+from celery import chord, task
 from django.conf import settings
 
+from scheduler.futures import AsyncSchedulerClient
+
+
+def _transition_all(containers, method, futures, *args):
+    """Move each container through a transition with its future, collecting the outcomes."""
+    result = {'done': [], 'failed': []}
+    for c, future in zip(containers, futures):
+        try:
+            getattr(c, method)(*args, future=future)
+            result['done'].append(str(c))
+        except Exception as e:
+            result['failed'].append((str(c), str(e) or e.__class__.__name__))
+    return result
+
+
+def _deploy_many(scheduler, new_jobs, old_jobs, in_place):
+    scheduler.create_many(new_jobs)
+    replaced = [job for job, flag in zip(old_jobs, in_place) if flag]
+    if replaced:
+        scheduler.destroy_many(replaced)
+    scheduler.start_many(new_jobs)
+    surged = [job for job, flag in zip(old_jobs, in_place) if not flag]
+    if surged:
+        scheduler.destroy_many(surged)
+
+
+def _deploy_one(scheduler, new_job, old_job, in_place):
+    scheduler.create(**new_job)
+    if in_place:
+        scheduler.destroy(old_job['name'], old_job['use_announcer'])
+    scheduler.start(new_job['name'], new_job['use_announcer'])
+    if not in_place:
+        scheduler.destroy(old_job['name'], old_job['use_announcer'])
+
+
+def chunk(task, containers, *args):
+    """
+    Split a container operation into subtasks of CONTAINER_CHUNK_SIZE containers
+
+    Run the subtasks with :func:`fan_out` so they spread across the workers.
+    """
+    size = settings.CONTAINER_CHUNK_SIZE
+    return [task.s(containers[i:i + size], *args) for i in range(0, len(containers), size)]
+
+
+def fan_out(subtasks):
+    """
+    Run chunked subtasks in parallel and return their merged outcome
+
+    The result is a dict listing the containers that were ``done`` and the
+    ``(container, error)`` pairs that ``failed``.
+    """
+    if not subtasks:
+        return {'done': [], 'failed': []}
+    return chord(subtasks)(collect_results.s()).get()
+
 
 @task
 def create_cluster(cluster):
@@ -27,13 +82,36 @@ def destroy_cluster(cluster):
 
 
 @task
-def deploy_release(app, release):
-    containers = app.container_set.all()
-    threads = []
+def collect_results(results):
+    """Merge the outcomes of chunked container subtasks"""
+    summary = {'done': [], 'failed': []}
+    for result in results:
+        summary['done'].extend(result['done'])
+        summary['failed'].extend(result['failed'])
+    return summary
+
+
+@task
+def deploy_containers(containers, release, in_place=()):
+    """
+    Redeploy containers on a new release
+
+    Containers whose uuid is in ``in_place`` have their old job destroyed
+    before the new one starts; the rest start the new job first.
+    """
+    scheduler = AsyncSchedulerClient(containers[0]._scheduler)
+    old_jobs = [c._job for c in containers]
     for c in containers:
-        threads.append(threading.Thread(target=c.deploy, args=(release,)))
-    [t.start() for t in threads]
-    [t.join() for t in threads]
+        c.release = release
+    new_jobs = [c._job for c in containers]
+    flags = [c.uuid in in_place for c in containers]
+    if hasattr(scheduler.client, 'create_many'):
+        futures = [scheduler.executor.submit(
+            _deploy_many, scheduler.client, new_jobs, old_jobs, flags)] * len(containers)
+    else:
+        futures = [scheduler.executor.submit(_deploy_one, scheduler.client, new, old, flag)
+                   for new, old, flag in zip(new_jobs, old_jobs, flags)]
+    return _transition_all(containers, 'deploy', futures, release)
 
 
 @task
@@ -51,28 +129,40 @@ def import_repository(source, target_repository):
 
 @task
 def start_containers(containers):
-    create_threads = []
-    start_threads = []
-    for c in containers:
-        create_threads.append(threading.Thread(target=c.create))
-        start_threads.append(threading.Thread(target=c.start))
-    [t.start() for t in create_threads]
-    [t.join() for t in create_threads]
-    [t.start() for t in start_threads]
-    [t.join() for t in start_threads]
+    scheduler = AsyncSchedulerClient(containers[0]._scheduler)
+    jobs = [c._job for c in containers]
+    if hasattr(scheduler.client, 'create_many'):
+        created = _transition_all(containers, 'create', [scheduler.create_many(jobs)] * len(jobs))
+    else:
+        created = _transition_all(containers, 'create', [scheduler.create(**job) for job in jobs])
+    # only start the containers that were created
+    containers = [c for c in containers if c.state == c.CREATED]
+    jobs = [c._job for c in containers]
+    if hasattr(scheduler.client, 'start_many'):
+        futures = [scheduler.start_many(jobs)] * len(jobs) if jobs else []
+    else:
+        futures = [scheduler.start(job['name'], job['use_announcer']) for job in jobs]
+    started = _transition_all(containers, 'start', futures)
+    started['failed'] = created['failed'] + started['failed']
+    return started
 
 
 @task
 def stop_containers(containers):
-    destroy_threads = []
-    delete_threads = []
-    for c in containers:
-        destroy_threads.append(threading.Thread(target=c.destroy))
-        delete_threads.append(threading.Thread(target=c.delete))
-    [t.start() for t in destroy_threads]
-    [t.join() for t in destroy_threads]
-    [t.start() for t in delete_threads]
-    [t.join() for t in delete_threads]
+    scheduler = AsyncSchedulerClient(containers[0]._scheduler)
+    jobs = [c._job for c in containers]
+    if hasattr(scheduler.client, 'destroy_many'):
+        futures = [scheduler.destroy_many(jobs)] * len(jobs)
+    else:
+        futures = [scheduler.destroy(job['name'], job['use_announcer']) for job in jobs]
+    return _transition_all(containers, 'destroy', futures)
+
+
+@task
+def run_operation(operation):
+    """Carry out an operation started by the API, once its app is free"""
+    if not operation.execute():
+        run_operation.retry(countdown=settings.OPERATION_RETRY_DELAY, max_retries=None)
 
 
 @task
@@ -89,7 +179,14 @@ def run_command(c, command):
         docker_args = ' '.join(['--entrypoint=/bin/sh',
                                 '-a', 'stdout', '-a', 'stderr', '--rm', image])
         escaped_command = command.replace("'", "'\\''")
-        command = r"docker run {docker_args} -c \'{escaped_command}\'".format(**locals())
+        command = "docker run {docker_args} -c '{escaped_command}'".format(**locals())
         return c.run(command)
     finally:
         c.delete()
+
+
+@task
+def prune_history():
+    """Prune the history of every app to its retention policy, one app at a time."""
+    from api.models import App  # api.models imports this module
+    return dict((app.id, app.prune()) for app in App.objects.order_by('uuid').iterator())
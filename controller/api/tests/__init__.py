@@ -47,9 +47,11 @@ from .test_auth import *  # noqa
 from .test_build import *  # noqa
 from .test_cluster import *  # noqa
 from .test_config import *  # noqa
-from .test_domain import *  # noqa
 from .test_container import *  # noqa
+from .test_domain import *  # noqa
 from .test_hooks import *  # noqa
 from .test_key import *  # noqa
 from .test_perm import *  # noqa
+from .test_queries import *  # noqa
 from .test_release import *  # noqa
+from .test_scheduler import *  # noqa
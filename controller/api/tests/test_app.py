@@ -7,13 +7,20 @@ Run the tests with "./manage.py test api"
 from __future__ import unicode_literals
 
 import json
+import mock
 import os.path
+import uuid
 
+from django.db import connection
 from django.test import TestCase
 from django.test.utils import override_settings
 
 from django.conf import settings
 
+from api.fields import UuidField
+from api.models import App, Release
+from api.views import AppViewSet
+
 
 @override_settings(CELERY_ALWAYS_EAGER=True)
 class AppTest(TestCase):
@@ -81,18 +88,90 @@ class AppTest(TestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, 204)
         self.assertEqual(response.data, 'No logs for {}'.format(app_id))
+        response = self.client.post(url + '?follow=1&wait=0&offset=0')
+        self.assertEqual(response.status_code, 204)
         # write out some fake log data and try again
         with open(path, 'w') as f:
             f.write(FAKE_LOG_DATA)
         response = self.client.post(url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data, FAKE_LOG_DATA)
+        offset = int(response['X-Deis-Log-Offset'])
+        self.assertEqual(offset, len(FAKE_LOG_DATA))
+        # only what was logged after an offset is returned
+        with open(path, 'a') as f:
+            f.write('more log data\n')
+        response = self.client.post(url + '?offset={}'.format(offset))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, 'more log data\n')
+        self.assertEqual(int(response['X-Deis-Log-Offset']), offset + 14)
+        response = self.client.post(url + '?follow=1&wait=0&offset={}'.format(offset))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'more log data\n')
+        # a stream frees its slot once done, and is turned away when none is free
+        with self.settings(STREAM_SLOTS=1):
+            for _ in range(2):
+                response = self.client.post(url + '?follow=1&wait=0&offset={}'.format(offset))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), b'more log data\n')
+        with self.settings(STREAM_SLOTS=0):
+            response = self.client.post(url + '?follow=1&wait=0&offset={}'.format(offset))
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+        response = self.client.post(url + '?offset=-1')
+        self.assertEqual(response.status_code, 400)
         # test run
         url = '/api/apps/{app_id}/run'.format(**locals())
         body = {'command': 'ls -al'}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(response['X-Deis-Operation'])
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data[0], 0)
+        self.assertEqual(response.data['state'], 'succeeded')
+        self.assertEqual(json.loads(response.data['result'])['rc'], 0)
+
+    @override_settings(LOG_INDEX_INTERVAL=64, LOG_BLOCK_SIZE=16)
+    def test_app_logs_search(self):
+        url = '/api/apps'
+        body = {'cluster': 'autotest', 'id': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']  # noqa
+        if not os.path.exists(settings.DEIS_LOG_DIR):
+            os.mkdir(settings.DEIS_LOG_DIR)
+        path = os.path.join(settings.DEIS_LOG_DIR, app_id + '.log')
+        with open(path, 'w') as f:
+            f.write(''.join(FAKE_APP_LOG_LINES))
+        url = '/api/apps/{app_id}/logs'.format(**locals())
+        with self.settings(DEIS_LOG_INDEX_DIR=os.path.join(settings.TEMPDIR, 'log-index')):
+            response = self.client.post(url + '?since=2014-08-15+12:41:26')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data, ''.join(FAKE_APP_LOG_LINES[2:]))
+            self.assertEqual(int(response['X-Deis-Log-Offset']),
+                             len(''.join(FAKE_APP_LOG_LINES)))
+            response = self.client.post(url + '?since=2014-08-15+12:41:26&until=12:41:27')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post(
+                url + '?since=2014-08-15+12:41:26&until=2014-08-15+12:41:27')
+            self.assertEqual(response.data, ''.join(FAKE_APP_LOG_LINES[2:5]))
+            response = self.client.post(url + '?process=web')
+            self.assertEqual(response.data.count('autotest[web.'), 3)
+            self.assertNotIn('autotest[worker', response.data)
+            response = self.client.post(url + '?process=web.1&since=1d')
+            self.assertEqual(response.data, '')
+            response = self.client.post(url + '?since=yesterday')
+            self.assertEqual(response.status_code, 400)
+            # only the latest lines are read back for, and only so far
+            with self.settings(LOG_LINES=2):
+                response = self.client.post(url + '?process=worker')
+                self.assertEqual(response.data, ''.join(FAKE_APP_LOG_LINES[3:4] +
+                                                        FAKE_APP_LOG_LINES[5:]))
+            with self.settings(LOG_MAX_READ=len(FAKE_APP_LOG_LINES[-1]) + 1):
+                response = self.client.post(url + '?process=web')
+                self.assertEqual(response.data, '')
+                response = self.client.post(url + '?process=worker')
+                self.assertEqual(response.data, FAKE_APP_LOG_LINES[-1])
+        os.remove(path)
 
     def test_app_errors(self):
         cluster_id, app_id = 'autotest', 'autotest-errors'
@@ -116,6 +195,123 @@ class AppTest(TestCase):
             response = self.client.get(url)
             self.assertEquals(response.status_code, 404)
 
+    def test_app_uuid(self):
+        """
+        Test that UUIDs fit their column and match in either written form
+        """
+        response = self.client.post('/api/apps', json.dumps({'cluster': 'autotest'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app = App.objects.get(id=response.data['id'])
+        if not UuidField.is_native(connection):
+            self.assertEqual(len(app.uuid), 32)
+        for form in (app.uuid, str(uuid.UUID(app.uuid)), uuid.UUID(app.uuid).hex):
+            self.assertEqual(App.objects.get(uuid=form).id, app.id)
+            self.assertEqual(Release.objects.filter(app_id=form).count(), 1)
+        # the API shows the same dashed form on every backend
+        self.assertEqual(response.data['uuid'], str(uuid.UUID(app.uuid)))
+        self.assertEqual(response.data['current_release'],
+                         str(uuid.UUID(app.current_release_id)))
+        response = self.client.get('/api/apps/{}/releases'.format(app.id))
+        release = response.data['results'][0]
+        for key in ('uuid', 'build', 'config'):
+            self.assertEqual(len(release[key]), 36)
+
+    def test_app_etag(self):
+        """
+        Test that apps are tagged with ETags, and that a GET holding the
+        current one is answered with 304 Not Modified
+        """
+        response = self.client.post('/api/apps', json.dumps({'cluster': 'autotest'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        for url in ('/api/apps', '/api/apps/{}'.format(app_id)):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"stale", {}'.format(etag))
+            self.assertEqual(response.status_code, 304)
+            # changing the app changes its tag
+            response = self.client.post('/api/apps/{}/strategy'.format(app_id),
+                                        json.dumps({'batch_size': len(url)}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+        # another user listing their own apps never matches
+        response = self.client.get('/api/apps')
+        etag = response['ETag']
+        self.assertTrue(
+            self.client.login(username='autotest2', password='password'))
+        response = self.client.get('/api/apps', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.object(AppViewSet, 'paginate_by', 2)
+    def test_app_list_cursor(self):
+        """
+        Test that the app list is paged by cursor, in creation order
+        """
+        created = []
+        for i in range(5):
+            body = {'cluster': 'autotest', 'id': 'autotest-{}'.format(i)}
+            response = self.client.post('/api/apps', json.dumps(body),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            created.append(response.data['id'])
+        listed, url = [], '/api/apps'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            listed.extend(app['id'] for app in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(listed, created)
+        # walk back from the last page by the previous cursors
+        listed, url = [], response.data['previous']
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            listed[:0] = [app['id'] for app in response.data['results']]
+            url = response.data['previous']
+        self.assertEqual(listed, created[:4])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([app['id'] for app in response.data['results']], created[2:4])
+        response = self.client.get('/api/apps?cursor=bogus')
+        self.assertEqual(response.status_code, 400)
+        # a page's tag only changes with the rows on it
+        response = self.client.get('/api/apps')
+        etag = response['ETag']
+        self.client.post('/api/apps/autotest-4/strategy', json.dumps({'batch_size': 2}),
+                         content_type='application/json')
+        response = self.client.get('/api/apps', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.post('/api/apps/autotest-1/strategy', json.dumps({'batch_size': 2}),
+                         content_type='application/json')
+        response = self.client.get('/api/apps', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # apps shared by other users are listed, apps deleted are not
+        self.client.delete('/api/apps/autotest-0')
+        self.assertTrue(
+            self.client.login(username='autotest2', password='password'))
+        response = self.client.get('/api/apps')
+        self.assertEqual(response.data['results'], [])
+        self.assertTrue(
+            self.client.login(username='autotest', password='password'))
+        response = self.client.post('/api/apps/autotest-1/perms',
+                                    json.dumps({'username': 'autotest2'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            self.client.login(username='autotest2', password='password'))
+        response = self.client.get('/api/apps')
+        self.assertEqual([app['id'] for app in response.data['results']], ['autotest-1'])
+
 
 FAKE_LOG_DATA = """
 2013-08-15 12:41:25 [33454] [INFO] Starting gunicorn 17.5
@@ -123,3 +319,12 @@ FAKE_LOG_DATA = """
 2013-08-15 12:41:25 [33454] [INFO] Using worker: sync
 2013-08-15 12:41:25 [33457] [INFO] Booting worker with pid 33457
 """
+
+FAKE_APP_LOG_LINES = [
+    '2014-08-15 12:41:25 host1 autotest[web.1]: Starting gunicorn 17.5\n',
+    '2014-08-15 12:41:25 host2 autotest[web.2]: Starting gunicorn 17.5\n',
+    '2014-08-15 12:41:26 host1 autotest[worker.1]: Traceback (most recent call last):\n',
+    '  File "worker.py", line 1, in <module>\n',
+    '2014-08-15 12:41:27 host1 autotest[web.10]: Booting worker with pid 33457\n',
+    '2014-08-15 12:41:28 host2 autotest[worker.1]: Restarting\n',
+]
@@ -53,14 +53,18 @@ class BuildTest(TransactionTestCase):
         url = "/api/apps/{app_id}/builds".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
         # post a new build
         body = {'image': 'autotest/example'}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
-        build_id = response.data['uuid']
-        build1 = response.data
-        self.assertEqual(response.data['image'], body['image'])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['type'], 'deploy')
+        self.assertEqual(response['Location'], response['X-Deis-Operation'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        build1 = response.data['results'][0]
+        build_id = build1['uuid']
+        self.assertEqual(build1['image'], body['image'])
         # read the build
         url = "/api/apps/{app_id}/builds/{build_id}".format(**locals())
         response = self.client.get(url)
@@ -71,10 +75,10 @@ class BuildTest(TransactionTestCase):
         url = "/api/apps/{app_id}/builds".format(**locals())
         body = {'image': 'autotest/example'}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         self.assertIn('x-deis-release', response._headers)
-        build3 = response.data
-        self.assertEqual(response.data['image'], body['image'])
+        build3 = self.client.get(url).data['results'][0]
+        self.assertEqual(build3['image'], body['image'])
         self.assertNotEqual(build2['uuid'], build3['uuid'])
         # disallow put/patch/delete
         self.assertEqual(self.client.put(url).status_code, 405)
@@ -92,7 +96,7 @@ class BuildTest(TransactionTestCase):
         url = "/api/apps/{app_id}/builds".format(**locals())
         body = {'image': 'autotest/example'}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers/cmd".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -112,7 +116,7 @@ class BuildTest(TransactionTestCase):
                 'sha': 'a'*40,
                 'dockerfile': "FROM scratch"}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers/cmd".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -133,7 +137,7 @@ class BuildTest(TransactionTestCase):
                 'dockerfile': "FROM scratch",
                 'procfile': {'worker': 'node worker.js'}}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers/cmd".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -154,7 +158,7 @@ class BuildTest(TransactionTestCase):
                 'procfile': json.dumps({'web': 'node server.js',
                                         'worker': 'node worker.js'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers/web".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -175,7 +179,6 @@ class BuildTest(TransactionTestCase):
         url = "/api/apps/{app_id}/builds".format(**locals())
         body = {'image': 'autotest/example'}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
-        build = Build.objects.get(uuid=response.data['uuid'])
-        self.assertEqual(str(build), "{}-{}".format(
-                         response.data['app'], response.data['uuid'][:7]))
+        self.assertEqual(response.status_code, 202)
+        build = Build.objects.latest('created')
+        self.assertEqual(str(build), "{}-{}".format(app_id, build.uuid[:7]))
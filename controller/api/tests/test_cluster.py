@@ -11,6 +11,8 @@ import json
 from django.test import TestCase
 from django.test.utils import override_settings
 
+from api.models import Cluster
+
 
 @override_settings(CELERY_ALWAYS_EAGER=True)
 class ClusterTest(TestCase):
@@ -74,3 +76,22 @@ class ClusterTest(TestCase):
                 'hosts': 'host1,host2', 'auth': 'base64string', 'options': options}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
         self.assertEqual(response.status_code, 403)
+
+    def test_cluster_scheduler_cached(self):
+        """
+        Test that a cluster's scheduler client is reused until the cluster changes
+        """
+        url = '/api/clusters'
+        body = {'id': 'autotest', 'domain': 'autotest.local', 'type': 'mock',
+                'hosts': 'host1,host2', 'auth': 'base64string', 'options': {}}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        scheduler = Cluster.objects.get(id='autotest')._scheduler
+        self.assertIs(scheduler, Cluster.objects.get(id='autotest')._scheduler)
+        url = '/api/clusters/autotest'
+        body = {'hosts': 'host2,host3'}
+        response = self.client.patch(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        new_scheduler = Cluster.objects.get(id='autotest')._scheduler
+        self.assertIsNot(scheduler, new_scheduler)
+        self.assertEqual(new_scheduler.hosts, 'host2,host3')
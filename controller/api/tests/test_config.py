@@ -10,10 +10,11 @@ import json
 import mock
 import requests
 
+from django.core.cache import cache
 from django.test import TransactionTestCase
 from django.test.utils import override_settings
 
-from api.models import Config
+from api.models import App, Config
 
 
 def mock_import_repository_task(*args, **kwargs):
@@ -60,8 +61,10 @@ class ConfigTest(TransactionTestCase):
         # set an initial config value
         body = {'values': json.dumps({'NEW_URL1': 'http://localhost:8080/'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         self.assertIn('x-deis-release', response._headers)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
         config2 = response.data
         self.assertNotEqual(config1['uuid'], config2['uuid'])
         self.assertIn('NEW_URL1', json.loads(response.data['values']))
@@ -74,7 +77,9 @@ class ConfigTest(TransactionTestCase):
         # set an additional config value
         body = {'values': json.dumps({'NEW_URL2': 'http://localhost:8080/'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
         config3 = response.data
         self.assertNotEqual(config2['uuid'], config3['uuid'])
         self.assertIn('NEW_URL1', json.loads(response.data['values']))
@@ -89,14 +94,18 @@ class ConfigTest(TransactionTestCase):
         # unset a config value
         body = {'values': json.dumps({'NEW_URL2': None})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
         config5 = response.data
         self.assertNotEqual(config4['uuid'], config5['uuid'])
         self.assertNotIn('NEW_URL2', json.dumps(response.data['values']))
         # unset all config values
         body = {'values': json.dumps({'NEW_URL1': None})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
         self.assertNotIn('NEW_URL1', json.dumps(response.data['values']))
         # disallow put/patch/delete
         self.assertEqual(self.client.put(url).status_code, 405)
@@ -118,18 +127,77 @@ class ConfigTest(TransactionTestCase):
         # set an initial config value
         body = {'values': json.dumps({'PORT': '5000'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
         self.assertIn('PORT', json.loads(response.data['values']))
         # reset same config value
         body = {'values': json.dumps({'PORT': '5001'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
         self.assertIn('PORT', json.loads(response.data['values']))
         self.assertEqual(json.loads(response.data['values'])['PORT'], '5001')
 
+    @override_settings(CONFIG_SNAPSHOT_INTERVAL=3)
+    @mock.patch('requests.post', mock_import_repository_task)
+    def test_config_deltas(self):
+        """
+        Test that configs store only their changes between periodic snapshots
+        """
+        response = self.client.post('/api/apps', json.dumps({'cluster': 'autotest'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app = App.objects.get(id=response.data['id'])
+        url = "/api/apps/{}/config".format(app.id)
+        expected = {}
+        for i, change in enumerate(({'A': '1', 'B': '2'}, {'A': '3'}, {'B': None},
+                                    {'C': '4'}, {'A': None})):
+            response = self.client.post(url, json.dumps({'values': json.dumps(change)}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            response = self.client.get(url)
+            expected.update(change)
+            expected = dict((k, v) for k, v in expected.items() if v is not None)
+            self.assertEqual(json.loads(response.data['values']), expected)
+            config = Config.objects.get(uuid=response.data['uuid'])
+            # the initial config is a snapshot, then every third generation
+            self.assertEqual(config.depth, (i + 1) % 3)
+            if config.depth:
+                self.assertEqual(config.data, change)
+            else:
+                self.assertEqual(config.data, expected)
+            # values materialize from the deltas alone as well as from cache
+            cache.clear()
+            self.assertEqual(Config.objects.get(uuid=config.uuid).values, expected)
+        release = App.objects.get(id=app.id).current_release
+        self.assertEqual(release.summary, 'autotest deleted A')
+        self.assertEqual(app.release_set.get(version=3).summary, 'autotest changed A')
+
     @mock.patch('requests.post', mock_import_repository_task)
     def test_config_str(self):
         """Test the text representation of a node."""
         config5 = self.test_config()
         config = Config.objects.get(uuid=config5['uuid'])
         self.assertEqual(str(config), "{}-{}".format(config5['app'], config5['uuid'][:7]))
+
+    @mock.patch('requests.post', mock_import_repository_task)
+    def test_config_without_current_release(self):
+        """Test that an app that lost its release shows its latest config, or none"""
+        response = self.client.post('/api/apps', json.dumps({'cluster': 'autotest'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        url = '/api/apps/{app_id}/config'.format(**locals())
+        body = {'values': json.dumps({'NEW_URL1': 'http://localhost:8080/'})}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        App.objects.filter(id=app_id).update(current_release=None)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data['values']),
+                         {'NEW_URL1': 'http://localhost:8080/'})
+        App.objects.get(id=app_id).release_set.all().delete()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
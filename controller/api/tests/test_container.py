@@ -9,14 +9,18 @@ from __future__ import unicode_literals
 import json
 import mock
 import requests
+from datetime import timedelta
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.test import TransactionTestCase
 from django.test.utils import override_settings
+from django.utils import timezone
 
 from django_fsm import TransitionNotAllowed
 
-from api.models import Container, App
+from api.models import Container, App, Operation
+from api.streams import StreamsBusy
 
 
 def mock_import_repository_task(*args, **kwargs):
@@ -133,12 +137,12 @@ class ContainerTest(TransactionTestCase):
         body = {'image': 'autotest/example', 'sha': 'a'*40,
                 'procfile': json.dumps({'web': 'node server.js', 'worker': 'node worker.js'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         # scale up
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'web': 4, 'worker': 2}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -160,7 +164,7 @@ class ContainerTest(TransactionTestCase):
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'web': 2, 'worker': 1}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -173,7 +177,7 @@ class ContainerTest(TransactionTestCase):
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'web': 0, 'worker': 0}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -198,12 +202,12 @@ class ContainerTest(TransactionTestCase):
         url = "/api/apps/{app_id}/builds".format(**locals())
         body = {'image': 'autotest/example', 'dockerfile': "FROM busybox\nCMD /bin/true"}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         # scale up
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'cmd': 6}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -220,7 +224,7 @@ class ContainerTest(TransactionTestCase):
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'cmd': 3}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -233,7 +237,7 @@ class ContainerTest(TransactionTestCase):
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'cmd': 0}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -259,12 +263,12 @@ class ContainerTest(TransactionTestCase):
         body = {'image': 'autotest/example', 'sha': 'a'*40,
                 'procfile': json.dumps({'web': 'node server.js', 'worker': 'node worker.js'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         # scale up
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'web': 1}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -274,8 +278,8 @@ class ContainerTest(TransactionTestCase):
         url = "/api/apps/{app_id}/builds".format(**locals())
         body = {'image': 'autotest/example'}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
-        self.assertEqual(response.data['image'], body['image'])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['X-Deis-Release'], '3')
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -285,7 +289,7 @@ class ContainerTest(TransactionTestCase):
         url = "/api/apps/{app_id}/config".format(**locals())
         body = {'values': json.dumps({'KEY': 'value'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -318,12 +322,12 @@ class ContainerTest(TransactionTestCase):
         body = {'image': 'autotest/example', 'sha': 'a'*40,
                 'procfile': json.dumps({'web': 'node server.js', 'worker': 'node worker.js'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         # scale up
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'web': 4, 'worker': 2}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         # should start with zero
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
@@ -348,12 +352,12 @@ class ContainerTest(TransactionTestCase):
         body = {'image': 'autotest/example', 'sha': 'a'*40,
                 'procfile': json.dumps({'web': 'node server.js', 'worker': 'node worker.js'})}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         # scale up
         url = "/api/apps/{app_id}/scale".format(**locals())
         body = {'web': 1}
         response = self.client.post(url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/containers".format(**locals())
         response = self.client.get(url)
         # verify that the container._command property got formatted
@@ -362,3 +366,201 @@ class ContainerTest(TransactionTestCase):
         uuid = response.data['results'][0]['uuid']
         container = Container.objects.get(uuid=uuid)
         self.assertNotIn('{c_type}', container._command)
+
+    @override_settings(CONTAINER_CHUNK_SIZE=2)
+    def test_container_scale_chunked(self):
+        """Test that scaling spreads containers across chunked subtasks"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app = App.objects.get(id=response.data['id'])
+        app.structure = {'cmd': 5}
+        app.scale()
+        self.assertEqual([c.state for c in app.container_set.all()], ['up'] * 5)
+        app.deploy(app.release_set.latest())
+        self.assertEqual([c.state for c in app.container_set.all()], ['up'] * 5)
+        app.structure = {'cmd': 0}
+        app.scale()
+        self.assertEqual(app.container_set.count(), 0)
+
+    @override_settings(CONTAINER_CHUNK_SIZE=2)
+    def test_container_scale_failures(self):
+        """Test that failed containers are reported across all chunks"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest2'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app = App.objects.get(id=response.data['id'])
+        app.structure = {'cmd': 3}
+        self.assertRaisesRegexp(EnvironmentError, '3 of 3 containers failed', app.scale)
+        self.assertEqual([c.state for c in app.container_set.all()], ['initialized'] * 3)
+
+    def test_container_strategy(self):
+        """Test setting a rolling deploy strategy"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        url = "/api/apps/{app_id}/strategy".format(**locals())
+        body = {'batch_size': '2', 'web': {'max_surge': 1}}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'batch_size': 2, 'web': {'max_surge': 1}})
+        self.assertEqual(App.objects.get(id=app_id).strategy,
+                         {'batch_size': 2, 'web': {'max_surge': 1}})
+        for body in ({'batch_size': 'all'}, {'max_surge': -1}, {'web': {'bogus': 1}}):
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertContains(response, 'Invalid deploy strategy format', status_code=400)
+
+    def test_container_rollout(self):
+        """Test that a rolling deploy replaces containers batch by batch"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app = App.objects.get(id=response.data['id'])
+        app.strategy = {'batch_size': 2, 'worker': {'batch_size': 3, 'max_surge': 0}}
+        app.save()
+        for c_type, count in (('web', 5), ('worker', 3)):
+            for num in range(1, count + 1):
+                Container.objects.create(owner=app.owner, app=app, type=c_type, num=num,
+                                         release=app.release_set.latest())
+        batches = app._rollout(app.container_set.order_by('num'))
+        self.assertEqual([sorted(str(c) for c in batch) for batch, _ in batches], [
+            ['{}.web.1'.format(app.id), '{}.web.2'.format(app.id),
+             '{}.worker.1'.format(app.id), '{}.worker.2'.format(app.id),
+             '{}.worker.3'.format(app.id)],
+            ['{}.web.3'.format(app.id), '{}.web.4'.format(app.id)],
+            ['{}.web.5'.format(app.id)]])
+        # workers are all replaced in place, web containers all surge
+        self.assertEqual(
+            sorted(Container.objects.get(uuid=uuid).num for uuid in batches[0][1]), [1, 2, 3])
+        self.assertEqual(batches[1][1], [])
+        for c in app.container_set.all():
+            c.create()
+            c.start()
+        app.deploy(app.release_set.latest())
+        self.assertEqual(set(c.state for c in app.container_set.all()), set(['up']))
+
+    def test_container_operations(self):
+        """Test that scaling and deploying are followed through operations"""
+        for cluster, state in (('autotest', 'succeeded'), ('autotest2', 'failed')):
+            url = '/api/apps'
+            body = {'cluster': cluster}
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            app_id = response.data['id']
+            url = "/api/apps/{app_id}/builds".format(**locals())
+            body = {'image': 'autotest/example', 'sha': 'a'*40,
+                    'procfile': json.dumps({'worker': 'node worker.js'})}
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            response = self.client.get(response['X-Deis-Operation'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['type'], 'deploy')
+            url = "/api/apps/{app_id}/scale".format(**locals())
+            body = {'worker': 3}
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['type'], 'scale')
+            url = response['X-Deis-Operation']
+            response = self.client.get(url, {'wait': 5})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['state'], state)
+            progress = json.loads(response.data['progress'])
+            if state == 'succeeded':
+                self.assertEqual(len(progress['done']), 3)
+                self.assertEqual(response.data['error'], '')
+            else:
+                self.assertEqual(len(progress['failed']), 3)
+                self.assertIn('3 of 3 containers failed', response.data['error'])
+            response = self.client.get(url, {'wait': 'soon'})
+            self.assertEqual(response.status_code, 400)
+            url = "/api/apps/{app_id}/operations".format(**locals())
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([op['type'] for op in response.data['results']], ['scale', 'deploy'])
+
+    def test_operations_in_turn(self):
+        """Test that operations on an app wait for earlier ones, and see the app afresh"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app = App.objects.get(id=response.data['id'])
+        user = User.objects.get(username='autotest')
+        earlier = Operation.objects.create(owner=user, app=app, type=Operation.SCALE,
+                                           params={'structure': {}})
+        earlier.start()
+        operation = Operation.objects.create(owner=user, app=app, type=Operation.SCALE,
+                                             params={'structure': {}})
+        # the queued copy of the app goes stale while it waits
+        App.objects.filter(pk=app.pk).update(retention={'releases': 5})
+        self.assertFalse(operation.execute())
+        self.assertEqual(Operation.objects.get(pk=operation.pk).state, 'pending')
+        # a command does not wait
+        run = Operation.objects.create(owner=user, app=app, type=Operation.RUN,
+                                       params={'command': 'ls -al'})
+        self.assertTrue(run.execute())
+        self.assertEqual(Operation.objects.get(pk=run.pk).state, 'succeeded')
+        # nor does anything wait on an operation that has stopped changing
+        lost = timezone.now() - timedelta(seconds=settings.OPERATION_TIMEOUT + 1)
+        Operation.objects.filter(pk=earlier.pk).update(updated=lost)
+        self.assertTrue(operation.execute())
+        self.assertEqual(Operation.objects.get(pk=operation.pk).state, 'succeeded')
+        self.assertEqual(App.objects.get(pk=app.pk).retention, {'releases': 5})
+
+    def test_operation_wait_busy(self):
+        """Test that waiting on an operation is turned away when every stream slot is taken"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app = App.objects.get(id=response.data['id'])
+        operation = Operation.objects.create(owner=User.objects.get(username='autotest'),
+                                             app=app, type=Operation.SCALE)
+        url = "/api/apps/{}/operations/{}".format(app.id, operation.uuid)
+        with mock.patch('api.streams.acquire', side_effect=StreamsBusy('busy')):
+            response = self.client.get(url, {'wait': 5})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            # no slot is needed to answer straight away
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['state'], 'pending')
+
+    @mock.patch('api.events.publish')
+    def test_container_events(self, mock_publish):
+        """Test that container transitions, operations and releases are published"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        url = "/api/apps/{app_id}/builds".format(**locals())
+        body = {'image': 'autotest/example', 'sha': 'a'*40,
+                'procfile': json.dumps({'worker': 'node worker.js'})}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        url = "/api/apps/{app_id}/scale".format(**locals())
+        body = {'worker': 2}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        published = [(args[1], kwargs) for args, kwargs in mock_publish.call_args_list
+                     if args[0] == app_id]
+        kinds = set(kind for kind, _ in published)
+        self.assertEqual(kinds, set(['log', 'release', 'container', 'operation']))
+        up = set(event['name'] for kind, event in published
+                 if kind == 'container' and event['type'] == 'worker' and event['state'] == 'up')
+        self.assertEqual(up, set(['{}.worker.1'.format(app_id), '{}.worker.2'.format(app_id)]))
+        operation = [event for kind, event in published if kind == 'operation'][-1]
+        self.assertEqual(operation['uuid'], response.data['uuid'])
+        self.assertEqual(operation['state'], 'succeeded')
+        url = "/api/apps/{app_id}/events".format(**locals())
+        with self.settings(EVENTS_URL=None):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 503)
+        response = self.client.get(url, {'wait': 'soon'})
+        self.assertEqual(response.status_code, 400)
@@ -54,7 +54,7 @@ class DomainTest(TestCase):
         self.assertEqual(response.status_code, 204)
         url = '/api/apps/{app_id}/domains'.format(app_id=self.app_id)
         response = self.client.get(url, content_type='application/json')
-        self.assertEqual(0, response.data['count'])
+        self.assertEqual(0, len(response.data['results']))
 
     def test_manage_domain_invalid_app(self):
         url = '/api/apps/{app_id}/domains'.format(app_id="this-app-does-not-exist")
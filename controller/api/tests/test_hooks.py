@@ -124,10 +124,12 @@ class HookTest(TransactionTestCase):
         # post the build with the builder auth key
         response = self.client.post(url, json.dumps(body), content_type='application/json',
                                     HTTP_X_DEIS_BUILDER_AUTH=settings.BUILDER_KEY)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn('release', response.data)
-        self.assertIn('version', response.data['release'])
-        self.assertIn('domains', response.data)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['type'], 'deploy')
+        self.assertEqual(response.data['state'], 'succeeded')
+        self.assertEqual(response['X-Deis-Release'], '2')
+        self.assertEqual(response['X-Deis-Domains'], '{}.autotest.local'.format(app_id))
+        self.assertEqual(response['Location'], response['X-Deis-Operation'])
 
     def test_build_hook_procfile(self):
         """Test creating a Procfile build via an API Hook"""
@@ -152,10 +154,9 @@ class HookTest(TransactionTestCase):
         # post the build with the builder auth key
         response = self.client.post(url, json.dumps(body), content_type='application/json',
                                     HTTP_X_DEIS_BUILDER_AUTH=settings.BUILDER_KEY)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn('release', response.data)
-        self.assertIn('version', response.data['release'])
-        self.assertIn('domains', response.data)
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('X-Deis-Release', response)
+        self.assertIn('X-Deis-Domains', response)
         # make sure build fields were populated
         self.assertTrue(
             self.client.login(username='autotest', password='password'))
@@ -201,10 +202,9 @@ class HookTest(TransactionTestCase):
         # post the build with the builder auth key
         response = self.client.post(url, json.dumps(body), content_type='application/json',
                                     HTTP_X_DEIS_BUILDER_AUTH=settings.BUILDER_KEY)
-        self.assertEqual(response.status_code, 200)
-        self.assertIn('release', response.data)
-        self.assertIn('version', response.data['release'])
-        self.assertIn('domains', response.data)
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('X-Deis-Release', response)
+        self.assertIn('X-Deis-Domains', response)
         # make sure build fields were populated
         self.assertTrue(
             self.client.login(username='autotest', password='password'))
@@ -2,9 +2,14 @@
 from __future__ import unicode_literals
 import json
 
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.test.utils import override_settings
 
+from api.models import AppAccess
+
 
 @override_settings(CELERY_ALWAYS_EAGER=True)
 class TestAdminPerms(TestCase):
@@ -246,3 +251,58 @@ class TestAppPerms(TestCase):
         response = self.client.get(
             "/api/apps/{}/perms".format(app_id), content_type='application/json')
         self.assertEqual(response.status_code, 403)
+
+    def test_list_queries(self):
+        response = self.client.get('/api/apps')
+        app_id = response.data['results'][0]['id']
+        url = "/api/apps/{}/perms".format(app_id)
+        counts = []
+        for n in (1, 20):
+            for i in range(1, n):
+                User.objects.create_user('collaborator-{}'.format(i), password='password')
+            for user in User.objects.filter(username__startswith='collaborator-'):
+                body = {'username': user.username}
+                response = self.client.post(url, json.dumps(body),
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 201)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['users']), n - 1)
+            counts.append(len(queries))
+        # listing collaborators does not check each one's permissions in turn
+        self.assertEqual(counts[0], counts[1])
+
+    def test_collaborator_access(self):
+        response = self.client.get('/api/apps')
+        app_id = response.data['results'][0]['id']
+        url = "/api/apps/{}/perms".format(app_id)
+        body = {'username': 'autotest-2'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            self.client.login(username='autotest-2', password='password'))
+        response = self.client.get('/api/apps/{}'.format(app_id))
+        self.assertEqual(response.status_code, 200)
+        # collaborators may use the app but not destroy it
+        response = self.client.delete('/api/apps/{}'.format(app_id))
+        self.assertEqual(response.status_code, 403)
+        # revoking access takes effect on the next request
+        self.assertTrue(
+            self.client.login(username='autotest-1', password='password'))
+        response = self.client.delete(url + '/autotest-2')
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(
+            self.client.login(username='autotest-2', password='password'))
+        # apps are looked up among those the user may access, so it is gone
+        response = self.client.get('/api/apps/{}'.format(app_id))
+        self.assertEqual(response.status_code, 404)
+        # the sharing endpoints agree with the app lookups
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(
+            self.client.login(username='autotest-1', password='password'))
+        response = self.client.delete(url + '/autotest-2')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(AppAccess.objects.filter(
+            user__username='autotest-2', app__id=app_id).exists())
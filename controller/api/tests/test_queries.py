@@ -0,0 +1,117 @@
+"""
+Unit tests for the Deis api app.
+
+Run the tests with "./manage.py test api"
+"""
+
+from __future__ import unicode_literals
+
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+
+from api.models import App, AppAccess, Build, Config, Container, Domain, Key, Release
+
+
+class QueryCountMixin(object):
+    """Assertions about the number of database queries a request runs."""
+
+    def assertConstantQueries(self, url, seed, sizes=(10, 1000)):
+        """
+        Assert that GETting url runs the same number of queries however many
+        rows seed(n), which adds n more rows, has put behind it
+        """
+        counts, seeded = [], 0
+        for size in sizes:
+            seed(size - seeded)
+            seeded = size
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, '{} ran {} queries for {} rows'.format(
+            url, counts, sizes))
+
+
+@override_settings(CELERY_ALWAYS_EAGER=True)
+class QueryCountTest(QueryCountMixin, TestCase):
+
+    """Tests that list endpoints do not query once per row"""
+
+    fixtures = ['tests.json']
+
+    def setUp(self):
+        self.assertTrue(
+            self.client.login(username='autotest', password='password'))
+        body = {'id': 'autotest', 'domain': 'autotest.local', 'type': 'mock',
+                'hosts': 'host1,host2', 'auth': 'base64string', 'options': {}}
+        response = self.client.post('/api/clusters', json.dumps(body),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/apps', json.dumps({'cluster': 'autotest'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.app = App.objects.get(id=response.data['id'])
+        self.user = User.objects.get(username='autotest')
+        self.count = 0
+
+    def _next(self, n):
+        """Return the next n sequence numbers for seeded rows"""
+        start, self.count = self.count, self.count + n
+        return range(start + 1, self.count + 1)
+
+    def test_apps(self):
+        def seed(n):
+            App.objects.bulk_create([App(owner=self.user, id='app-{}'.format(i),
+                                         cluster=self.app.cluster) for i in self._next(n)])
+            # bulk inserts skip the signal that indexes new apps
+            AppAccess.objects.bulk_create([AppAccess(user=self.user, app=app, role='owner')
+                                           for app in App.objects.filter(appaccess=None)])
+        self.assertConstantQueries('/api/apps', seed)
+
+    def test_builds(self):
+        def seed(n):
+            Build.objects.bulk_create([Build(owner=self.user, app=self.app,
+                                             image='autotest/example') for _ in self._next(n)])
+        self.assertConstantQueries('/api/apps/{}/builds'.format(self.app.id), seed)
+
+    def test_config(self):
+        def seed(n):
+            Config.objects.bulk_create([Config(owner=self.user, app=self.app, values={})
+                                        for _ in self._next(n)])
+        self.assertConstantQueries('/api/apps/{}/config'.format(self.app.id), seed)
+
+    def test_releases(self):
+        release = self.app.current_release
+        self.count = release.version
+
+        def seed(n):
+            Release.objects.bulk_create([
+                Release(owner=self.user, app=self.app, version=i, summary='',
+                        config=release.config, build=release.build) for i in self._next(n)])
+        self.assertConstantQueries('/api/apps/{}/releases'.format(self.app.id), seed)
+
+    def test_containers(self):
+        def seed(n):
+            Container.objects.bulk_create([
+                Container(owner=self.user, app=self.app, release=self.app.current_release,
+                          type='web', num=i) for i in self._next(n)])
+        self.assertConstantQueries('/api/apps/{}/containers'.format(self.app.id), seed)
+
+    def test_domains(self):
+        def seed(n):
+            Domain.objects.bulk_create([
+                Domain(owner=self.user, app=self.app, domain='d{}.example.com'.format(i))
+                for i in self._next(n)])
+        self.assertConstantQueries('/api/apps/{}/domains'.format(self.app.id), seed)
+
+    def test_keys(self):
+        def seed(n):
+            Key.objects.bulk_create([
+                Key(owner=self.user, id='key-{}'.format(i), public='ssh-rsa {}'.format(i))
+                for i in self._next(n)])
+        self.assertConstantQueries('/api/keys', seed)
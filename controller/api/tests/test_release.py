@@ -6,14 +6,20 @@ Run the tests with "./manage.py test api"
 
 from __future__ import unicode_literals
 
+import gzip
 import json
 import mock
+import os.path
 import requests
+import shutil
+import tempfile
 
+from django.core.cache import cache
 from django.test import TransactionTestCase
 from django.test.utils import override_settings
 
-from api.models import Release
+from api.models import App, Build, Config, Container, Release
+from api.views import AppReleaseViewSet
 
 
 def mock_import_repository_task(*args, **kwargs):
@@ -55,14 +61,14 @@ class ReleaseTest(TransactionTestCase):
         body = {'values': json.dumps({'NEW_URL1': 'http://localhost:8080/'})}
         response = self.client.post(
             url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
-        self.assertIn('NEW_URL1', json.loads(response.data['values']))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['X-Deis-Release'], '2')
         # check to see that an initial release was created
         url = '/api/apps/{app_id}/releases'.format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         # account for the config release as well
-        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 2)
         url = '/api/apps/{app_id}/releases/v1'.format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -86,8 +92,8 @@ class ReleaseTest(TransactionTestCase):
         body = {'image': 'autotest/example'}
         response = self.client.post(
             url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
-        self.assertEqual(response.data['image'], body['image'])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['X-Deis-Release'], '3')
         # check to see that a new release was created
         url = '/api/apps/{app_id}/releases/v3'.format(**locals())
         response = self.client.get(url)
@@ -128,23 +134,25 @@ class ReleaseTest(TransactionTestCase):
         body = {'values': json.dumps({'NEW_URL1': 'http://localhost:8080/'})}
         response = self.client.post(
             url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         # update the build to roll a new release
         url = '/api/apps/{app_id}/builds'.format(**locals())
         build_config = json.dumps({'PATH': 'bin:/usr/local/bin:/usr/bin:/bin'})
         body = {'image': 'autotest/example'}
         response = self.client.post(
             url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         # rollback and check to see that a 4th release was created
         # with the build and config of release #2
         url = "/api/apps/{app_id}/releases/rollback/".format(**locals())
         response = self.client.post(url, content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['type'], 'rollback')
+        self.assertEqual(response['X-Deis-Release'], '4')
         url = '/api/apps/{app_id}/releases'.format(**locals())
         response = self.client.get(url, content_type='application/json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 4)
         url = '/api/apps/{app_id}/releases/v2'.format(**locals())
         response = self.client.get(url, content_type='application/json')
         self.assertEqual(response.status_code, 200)
@@ -164,11 +172,11 @@ class ReleaseTest(TransactionTestCase):
         body = {'version': 1}
         response = self.client.post(
             url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         url = '/api/apps/{app_id}/releases'.format(**locals())
         response = self.client.get(url, content_type='application/json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 5)
         url = '/api/apps/{app_id}/releases/v1'.format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -191,7 +199,7 @@ class ReleaseTest(TransactionTestCase):
         body = {'version': 3}
         response = self.client.post(
             url, json.dumps(body), content_type='application/json')
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
         url = "/api/apps/{app_id}/config".format(**locals())
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
@@ -213,3 +221,138 @@ class ReleaseTest(TransactionTestCase):
         release = Release.objects.get(uuid=release3['uuid'])
         # check that the release has push and env change messages
         self.assertIn('autotest deployed ', release.summary)
+
+    @mock.patch('requests.post', mock_import_repository_task)
+    def test_release_current(self):
+        """Test that the app always points at its newest release"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        self.assertEqual(App.objects.get(id=app_id).current_release.version, 1)
+        url = '/api/apps/{app_id}/config'.format(**locals())
+        body = {'values': json.dumps({'NEW_URL1': 'http://localhost:8080/'})}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        url = '/api/apps/{app_id}/builds'.format(**locals())
+        body = {'image': 'autotest/example'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        app = App.objects.get(id=app_id)
+        self.assertEqual(app.current_release, app.release_set.latest())
+        self.assertEqual(app.current_release.version, 3)
+        self.assertEqual(app.current_release.previous().version, 2)
+        url = '/api/apps/{app_id}/releases/rollback/'.format(**locals())
+        response = self.client.post(url, json.dumps({'version': 1}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        app = App.objects.get(id=app_id)
+        self.assertEqual(app.current_release.version, 4)
+        self.assertEqual(app.current_release.build, app.release_set.get(version=1).build)
+        # saving a stale copy of the app must not move its release back
+        stale = App.objects.get(id=app_id)
+        stale.current_release = app.release_set.get(version=1)
+        stale.save()
+        self.assertEqual(App.objects.get(id=app_id).current_release.version, 4)
+
+    def test_release_retention(self):
+        """Test setting an app's retention policy"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        url = '/api/apps/{app_id}/retention'.format(**locals())
+        body = {'releases': '20', 'archive': True}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'releases': 20, 'archive': True})
+        self.assertEqual(App.objects.get(id=app_id).retention, {'releases': 20, 'archive': True})
+        for body in ({'releases': -1}, {'releases': 'all'}, {'archive': 'yes'}, {'bogus': 1}):
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertContains(response, 'Invalid retention policy format', status_code=400)
+
+    @override_settings(CONFIG_SNAPSHOT_INTERVAL=3)
+    @mock.patch('requests.post', mock_import_repository_task)
+    def test_release_prune(self):
+        """Test that pruning keeps the newest releases and whatever they need"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        for n in range(1, 8):
+            url = '/api/apps/{app_id}/config'.format(**locals())
+            body = {'values': json.dumps({'KEY{}'.format(n): str(n)})}
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+        app = App.objects.get(id=app_id)
+        # a container still runs v2, and nothing is pruned without a policy
+        Container.objects.create(owner=app.owner, app=app, type='web', num=1,
+                                 release=app.release_set.get(version=2))
+        self.assertEqual(app.prune(), {'container': 0})
+        self.assertEqual(app.release_set.count(), 8)
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        app.retention = {'releases': 3, 'archive': True}
+        app.save()
+        with self.settings(DEIS_ARCHIVE_DIR=archive_dir):
+            pruned = app.prune()
+        self.assertEqual(pruned['release'], 4)
+        self.assertEqual(pruned['build'], 0)
+        self.assertEqual(
+            sorted(app.release_set.values_list('version', flat=True)), [2, 6, 7, 8])
+        self.assertEqual(Build.objects.filter(app=app).count(), 1)
+        # configs still in use keep the snapshots their deltas apply to
+        cache.clear()
+        for release in app.release_set.all():
+            config = Config.objects.get(pk=release.config_id)
+            self.assertEqual(len(config.values), release.version - 1)
+        self.assertEqual(pruned['config'], 1)
+        self.assertEqual(Config.objects.filter(app=app).count(), 7)
+        archived = []
+        for name in os.listdir(archive_dir):
+            with gzip.open(os.path.join(archive_dir, name)) as f:
+                archived.extend(json.loads(line) for line in f)
+        self.assertEqual(
+            sorted(r['fields']['version'] for r in archived if r['model'] == 'api.release'),
+            [1, 3, 4, 5])
+        self.assertEqual(len(archived), sum(pruned.values()))
+        # a second run finds nothing more to do
+        self.assertEqual(sum(app.prune().values()), 0)
+        # a pruned release cannot be rolled back to, nor one never made
+        url = '/api/apps/{app_id}/releases/rollback/'.format(**locals())
+        response = self.client.post(url, json.dumps({'version': 3}),
+                                    content_type='application/json')
+        self.assertContains(response, 'v3 was pruned', status_code=400)
+        response = self.client.post(url, json.dumps({'version': 9}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(url, json.dumps({'version': 'v2'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch.object(AppReleaseViewSet, 'paginate_by', 2)
+    @mock.patch('requests.post', mock_import_repository_task)
+    def test_release_list_cursor(self):
+        """Test that releases are paged by cursor, newest first"""
+        url = '/api/apps'
+        body = {'cluster': 'autotest'}
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        app_id = response.data['id']
+        for n in range(4):
+            url = '/api/apps/{app_id}/config'.format(**locals())
+            body = {'values': json.dumps({'KEY': str(n)})}
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+        versions, url = [], '/api/apps/{app_id}/releases'.format(**locals())
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            versions.extend(r['version'] for r in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(versions, [5, 4, 3, 2, 1])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([r['version'] for r in response.data['results']], [3, 2])
@@ -0,0 +1,361 @@
+"""
+Unit tests for the Deis api app.
+
+Run the tests with "./manage.py test api"
+"""
+
+from __future__ import unicode_literals
+
+import base64
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+from cStringIO import StringIO
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from scheduler import coreos, fake_fleet, faulty, fleet_api, futures, mock
+
+
+class FakeTransport(object):
+    """Stand-in for :class:`~scheduler.coreos.SSHTransport` that records commands."""
+
+    def __init__(self, host, key_path):
+        self.host = host
+        self.key_path = key_path
+        self.commands = []
+        self.outputs = {}
+        self.rc = 0
+        self.reachable = True
+        self.fail_once = set()
+
+    def run(self, command, data=None):
+        self.commands.append((command, data))
+        if not self.reachable:
+            raise coreos.SSHError(coreos.SSH_ERROR, 'Connection refused')
+        if command in self.fail_once:
+            self.fail_once.remove(command)
+            return 1, 'Unit not found'
+        return self.rc, self.outputs.get(command, '')
+
+    def check_output(self, command, data=None):
+        return self.run(command, data)[1]
+
+
+@override_settings(SCHEDULER_UNIT_CACHE=None)
+class FleetClientTest(SimpleTestCase):
+
+    """Tests the fleet scheduler over a fake SSH transport"""
+
+    def setUp(self):
+        # clients write their cluster's key out, so keep them out of the tree
+        self._root_dir = coreos.ROOT_DIR
+        coreos.ROOT_DIR = tempfile.mkdtemp()
+        self._transports = coreos._transports.copy()
+        coreos._transports.clear()
+        self._pollers = coreos._pollers.copy()
+        coreos._pollers.clear()
+        coreos._indexes.clear()
+        coreos._selectors.clear()
+        self._get_transport = coreos.get_transport
+        coreos.get_transport = lambda host, key_path: self._get_transport(
+            host, key_path, transport_class=FakeTransport)
+
+    def tearDown(self):
+        shutil.rmtree(coreos.ROOT_DIR)
+        coreos.ROOT_DIR = self._root_dir
+        coreos.get_transport = self._get_transport
+        coreos._transports.clear()
+        coreos._transports.update(self._transports)
+        coreos._pollers.clear()
+        coreos._pollers.update(self._pollers)
+        coreos._indexes.clear()
+        coreos._selectors.clear()
+
+    def _client(self, hosts='host1'):
+        return coreos.FleetClient('autotest', hosts, base64.b64encode('key'),
+                                  'autotest.local', {})
+
+    def test_transport_pooled(self):
+        """Clients for the same cluster host share one transport"""
+        c1, c2 = self._client(), self._client()
+        self.assertIs(c1.transport, c2.transport)
+        self.assertEqual(c1.transport.host, 'host1')
+
+    def test_transport_per_key(self):
+        """Connections to a host made with different keys are never shared"""
+        c1 = self._client()
+        c2 = coreos.FleetClient('autotest', 'host1', base64.b64encode('other key'),
+                                'autotest.local', {})
+        self.assertIsNot(c1.transport, c2.transport)
+        self.assertNotEqual(coreos.SSHTransport('host1', c1.auth_path).control_path,
+                            coreos.SSHTransport('host1', c2.auth_path).control_path)
+
+    def test_create_streams_units(self):
+        """Unit bodies are streamed over the transport instead of via env vars"""
+        client = self._client()
+        client.create('autotest_v2.web.1', 'autotest:v2', 'start web', use_announcer=True)
+        self.assertEqual(len(client.transport.commands), 1)
+        command, data = client.transport.commands[0]
+        self.assertIn('fleetctl submit', command)
+        tar = tarfile.open(fileobj=StringIO(data))
+        self.assertEqual(tar.getnames(), ['autotest_v2.web.1.service',
+                                          'autotest_v2.web.1-log.service',
+                                          'autotest_v2.web.1-announce.service'])
+        for member in tar.getmembers():
+            self.assertIn('autotest_v2.web.1', tar.extractfile(member).read())
+
+    def test_batched_jobs(self):
+        """Batched operations issue one fleetctl call for all jobs"""
+        client = self._client()
+        jobs = [{'name': 'autotest_v2.web.{}'.format(n), 'image': 'autotest:v2',
+                 'command': 'start web', 'use_announcer': False} for n in range(1, 4)]
+        client.create_many(jobs)
+        client.start_many(jobs)
+        client.destroy_many(jobs)
+        commands = [command for command, _ in client.transport.commands]
+        self.assertEqual(len(commands), 3)
+        self.assertEqual(
+            tarfile.open(fileobj=StringIO(client.transport.commands[0][1])).getnames(),
+            ['autotest_v2.web.1.service', 'autotest_v2.web.1-log.service',
+             'autotest_v2.web.2.service', 'autotest_v2.web.2-log.service',
+             'autotest_v2.web.3.service', 'autotest_v2.web.3-log.service'])
+        self.assertEqual(commands[1], 'fleetctl start -no-block ' + ' '.join(
+            'autotest_v2.web.{0}.service autotest_v2.web.{0}-log.service'.format(n)
+            for n in range(1, 4)))
+        self.assertTrue(commands[2].startswith('fleetctl destroy '))
+
+    def test_unchanged_units_skipped(self):
+        """Units whose bodies were already submitted are not sent again"""
+        client = self._client()
+        client.create('autotest_v2.web.1', 'autotest:v2', 'start web', use_announcer=False)
+        client.create('autotest_v2.web.1', 'autotest:v2', 'start web', use_announcer=False)
+        self.assertEqual(len(client.transport.commands), 1)
+        client.create('autotest_v2.web.1', 'autotest:v3', 'start web', use_announcer=False)
+        self.assertEqual(len(client.transport.commands), 2)
+        tar = tarfile.open(fileobj=StringIO(client.transport.commands[1][1]))
+        self.assertEqual(tar.getnames(), ['autotest_v2.web.1.service'])
+        client.destroy('autotest_v2.web.1', use_announcer=False)
+        client.create('autotest_v2.web.1', 'autotest:v3', 'start web', use_announcer=False)
+        self.assertEqual(len(client.transport.commands), 4)
+
+    def test_unit_index_expiry(self):
+        """Units are submitted again once their entries expire or the cluster is torn down"""
+        client = self._client()
+        client.create('autotest_v2.web.1', 'autotest:v2', 'start web', use_announcer=False)
+        client.create('autotest_v2.web.1', 'autotest:v2', 'start web', use_announcer=False)
+        self.assertEqual(len(client.transport.commands), 1)
+        client.unit_index.ttl = 0
+        client.create('autotest_v2.web.1', 'autotest:v2', 'start web', use_announcer=False)
+        self.assertEqual(len(client.transport.commands), 2)
+        client.unit_index.ttl = None
+        client.tearDown()
+        client = self._client()
+        client.create('autotest_v2.web.1', 'autotest:v2', 'start web', use_announcer=False)
+        self.assertEqual(len(client.transport.commands), 3)
+
+    def test_missing_unit_resubmitted(self):
+        """Units fleet lost are forgotten and submitted again when they fail to start"""
+        client = self._client()
+        jobs = [{'name': 'autotest_v2.web.1', 'image': 'autotest:v2',
+                 'command': 'start web', 'use_announcer': False}]
+        client.create_many(jobs)
+        start = 'fleetctl start -no-block autotest_v2.web.1.service autotest_v2.web.1-log.service'
+        client.transport.fail_once.add(start)
+        client.start_many(jobs)
+        commands = [command for command, _ in client.transport.commands]
+        self.assertEqual(commands[1:3], [start, commands[0]])
+        self.assertEqual(commands[3:], [start])
+        # without what to submit, the failure is raised
+        client.transport.fail_once.add(start)
+        self.assertRaises(subprocess.CalledProcessError, client.start, 'autotest_v2.web.1',
+                          use_announcer=False)
+
+    def test_shared_poller(self):
+        """Every waiter on a cluster is served by one list-units poller"""
+        client = self._client()
+        self.assertIs(client.poller, self._client().poller)
+        client.transport.outputs['fleetctl list-units'] = LIST_UNITS
+        self.assertEqual(client.poller.list_units(), {
+            'autotest_v2.web.1-announce.service': 'running',
+            'autotest_v2.web.2-announce.service': 'start-pre'})
+        client._wait_for_announcers(['autotest_v2.web.1'])
+        listings = [c for c, _ in client.transport.commands if c == 'fleetctl list-units']
+        self.assertEqual(len(listings), 2)
+        waiter = client.poller.watch('autotest_v2.web.2-announce.service', timeout=0)
+        self.assertFalse(waiter.wait())
+
+    def test_host_failover(self):
+        """Commands fail over from an unreachable host, which is re-probed until it recovers"""
+        client = self._client('bad,good')
+        bad = coreos.get_transport('bad', client.auth_path)
+        good = coreos.get_transport('good', client.auth_path)
+        bad.reachable = False
+        selector = client.selector
+        selector.interval = 0.01
+        selector.latency.update({'bad': 0.1, 'good': 1.0})
+        self.assertEqual(selector.ranked(), ['bad', 'good'])
+        client.run('autotest_v2.admin.1', 'autotest:v2', 'true')
+        client.run('autotest_v2.admin.1', 'autotest:v2', 'true')
+        self.assertEqual(len(bad.commands), 1)
+        self.assertEqual(len(good.commands), 2)
+        self.assertEqual(selector.down, set(['bad']))
+        self.assertEqual(selector.ranked(), ['good', 'bad'])
+        bad.reachable = True
+        deadline = time.time() + 5
+        while selector.down and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(selector.down, set())
+        self.assertIn(('true', None), bad.commands)
+
+    def test_run(self):
+        client = self._client()
+        rc, output = client.run('autotest_v2.admin.1', 'autotest:v2', 'docker pull autotest:v2')
+        self.assertEqual(rc, 0)
+        self.assertEqual(client.transport.commands, [('docker pull autotest:v2', None)])
+
+    def test_command_exit_255(self):
+        """A command that exits 255 on a reachable host runs once and keeps its code"""
+        client = self._client('host1,host2')
+        for host in ('host1', 'host2'):
+            coreos.get_transport(host, client.auth_path).rc = coreos.SSH_ERROR
+        rc, _ = client.run('autotest_v2.admin.1', 'autotest:v2', 'exit 255')
+        self.assertEqual(rc, coreos.SSH_ERROR)
+        commands = [coreos.get_transport(host, client.auth_path).commands
+                    for host in ('host1', 'host2')]
+        self.assertEqual(sorted(len(c) for c in commands), [0, 1])
+        self.assertEqual(client.selector.down, set())
+
+    def test_ssh_transport_retry(self):
+        """The transport only reruns a command when its master connection was lost"""
+        class Transport(coreos.SSHTransport):
+            def connect(self):
+                self.connects = getattr(self, 'connects', 0) + 1
+
+            def _exec(self, command, data):
+                self.execs = getattr(self, 'execs', 0) + 1
+                return coreos.SSH_ERROR, ''
+
+        transport = Transport('host1', 'key')
+        transport._alive = lambda: True
+        self.assertEqual(transport.run('exit 255'), (coreos.SSH_ERROR, ''))
+        self.assertEqual(transport.execs, 1)
+        transport = Transport('host1', 'key')
+        transport._alive = lambda: False
+        self.assertRaises(coreos.SSHError, transport.run, 'true')
+        self.assertEqual((transport.connects, transport.execs), (2, 2))
+
+
+@override_settings(SCHEDULER_UNIT_CACHE=None)
+class FleetHTTPClientTest(SimpleTestCase):
+
+    """Tests the fleet HTTP API scheduler against an in-process fake fleet"""
+
+    def setUp(self):
+        self._root_dir = coreos.ROOT_DIR
+        coreos.ROOT_DIR = tempfile.mkdtemp()
+        coreos._indexes.clear()
+        self.server = fake_fleet.FakeFleetServer().start()
+        self.client = fleet_api.SchedulerClient('autotest', '127.0.0.1', '', 'autotest.local',
+                                                {'fleet_api': self.server.url})
+
+    def tearDown(self):
+        self.server.stop()
+        coreos._indexes.clear()
+        shutil.rmtree(coreos.ROOT_DIR)
+        coreos.ROOT_DIR = self._root_dir
+
+    def test_run_client_reused(self):
+        """One-off commands share one SSH scheduler per client, built on first use"""
+        self.assertIsNone(self.client._ssh)
+        ssh = self.client._ssh_client
+        self.assertIsInstance(ssh, coreos.SchedulerClient)
+        self.assertIs(self.client._ssh_client, ssh)
+
+    def test_unit_options(self):
+        options = fleet_api.unit_options('[Unit]\nDescription=web\n\n[Service]\nExecStart=a=b\n')
+        self.assertEqual(options, [
+            {'section': 'Unit', 'name': 'Description', 'value': 'web'},
+            {'section': 'Service', 'name': 'ExecStart', 'value': 'a=b'}])
+
+    def test_job_lifecycle(self):
+        jobs = [{'name': 'autotest_v2.web.{}'.format(n), 'image': 'autotest:v2',
+                 'command': 'start web', 'use_announcer': True} for n in range(1, 3)]
+        self.client.create_many(jobs)
+        units = self.server.units
+        self.assertEqual(len(units), 6)
+        self.assertEqual(set(u['desiredState'] for u in units.values()), set(['inactive']))
+        self.client.start_many(jobs)
+        self.assertEqual(set(u['desiredState'] for u in units.values()), set(['launched']))
+        self.client.stop('autotest_v2.web.1')
+        self.assertEqual(units['autotest_v2.web.1.service']['desiredState'], 'loaded')
+        self.client.destroy_many(jobs)
+        self.assertEqual(units, {})
+
+    def test_missing_unit_resubmitted(self):
+        jobs = [{'name': 'autotest_v2.web.1', 'image': 'autotest:v2',
+                 'command': 'start web', 'use_announcer': False}]
+        self.client.create_many(jobs)
+        # fleet loses the units behind the index's back
+        self.server.units.clear()
+        self.client.start_many(jobs)
+        self.assertEqual(set(u['desiredState'] for u in self.server.units.values()),
+                         set(['launched']))
+        self.assertEqual(len(self.server.units), 2)
+
+
+class FuturesTest(SimpleTestCase):
+
+    """Tests the future-returning scheduler interface"""
+
+    def test_bounded_concurrency(self):
+        """No more calls run at once than the executor has workers"""
+        executor = futures.Executor(2)
+        lock, release = threading.Lock(), threading.Event()
+        running = {'now': 0, 'peak': 0}
+
+        def call(n):
+            with lock:
+                running['now'] += 1
+                running['peak'] = max(running['peak'], running['now'])
+            release.wait(5)
+            with lock:
+                running['now'] -= 1
+            return n
+        pending = [executor.submit(call, n) for n in range(10)]
+        release.set()
+        self.assertEqual([f.result(5) for f in pending], range(10))
+        self.assertEqual(len(executor._workers), 2)
+        self.assertLessEqual(running['peak'], 2)
+
+    def test_error_reraised(self):
+        """A failed call raises its error to every caller waiting on it"""
+        client = futures.AsyncSchedulerClient(
+            faulty.SchedulerClient('autotest', '', '', 'autotest.local', {}), futures.Executor(1))
+        future = client.start('autotest_v2.web.1')
+        self.assertRaises(Exception, future.result, 5)
+        self.assertRaises(Exception, future.result, 5)
+        self.assertTrue(future.done())
+
+    def test_client_calls(self):
+        """Scheduler methods are queued and return their results through futures"""
+        client = futures.AsyncSchedulerClient(
+            mock.SchedulerClient('autotest', '', '', 'autotest.local', {}), futures.Executor(4))
+        jobs = [{'name': 'autotest_v2.web.{}'.format(n), 'image': 'autotest:v2',
+                 'command': 'start web', 'use_announcer': True} for n in range(1, 3)]
+        client.create_many(jobs).result(5)
+        self.assertEqual([s['state'] for s in client.start_many(jobs).result(5)],
+                         ['active', 'active'])
+        self.assertEqual(client.run('autotest_v2.run', 'autotest:v2', 'ls').result(5)[0], 0)
+        with self.assertRaises(AttributeError):
+            client.missing
+
+
+LIST_UNITS = """UNIT\t\t\t\t\tSTATE\t\tLOAD\tACTIVE\tSUB\t\tDESC\t\t\t\tMACHINE
+autotest_v2.web.1-announce.service\tlaunched\tloaded\tactive\trunning\tweb.1 announce\t2b42a8a5...
+autotest_v2.web.2-announce.service\tlaunched\tloaded\tactivating\tstart-pre\tweb.2\t2b42a8a5
+"""
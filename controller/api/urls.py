@@ -94,6 +94,24 @@ Application Infrastructure
   List all :class:`~api.models.Container`\s.
 
 
+Application Operations
+----------------------
+
+Creating a build or config, rolling back, scaling, running a command and the
+build hook each start an :class:`~api.models.Operation`, and answer
+``202 Accepted`` with it, its URL in the ``Location`` and ``X-Deis-Operation``
+headers, and the version of any release made in ``X-Deis-Release``.
+
+.. http:get:: /api/apps/(string:id)/operations/(string:uuid)/
+
+  Retrieve an :class:`~api.models.Operation` by its `uuid`. Pass
+  ``?wait=<seconds>`` to wait until it changes or finishes before answering.
+
+.. http:get:: /api/apps/(string:id)/operations/
+
+  List all :class:`~api.models.Operation`\s.
+
+
 Application Domains
 -------------------
 
@@ -119,8 +137,33 @@ Application Actions
   See also
   :meth:`AppViewSet.scale() <api.views.AppViewSet.scale>`
 
+.. http:post:: /api/apps/(string:id)/strategy/
+
+  See also
+  :meth:`AppViewSet.strategy() <api.views.AppViewSet.strategy>`
+
+.. http:post:: /api/apps/(string:id)/retention/
+
+  See also
+  :meth:`AppViewSet.retention() <api.views.AppViewSet.retention>`
+
+.. http:get:: /api/apps/(string:id)/events/
+
+  Stream the app's container transitions, operation progress, releases and
+  logged events as they happen, as ``text/event-stream``.
+
+  See also
+  :meth:`AppViewSet.events() <api.views.AppViewSet.events>`
+
 .. http:post:: /api/apps/(string:id)/logs/
 
+  Return the app's latest logs. Pass ``?offset=`` from the previous
+  response's ``X-Deis-Log-Offset`` header for only what was logged since, or
+  ``?follow=1&offset=`` to stream it as it is logged. Pass ``?since=``,
+  ``?until=`` (a UTC time, or a duration ago such as ``10m``) or
+  ``?process=`` (such as ``web`` or ``web.1``) for only the lines logged
+  then, by that process.
+
   See also
   :meth:`AppViewSet.logs() <api.views.AppViewSet.logs>`
 
@@ -272,6 +315,11 @@ urlpatterns = patterns(
         views.AppContainerViewSet.as_view({'get': 'list'})),
     url(r'^apps/(?P<id>{})/containers/?'.format(settings.APP_URL_REGEX),
         views.AppContainerViewSet.as_view({'get': 'list'})),
+    # application operations
+    url(r'^apps/(?P<id>{})/operations/(?P<uuid>[-_\w]+)/?'.format(settings.APP_URL_REGEX),
+        views.AppOperationViewSet.as_view({'get': 'retrieve'})),
+    url(r'^apps/(?P<id>{})/operations/?'.format(settings.APP_URL_REGEX),
+        views.AppOperationViewSet.as_view({'get': 'list'})),
     # application domains
     url(r'^apps/(?P<id>{})/domains/(?P<domain>[-\._\w]+)/?'.format(settings.APP_URL_REGEX),
         views.DomainViewSet.as_view({'delete': 'destroy'})),
@@ -280,6 +328,12 @@ urlpatterns = patterns(
     # application actions
     url(r'^apps/(?P<id>{})/scale/?'.format(settings.APP_URL_REGEX),
         views.AppViewSet.as_view({'post': 'scale'})),
+    url(r'^apps/(?P<id>{})/strategy/?'.format(settings.APP_URL_REGEX),
+        views.AppViewSet.as_view({'post': 'strategy'})),
+    url(r'^apps/(?P<id>{})/retention/?'.format(settings.APP_URL_REGEX),
+        views.AppViewSet.as_view({'post': 'retention'})),
+    url(r'^apps/(?P<id>{})/events/?'.format(settings.APP_URL_REGEX),
+        views.AppViewSet.as_view({'get': 'events'})),
     url(r'^apps/(?P<id>{})/logs/?'.format(settings.APP_URL_REGEX),
         views.AppViewSet.as_view({'post': 'logs'})),
     url(r'^apps/(?P<id>{})/run/?'.format(settings.APP_URL_REGEX),
@@ -4,14 +4,22 @@ RESTful view classes for presenting Deis API objects.
 
 from __future__ import absolute_import
 from __future__ import unicode_literals
+import base64
+import hashlib
 import json
+import re
+import time
+from datetime import timedelta
 
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
 from guardian.shortcuts import assign_perm
-from guardian.shortcuts import get_objects_for_user
-from guardian.shortcuts import get_users_with_perms
 from guardian.shortcuts import remove_perm
 from rest_framework import permissions
 from rest_framework import status
@@ -20,12 +28,207 @@ from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.templatetags.rest_framework import replace_query_param
 
-from api import models, serializers
+from api import events, models, serializers, streams
+from api.fields import format_uuid
 
 from django.conf import settings
 
 
+def _encode_cursor(obj, reverse=False):
+    """
+    Return an opaque cursor for the position just after obj, or just before
+    it when reverse is set.
+    """
+    position = '{}{},{}'.format('-' if reverse else '', obj.created.isoformat(), obj.pk)
+    return base64.urlsafe_b64encode(position.encode('utf-8'))
+
+
+def _decode_cursor(cursor):
+    """Return the (created, pk, reverse) position a cursor points past."""
+    try:
+        position = base64.urlsafe_b64decode(str(cursor)).decode('utf-8')
+        created, pk = position.lstrip('-').split(',', 1)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    created = parse_datetime(created)
+    if created is None:
+        raise ValueError('Invalid cursor')
+    return created, pk, position.startswith('-')
+
+
+class CursorPaginationMixin(object):
+    """
+    List a viewset's queryset a page at a time in (created, pk) order.
+
+    Pages link to their neighbours by `next` and `previous` cursors that
+    resume from the last or first row shown, so any page costs an index
+    seek rather than an OFFSET scan over every row before it.
+    """
+
+    # list the newest rows first instead of the oldest
+    newest_first = False
+
+    def get_page(self, request):
+        """
+        Return the rows of the page a request asks for, and the URLs of the
+        pages either side of it. Raises ValueError for an invalid cursor.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        cursor = request.QUERY_PARAMS.get('cursor')
+        reverse = False
+        if cursor:
+            created, pk, reverse = _decode_cursor(cursor)
+            if self.newest_first != reverse:
+                queryset = queryset.filter(Q(created__lt=created) | Q(created=created, pk__lt=pk))
+            else:
+                queryset = queryset.filter(Q(created__gt=created) | Q(created=created, pk__gt=pk))
+        ordering = ('-created', '-pk') if self.newest_first != reverse else ('created', 'pk')
+        page_size = self.get_paginate_by()
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        more, rows = len(rows) > page_size, rows[:page_size]
+        if reverse:
+            rows.reverse()
+        url = request.build_absolute_uri()
+        next_url = previous_url = None
+        if rows and (more or reverse):
+            next_url = replace_query_param(url, 'cursor', _encode_cursor(rows[-1]))
+        if rows and (more if reverse else cursor):
+            previous_url = replace_query_param(
+                url, 'cursor', _encode_cursor(rows[0], reverse=True))
+        return rows, next_url, previous_url
+
+    def page_response(self, rows, next_url, previous_url):
+        serializer = self.get_serializer(rows, many=True)
+        return Response({'next': next_url, 'previous': previous_url,
+                         'results': serializer.data})
+
+    def list(self, request, *args, **kwargs):
+        try:
+            page = self.get_page(request)
+        except ValueError:
+            return Response('Invalid cursor', status=status.HTTP_400_BAD_REQUEST)
+        return self.page_response(*page)
+
+
+def _start_operation(user, app, op_type, **params):
+    """Record an operation on an app and hand it to a celery worker."""
+    operation = models.Operation.objects.create(
+        owner=user, app=app, type=op_type, params=params)
+    operation.enqueue()
+    return operation
+
+
+def _accepted(request, operation, headers=None):
+    """
+    Answer a request with the operation it started, pointing the client at
+    where to follow it.
+    """
+    url = request.build_absolute_uri('/api/apps/{}/operations/{}'.format(
+        operation.app.id, format_uuid(operation.uuid)))
+    headers = dict(headers or {})
+    headers['Location'] = headers['X-Deis-Operation'] = url
+    return Response(serializers.OperationSerializer(operation).data,
+                    status=status.HTTP_202_ACCEPTED, headers=headers)
+
+
+def _busy(error):
+    """Turn away a stream that found no free slot, asking the client to come back."""
+    return Response(str(error), status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': 1})
+
+
+def _parse_log_time(value):
+    """
+    Return the naive UTC time a since or until parameter names, either as a
+    date and time or as a duration ago such as 10m, 2h or 1d.
+    """
+    match = re.match(r'^(\d+)([smhd])$', value)
+    if match:
+        unit = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}[match.group(2)]
+        ago = timedelta(**{unit: int(match.group(1))})
+        return timezone.make_naive(timezone.now(), timezone.utc) - ago
+    logged = parse_datetime(value)
+    if logged is None:
+        raise ValueError(value)
+    if timezone.is_aware(logged):
+        logged = timezone.make_naive(logged, timezone.utc)
+    return logged
+
+
+def _until_finished(stream, operation):
+    """Pass events along until the given operation has finished."""
+    # read the operation again now the stream is subscribed, so an
+    # operation finishing in between cannot be missed
+    operation = models.Operation.objects.get(pk=operation.pk)
+    try:
+        if operation.finished:
+            return
+        for event in stream:
+            yield event
+            if (event['kind'] == 'operation' and
+                    event['uuid'] == format_uuid(operation.uuid) and
+                    event['state'] in (models.Operation.SUCCEEDED, models.Operation.FAILED)):
+                return
+    finally:
+        stream.close()
+
+
+def _server_sent(stream):
+    """Format events as a text/event-stream."""
+    # clients reconnect a second after the stream ends, passing the last id
+    yield 'retry: 1000\n\n'
+    for event in stream:
+        yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+            event['id'], event['kind'], json.dumps(event))
+
+
+class ConditionalGetMixin(object):
+    """
+    Tag the responses to GETs with a strong ETag, and answer a request whose
+    If-None-Match already holds it with 304 Not Modified before anything is
+    serialized.
+
+    A list is tagged by the (pk, updated) of the rows on the page served,
+    which its CursorPaginationMixin fetches by index anyway, and a single
+    object by its own `updated`, so checking the tag costs no query beyond
+    those the response needs.
+    """
+
+    def _etag(self, request, *state):
+        parts = (request.get_full_path(), request.user.pk,
+                 request.accepted_renderer.format) + state
+        return hashlib.sha1(json.dumps(parts, cls=DjangoJSONEncoder)).hexdigest()
+
+    def _not_modified(self, request, etag):
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': quote_etag(etag)})
+
+    def list(self, request, *args, **kwargs):
+        try:
+            rows, next_url, previous_url = self.get_page(request)
+        except ValueError:
+            return Response('Invalid cursor', status=status.HTTP_400_BAD_REQUEST)
+        etag = self._etag(request, [(row.pk, row.updated) for row in rows],
+                          next_url, previous_url)
+        response = self._not_modified(request, etag)
+        if response is None:
+            response = self.page_response(rows, next_url, previous_url)
+            response['ETag'] = quote_etag(etag)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        etag = self._etag(request, self.object.pk, self.object.updated)
+        response = self._not_modified(request, etag)
+        if response is None:
+            serializer = self.get_serializer(self.object)
+            response = Response(serializer.data, headers={'ETag': quote_etag(etag)})
+        return response
+
+
 class AnonymousAuthentication(BaseAuthentication):
 
     def authenticate(self, request):
@@ -61,19 +264,73 @@ class IsOwner(permissions.BasePermission):
             return False
 
 
+class AppPermissions(object):
+    """
+    The apps a user owns and the apps shared with them.
+
+    Both sets of app primary keys are read from the AppAccess index with one
+    query the first time they are needed, so every later check in the same
+    request is a set lookup rather than another trip to guardian.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._owned = self._shared = None
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Return the resolver memoized on user, which lives as long as the request
+        """
+        resolver = getattr(user, '_app_permissions', None)
+        if resolver is None:
+            resolver = user._app_permissions = cls(user)
+        return resolver
+
+    def _load(self):
+        self._owned, self._shared = set(), set()
+        for app_pk, role in models.AppAccess.objects.filter(
+                user=self.user).values_list('app_id', 'role'):
+            if role == models.AppAccess.OWNER:
+                self._owned.add(app_pk)
+            else:
+                self._shared.add(app_pk)
+
+    @property
+    def owned(self):
+        if self._owned is None:
+            self._load()
+        return self._owned
+
+    @property
+    def shared(self):
+        if self._shared is None:
+            self._load()
+        return self._shared
+
+    def owns(self, app_pk):
+        return app_pk in self.owned
+
+    def can_use(self, app_pk):
+        return app_pk in self.owned or app_pk in self.shared
+
+
 class IsAppUser(permissions.BasePermission):
     """
     Object-level permission to allow owners or collaborators to access
     an app-related model.
     """
     def has_object_permission(self, request, view, obj):
-        if isinstance(obj, models.App) and obj.owner == request.user:
-            return True
-        elif hasattr(obj, 'app') and obj.app.owner == request.user:
+        if isinstance(obj, models.App):
+            app_pk = obj.pk
+        elif hasattr(obj, 'app_id'):
+            app_pk = obj.app_id
+        else:
+            return False
+        perms = AppPermissions.for_user(request.user)
+        if perms.owns(app_pk):
             return True
-        elif request.user.has_perm('use_app', obj):
-            return request.method != 'DELETE'
-        elif hasattr(obj, 'app') and request.user.has_perm('use_app', obj.app):
+        elif request.user.is_active and (request.user.is_superuser or perms.can_use(app_pk)):
             return request.method != 'DELETE'
         else:
             return False
@@ -163,7 +420,7 @@ class UserCancellationView(viewsets.GenericViewSet,
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class OwnerViewSet(viewsets.ModelViewSet):
+class OwnerViewSet(ConditionalGetMixin, CursorPaginationMixin, viewsets.ModelViewSet):
     """Scope views to an `owner` attribute."""
 
     permission_classes = (permissions.IsAuthenticated, IsOwner)
@@ -174,10 +431,10 @@ class OwnerViewSet(viewsets.ModelViewSet):
     def get_queryset(self, **kwargs):
         """Filter all querysets by an `owner` attribute.
         """
-        return self.model.objects.filter(owner=self.request.user)
+        return self.model.objects.filter(owner=self.request.user).select_related('owner')
 
 
-class ClusterViewSet(viewsets.ModelViewSet):
+class ClusterViewSet(ConditionalGetMixin, CursorPaginationMixin, viewsets.ModelViewSet):
     """RESTful views for :class:`~api.models.Cluster`."""
 
     model = models.Cluster
@@ -205,33 +462,36 @@ class AppPermsViewSet(viewsets.ViewSet):
 
     def list(self, request, **kwargs):
         app = get_object_or_404(self.model, id=kwargs['id'])
-        perm_name = "api.{}".format(self.perm)
-        if request.user != app.owner and not request.user.has_perm(perm_name, app):
+        if not AppPermissions.for_user(request.user).can_use(app.pk):
             return Response(status=status.HTTP_403_FORBIDDEN)
-        usernames = [u.username for u in get_users_with_perms(app)
-                     if u.has_perm(perm_name, app)]
-        return Response({'users': usernames})
+        usernames = User.objects.filter(
+            appaccess__app=app, appaccess__role=models.AppAccess.COLLABORATOR).values_list(
+            'username', flat=True)
+        return Response({'users': list(usernames)})
 
     def create(self, request, **kwargs):
         app = get_object_or_404(self.model, id=kwargs['id'])
-        if request.user != app.owner:
+        if not AppPermissions.for_user(request.user).owns(app.pk):
             return Response(status=status.HTTP_403_FORBIDDEN)
         user = get_object_or_404(User, username=request.DATA['username'])
         assign_perm(self.perm, user, app)
+        models.AppAccess.objects.get_or_create(
+            user=user, app=app, defaults={'role': models.AppAccess.COLLABORATOR})
         models.log_event(app, "User {} was granted access to {}".format(user, app))
         return Response(status=status.HTTP_201_CREATED)
 
     def destroy(self, request, **kwargs):
         app = get_object_or_404(self.model, id=kwargs['id'])
-        if request.user != app.owner:
+        if not AppPermissions.for_user(request.user).owns(app.pk):
             return Response(status=status.HTTP_403_FORBIDDEN)
         user = get_object_or_404(User, username=kwargs['username'])
-        if user.has_perm(self.perm, app):
-            remove_perm(self.perm, user, app)
-            models.log_event(app, "User {} was revoked access to {}".format(user, app))
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        else:
+        if app.pk not in AppPermissions.for_user(user).shared:
             return Response(status=status.HTTP_404_NOT_FOUND)
+        remove_perm(self.perm, user, app)
+        models.AppAccess.objects.filter(
+            user=user, app=app, role=models.AppAccess.COLLABORATOR).delete()
+        models.log_event(app, "User {} was revoked access to {}".format(user, app))
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class AdminPermsViewSet(viewsets.ModelViewSet):
@@ -267,10 +527,13 @@ class AppViewSet(OwnerViewSet):
 
     def get_queryset(self, **kwargs):
         """
-        Filter Apps by `owner` attribute or the `api.use_app` permission.
+        Filter Apps to those the user owns or collaborates on, through the
+        AppAccess index. Admins see every app.
         """
-        return super(AppViewSet, self).get_queryset(**kwargs) | \
-            get_objects_for_user(self.request.user, 'api.use_app')
+        queryset = self.model.objects.select_related('owner', 'cluster')
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(appaccess__user=self.request.user)
+        return queryset
 
     def post_save(self, app, created=False, **kwargs):
         if created:
@@ -286,50 +549,165 @@ class AppViewSet(OwnerViewSet):
                             status=status.HTTP_400_BAD_REQUEST)
         app = self.get_object()
         try:
-            app.structure = new_structure
-            app.scale()
+            app.check_structure(new_structure)
         except EnvironmentError as e:
             return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
-        return Response(status=status.HTTP_204_NO_CONTENT,
-                        content_type='application/json')
+        operation = _start_operation(
+            request.user, app, models.Operation.SCALE, structure=new_structure)
+        return _accepted(request, operation)
+
+    def strategy(self, request, **kwargs):
+        new_strategy = {}
+        try:
+            for key, value in request.DATA.items():
+                options = value if isinstance(value, dict) else {key: value}
+                parsed = {}
+                for option, count in options.items():
+                    if option not in models.App.STRATEGY_OPTIONS or int(count) < 0:
+                        raise ValueError(option)
+                    parsed[option] = int(count)
+                if isinstance(value, dict):
+                    new_strategy[key] = parsed
+                else:
+                    new_strategy.update(parsed)
+        except (ValueError, TypeError):
+            return Response('Invalid deploy strategy format',
+                            status=status.HTTP_400_BAD_REQUEST)
+        app = self.get_object()
+        app.strategy = new_strategy
+        app.save()
+        return Response(app.strategy, status=status.HTTP_200_OK)
+
+    def retention(self, request, **kwargs):
+        new_retention = {}
+        try:
+            for option, value in request.DATA.items():
+                if option not in models.App.RETENTION_OPTIONS:
+                    raise ValueError(option)
+                if option == 'archive':
+                    if not isinstance(value, bool):
+                        raise ValueError(option)
+                    new_retention[option] = value
+                elif int(value) < 0:
+                    raise ValueError(option)
+                else:
+                    new_retention[option] = int(value)
+        except (ValueError, TypeError, AttributeError):
+            return Response('Invalid retention policy format',
+                            status=status.HTTP_400_BAD_REQUEST)
+        app = self.get_object()
+        app.retention = new_retention
+        app.save()
+        return Response(app.retention, status=status.HTTP_200_OK)
 
     def logs(self, request, **kwargs):
+        """
+        Return the app's latest logs, or with `?offset=` what was logged after
+        that offset. The X-Deis-Log-Offset header holds the offset to pass next.
+
+        With `?follow=1&offset=`, stream what is logged after the offset as it
+        is logged, for up to `?wait=<seconds>`. Streams are turned away with a
+        503 while the controller is serving as many as it allows.
+
+        With `?since=`, `?until=` or `?process=`, return the latest lines
+        logged in that time range, by that process or process type.
+        """
+        params = request.QUERY_PARAMS
+        try:
+            offset = int(params['offset']) if 'offset' in params else None
+            wait = min(float(params.get('wait', settings.LOG_FOLLOW_MAX_WAIT)),
+                       settings.LOG_FOLLOW_MAX_WAIT)
+            if offset is not None and offset < 0:
+                raise ValueError(offset)
+            since = _parse_log_time(params['since']) if 'since' in params else None
+            until = _parse_log_time(params['until']) if 'until' in params else None
+        except ValueError:
+            return Response('Invalid offset, wait, since or until',
+                            status=status.HTTP_400_BAD_REQUEST)
         app = self.get_object()
         try:
-            logs = app.logs()
+            if params.get('follow') and offset is not None:
+                stream = app.follow_logs(offset, wait)
+                try:
+                    slot = streams.acquire(settings.DEIS_STREAM_DIR, settings.STREAM_SLOTS)
+                except streams.StreamsBusy as e:
+                    return _busy(e)
+                return StreamingHttpResponse(streams.Held(slot, stream),
+                                             content_type='text/plain')
+            if since or until or params.get('process'):
+                logs, offset = app.search_logs(since, until, params.get('process'))
+            else:
+                logs, offset = app.logs(offset)
         except EnvironmentError:
             return Response("No logs for {}".format(app.id),
                             status=status.HTTP_204_NO_CONTENT,
                             content_type='text/plain')
         return Response(logs, status=status.HTTP_200_OK,
-                        content_type='text/plain')
+                        content_type='text/plain', headers={'X-Deis-Log-Offset': offset})
 
-    def run(self, request, **kwargs):
+    def events(self, request, **kwargs):
+        """
+        Stream the app's events as they happen, as server-sent events.
+
+        The stream stays open for up to `?wait=<seconds>`. Events after the
+        number in a Last-Event-ID header or `?last=` are replayed first, and
+        with `?operation=<uuid>` the stream ends once that operation has.
+        Streams are turned away with a 503 while the controller is serving as
+        many as it allows.
+        """
+        try:
+            wait = min(float(request.QUERY_PARAMS.get('wait', settings.EVENTS_MAX_WAIT)),
+                       settings.EVENTS_MAX_WAIT)
+            last = request.META.get('HTTP_LAST_EVENT_ID', request.QUERY_PARAMS.get('last'))
+            last = int(last) if last is not None else None
+        except ValueError:
+            return Response('Invalid wait or last event',
+                            status=status.HTTP_400_BAD_REQUEST)
         app = self.get_object()
-        command = request.DATA['command']
+        operation = None
+        if 'operation' in request.QUERY_PARAMS:
+            operation = get_object_or_404(
+                app.operation_set, uuid=request.QUERY_PARAMS['operation'])
         try:
-            output_and_rc = app.run(command)
+            slot = streams.acquire(settings.DEIS_STREAM_DIR, settings.STREAM_SLOTS)
+        except streams.StreamsBusy as e:
+            return _busy(e)
+        try:
+            stream = events.subscribe(app.id, last=last, timeout=wait)
         except EnvironmentError as e:
-            return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
-        return Response(output_and_rc, status=status.HTTP_200_OK,
-                        content_type='text/plain')
+            slot.close()
+            return Response(str(e), status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if operation is not None:
+            stream = _until_finished(stream, operation)
+        response = StreamingHttpResponse(streams.Held(slot, _server_sent(stream)),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def run(self, request, **kwargs):
+        app = self.get_object()
+        operation = _start_operation(
+            request.user, app, models.Operation.RUN, command=request.DATA['command'])
+        return _accepted(request, operation)
 
 
-class BaseAppViewSet(viewsets.ModelViewSet):
+class BaseAppViewSet(ConditionalGetMixin, CursorPaginationMixin, viewsets.ModelViewSet):
 
     permission_classes = (permissions.IsAuthenticated, IsAppUser)
+    # relations the serializer reads on every row, joined up front
+    related_fields = ('owner', 'app')
 
     def pre_save(self, obj):
         obj.owner = self.request.user
 
     def get_queryset(self, **kwargs):
         app = get_object_or_404(models.App, id=self.kwargs['id'])
-        return self.model.objects.filter(app=app)
+        return self.model.objects.filter(app=app).select_related(*self.related_fields)
 
     def get_object(self, *args, **kwargs):
         obj = self.get_queryset().latest('created')
         user = self.request.user
-        if user == obj.app.owner or user in get_users_with_perms(obj.app):
+        if AppPermissions.for_user(user).can_use(obj.app_id):
             return obj
         raise PermissionDenied()
 
@@ -339,24 +717,25 @@ class AppBuildViewSet(BaseAppViewSet):
 
     model = models.Build
     serializer_class = serializers.BuildSerializer
+    newest_first = True
 
     def post_save(self, build, created=False):
         if created:
-            release = build.app.release_set.latest()
+            release = build.app.current_release
             self.release = release.new(self.request.user, build=build)
             initial = True if build.app.structure == {} else False
-            build.app.deploy(self.release, initial=initial)
-
-    def get_success_headers(self, data):
-        headers = super(AppBuildViewSet, self).get_success_headers(data)
-        headers.update({'X-Deis-Release': self.release.version})
-        return headers
+            self.operation = _start_operation(
+                self.request.user, build.app, models.Operation.DEPLOY,
+                release=format_uuid(self.release.uuid), initial=initial)
 
     def create(self, request, *args, **kwargs):
         app = get_object_or_404(models.App, id=self.kwargs['id'])
         request._data = request.DATA.copy()
         request.DATA['app'] = app
-        return super(AppBuildViewSet, self).create(request, *args, **kwargs)
+        response = super(AppBuildViewSet, self).create(request, *args, **kwargs)
+        if response.status_code != status.HTTP_201_CREATED:
+            return response
+        return _accepted(request, self.operation, {'X-Deis-Release': self.release.version})
 
 
 class AppConfigViewSet(BaseAppViewSet):
@@ -364,30 +743,37 @@ class AppConfigViewSet(BaseAppViewSet):
 
     model = models.Config
     serializer_class = serializers.ConfigSerializer
+    newest_first = True
 
     def get_object(self, *args, **kwargs):
         """Return the Config associated with the App's latest Release."""
         app = get_object_or_404(models.App, id=self.kwargs['id'])
-        user = self.request.user
-        if user == app.owner or user in get_users_with_perms(app):
-            return app.release_set.latest().config
-        raise PermissionDenied()
+        if not AppPermissions.for_user(self.request.user).can_use(app.pk):
+            raise PermissionDenied()
+        release = app.current_release_id
+        if release is None:
+            # the app lost its release, as when that release was deleted
+            release = get_object_or_404(app.release_set.order_by('-version')[:1]).pk
+        return get_object_or_404(
+            models.Config.objects.select_related('owner', 'app'), release=release)
+
+    def pre_save(self, config):
+        super(AppConfigViewSet, self).pre_save(config)
+        # store only what changed since the config being replaced
+        config.parent = self.parent_config
 
     def post_save(self, config, created=False):
         if created:
-            release = config.app.release_set.latest()
+            release = config.app.current_release
             self.release = release.new(self.request.user, config=config)
-            config.app.deploy(self.release)
-
-    def get_success_headers(self, data):
-        headers = super(AppConfigViewSet, self).get_success_headers(data)
-        headers.update({'X-Deis-Release': self.release.version})
-        return headers
+            self.operation = _start_operation(
+                self.request.user, config.app, models.Operation.DEPLOY,
+                release=format_uuid(self.release.uuid))
 
     def create(self, request, *args, **kwargs):
         request._data = request.DATA.copy()
         # assume an existing config object exists
-        obj = self.get_object()
+        obj = self.parent_config = self.get_object()
         request.DATA['app'] = obj.app
         # merge config values
         values = obj.values.copy()
@@ -396,7 +782,10 @@ class AppConfigViewSet(BaseAppViewSet):
         # remove config keys if we provided a null value
         [values.pop(k) for k, v in provided.items() if v is None]
         request.DATA['values'] = values
-        return super(AppConfigViewSet, self).create(request, *args, **kwargs)
+        response = super(AppConfigViewSet, self).create(request, *args, **kwargs)
+        if response.status_code != status.HTTP_201_CREATED:
+            return response
+        return _accepted(request, self.operation, {'X-Deis-Release': self.release.version})
 
 
 class AppReleaseViewSet(BaseAppViewSet):
@@ -404,6 +793,8 @@ class AppReleaseViewSet(BaseAppViewSet):
 
     model = models.Release
     serializer_class = serializers.ReleaseSerializer
+    newest_first = True
+    related_fields = ('owner', 'app', 'config', 'build')
 
     def get_object(self, *args, **kwargs):
         """Get Release by version always."""
@@ -416,22 +807,30 @@ class AppReleaseViewSet(BaseAppViewSet):
         config vars of a previous release.
         """
         app = get_object_or_404(models.App, id=self.kwargs['id'])
-        release = app.release_set.latest()
+        release = app.current_release
         last_version = release.version
-        version = int(request.DATA.get('version', last_version - 1))
-        if version < 1:
+        try:
+            version = int(request.DATA.get('version', last_version - 1))
+        except (TypeError, ValueError):
+            return Response('Invalid version', status=status.HTTP_400_BAD_REQUEST)
+        if version < 1 or version > last_version:
             return Response(status=status.HTTP_404_NOT_FOUND)
+        try:
+            prev = app.release_set.get(version=version)
+        except models.Release.DoesNotExist:
+            # versions are never reused, so an older one missing was pruned
+            return Response('v{} was pruned and cannot be rolled back to'.format(version),
+                            status=status.HTTP_400_BAD_REQUEST)
         summary = "{} rolled back to v{}".format(request.user, version)
-        prev = app.release_set.get(version=version)
         new_release = release.new(
             request.user,
             build=prev.build,
             config=prev.config,
             summary=summary,
             source_version='v{}'.format(version))
-        app.deploy(new_release)
-        response = {'version': new_release.version}
-        return Response(response, status=status.HTTP_201_CREATED)
+        operation = _start_operation(
+            request.user, app, models.Operation.ROLLBACK, release=format_uuid(new_release.uuid))
+        return _accepted(request, operation, {'X-Deis-Release': new_release.version})
 
 
 class AppContainerViewSet(OwnerViewSet):
@@ -442,7 +841,7 @@ class AppContainerViewSet(OwnerViewSet):
 
     def get_queryset(self, **kwargs):
         app = get_object_or_404(models.App, id=self.kwargs['id'])
-        qs = self.model.objects.filter(app=app)
+        qs = self.model.objects.filter(app=app).select_related('owner', 'app', 'release')
         container_type = self.kwargs.get('type')
         if container_type:
             qs = qs.filter(type=container_type)
@@ -454,6 +853,47 @@ class AppContainerViewSet(OwnerViewSet):
         return obj
 
 
+class AppOperationViewSet(BaseAppViewSet):
+    """RESTful views for :class:`~api.models.Operation`."""
+
+    model = models.Operation
+    serializer_class = serializers.OperationSerializer
+    newest_first = True
+
+    def get_object(self, *args, **kwargs):
+        obj = get_object_or_404(self.get_queryset(), uuid=self.kwargs['uuid'])
+        if AppPermissions.for_user(self.request.user).can_use(obj.app_id):
+            return obj
+        raise PermissionDenied()
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return an operation. With `?wait=<seconds>`, first hold the request
+        until the operation changes or finishes, for at most that long.
+        """
+        try:
+            wait = min(float(request.QUERY_PARAMS.get('wait', 0)), settings.OPERATION_MAX_WAIT)
+        except ValueError:
+            return Response('Invalid wait', status=status.HTTP_400_BAD_REQUEST)
+        operation = self.get_object()
+        if wait and not operation.finished:
+            # a wait holds a worker just as a stream does, so it takes a slot too
+            try:
+                slot = streams.acquire(settings.DEIS_STREAM_DIR, settings.STREAM_SLOTS)
+            except streams.StreamsBusy as e:
+                return _busy(e)
+            try:
+                deadline = time.time() + wait
+                while time.time() < deadline:
+                    time.sleep(min(1, max(0, deadline - time.time())))
+                    if self.get_queryset().filter(
+                            pk=operation.pk).exclude(updated=operation.updated).exists():
+                        break
+            finally:
+                slot.close()
+        return super(AppOperationViewSet, self).retrieve(request, *args, **kwargs)
+
+
 class KeyViewSet(OwnerViewSet):
     """RESTful views for :class:`~api.models.Key`."""
 
@@ -476,7 +916,7 @@ class DomainViewSet(OwnerViewSet):
 
     def get_queryset(self, **kwargs):
         app = get_object_or_404(models.App, id=self.kwargs['id'])
-        qs = self.model.objects.filter(app=app)
+        qs = self.model.objects.filter(app=app).select_related('owner', 'app')
         return qs
 
     def get_object(self, *args, **kwargs):
@@ -505,7 +945,7 @@ class PushHookViewSet(BaseHookViewSet):
         user = get_object_or_404(
             User, username=request.DATA['receive_user'])
         # check the user is authorized for this app
-        if user == app.owner or user in get_users_with_perms(app):
+        if AppPermissions.for_user(user).can_use(app.pk):
             request._data = request.DATA.copy()
             request.DATA['app'] = app
             request.DATA['owner'] = user
@@ -524,23 +964,27 @@ class BuildHookViewSet(BaseHookViewSet):
         user = get_object_or_404(
             User, username=request.DATA['receive_user'])
         # check the user is authorized for this app
-        if user == app.owner or user in get_users_with_perms(app):
+        if AppPermissions.for_user(user).can_use(app.pk):
             request._data = request.DATA.copy()
             request.DATA['app'] = app
             request.DATA['owner'] = user
-            super(BuildHookViewSet, self).create(request, *args, **kwargs)
-            # return the application databag
-            response = {'release': {'version': app.release_set.latest().version},
-                        'domains': ['.'.join([app.id, app.cluster.domain])]}
-            return Response(response, status=status.HTTP_200_OK)
+            response = super(BuildHookViewSet, self).create(request, *args, **kwargs)
+            if response.status_code != status.HTTP_201_CREATED:
+                return response
+            # tell the builder what to show the user who pushed
+            return _accepted(request, self.operation, {
+                'X-Deis-Release': self.release.version,
+                'X-Deis-Domains': '.'.join([app.id, app.cluster.domain])})
         raise PermissionDenied()
 
     def post_save(self, build, created=False):
         if created:
-            release = build.app.release_set.latest()
-            new_release = release.new(build.owner, build=build)
+            release = build.app.current_release
+            self.release = release.new(build.owner, build=build)
             initial = True if build.app.structure == {} else False
-            build.app.deploy(new_release, initial=initial)
+            self.operation = _start_operation(
+                build.owner, build.app, models.Operation.DEPLOY,
+                release=format_uuid(self.release.uuid), initial=initial)
 
 
 class ConfigHookViewSet(BaseHookViewSet):
@@ -554,8 +998,8 @@ class ConfigHookViewSet(BaseHookViewSet):
         user = get_object_or_404(
             User, username=request.DATA['receive_user'])
         # check the user is authorized for this app
-        if user == app.owner or user in get_users_with_perms(app):
-            config = app.release_set.latest().config
+        if AppPermissions.for_user(user).can_use(app.pk):
+            config = app.current_release.config
             serializer = self.get_serializer(config)
             return Response(serializer.data, status=status.HTTP_200_OK)
         raise PermissionDenied()
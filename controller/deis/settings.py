@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 import os.path
 import sys
 import tempfile
+from datetime import timedelta
 
 PROJECT_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -263,6 +264,48 @@ CELERY_RESULT_BACKEND = BROKER_URL
 # this number should be equal to N+1, where
 # N is number of nodes in largest formation
 CELERYD_CONCURRENCY = 8
+# operations wait on the container subtasks they fan out, so they run on a
+# worker of their own that can never starve those subtasks of a slot
+CELERY_ROUTES = {
+    'api.tasks.run_operation': {'queue': 'operations'},
+}
+# longest a client may hold a request open waiting for an operation to change
+OPERATION_MAX_WAIT = int(os.environ.get('OPERATION_MAX_WAIT', 30))
+# seconds an operation waits before trying again for an app busy with another
+OPERATION_RETRY_DELAY = int(os.environ.get('OPERATION_RETRY_DELAY', 5))
+# an unfinished operation unchanged for this many seconds is taken to be lost,
+# and no longer holds up later operations on its app
+OPERATION_TIMEOUT = int(os.environ.get('OPERATION_TIMEOUT', 60 * 60))
+# periodic tasks, run by the worker started with --beat
+CELERYBEAT_SCHEDULE = {
+    'prune-history': {
+        'task': 'api.tasks.prune_history',
+        'schedule': timedelta(hours=int(os.environ.get('RETENTION_INTERVAL', 24))),
+    },
+}
+
+# scheduler settings
+# redis url where schedulers remember which fleet unit bodies they submitted
+SCHEDULER_UNIT_CACHE = BROKER_URL
+# seconds a remembered unit body is trusted before it is submitted again
+SCHEDULER_UNIT_CACHE_TTL = int(os.environ.get('SCHEDULER_UNIT_CACHE_TTL', 24 * 60 * 60))
+# maximum number of scheduler calls in flight at once per controller process
+SCHEDULER_CONCURRENCY = int(os.environ.get('SCHEDULER_CONCURRENCY', 32))
+# containers handled per celery subtask when scaling or deploying, so large
+# operations are spread across the workers
+CONTAINER_CHUNK_SIZE = int(os.environ.get('CONTAINER_CHUNK_SIZE', 20))
+
+# app event stream settings
+# redis url whose pub/sub carries live app events, or None to turn them off
+EVENTS_URL = BROKER_URL
+# recent events kept per app for clients that reconnect
+EVENTS_BACKLOG = int(os.environ.get('EVENTS_BACKLOG', 100))
+# longest a client may hold an event stream open
+EVENTS_MAX_WAIT = int(os.environ.get('EVENTS_MAX_WAIT', 30))
+# log and event streams served at once by all the gunicorn workers on a
+# host, which must leave some of the workers for every other request
+STREAM_SLOTS = int(os.environ.get('STREAM_SLOTS', 4))
+DEIS_STREAM_DIR = os.path.join(tempfile.gettempdir(), 'deis-streams')
 
 # etcd settings
 ETCD_HOST, ETCD_PORT = os.environ.get('ETCD', '127.0.0.1:4001').split(',')[0].split(':')
@@ -270,6 +313,25 @@ ETCD_HOST, ETCD_PORT = os.environ.get('ETCD', '127.0.0.1:4001').split(',')[0].sp
 # default deis settings
 DEIS_LOG_DIR = os.path.abspath(os.path.join(__file__, '..', '..', 'logs'))
 LOG_LINES = 1000
+# logs are read back from the end a block at a time, and at most this many
+# bytes are returned for an offset a client passes in, or read by a search
+LOG_BLOCK_SIZE = 4096
+LOG_MAX_READ = int(os.environ.get('LOG_MAX_READ', 1024 * 1024))
+# longest a client may hold a request open following an app's logs
+LOG_FOLLOW_MAX_WAIT = int(os.environ.get('LOG_FOLLOW_MAX_WAIT', 30))
+# searches by time seek through a sparse index of each app's logs, which
+# notes the time logged every this many bytes
+LOG_INDEX_INTERVAL = int(os.environ.get('LOG_INDEX_INTERVAL', 64 * 1024))
+DEIS_LOG_INDEX_DIR = os.path.abspath(os.path.join(__file__, '..', '..', 'log-index'))
+# app configs store only their changes, with a full copy of the values
+# every this many generations
+CONFIG_SNAPSHOT_INTERVAL = int(os.environ.get('CONFIG_SNAPSHOT_INTERVAL', 50))
+# history pruning: releases kept per app unless the app sets its own policy
+# (0 keeps all), whether pruned rows are archived, and rows deleted per batch
+RETENTION_RELEASES = int(os.environ.get('RETENTION_RELEASES', 0))
+RETENTION_ARCHIVE = os.environ.get('RETENTION_ARCHIVE', '').lower() in ('1', 'true', 'yes')
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 500))
+DEIS_ARCHIVE_DIR = os.path.abspath(os.path.join(__file__, '..', '..', 'archive'))
 TEMPDIR = tempfile.mkdtemp(prefix='deis')
 DEFAULT_BUILD = 'deis/helloworld'
 
@@ -1,11 +1,18 @@
 from cStringIO import StringIO
 import base64
+import hashlib
 import os
 import random
 import re
+import string
 import subprocess
+import tarfile
+import threading
 import time
 
+from django.conf import settings
+import redis
+
 
 ROOT_DIR = os.path.join(os.getcwd(), 'coreos')
 if not os.path.exists(ROOT_DIR):
@@ -13,6 +20,506 @@ if not os.path.exists(ROOT_DIR):
 
 MATCH = re.compile('(?P<app>[a-z0-9-]+)_?(?P<version>v[0-9]+)?\.?(?P<c_type>[a-z]+)?.(?P<c_num>[0-9]+)')
 
+SSH_OPTIONS = ['-o', 'StrictHostKeyChecking=no',
+               '-o', 'UserKnownHostsFile=/dev/null',
+               '-o', 'LogLevel=ERROR']
+
+# seconds an idle control master lingers before ssh tears it down
+CONTROL_PERSIST = 600
+
+# exit code ssh uses to report its own (connection) failures
+SSH_ERROR = 255
+
+# bounds in seconds on how often the shared poller lists units
+POLL_MIN_INTERVAL = 1
+POLL_MAX_INTERVAL = 5
+
+# seconds between background probes of hosts that failed
+PROBE_INTERVAL = 15
+
+# weight given to the newest sample in a host's moving averages
+HEALTH_WEIGHT = 0.3
+
+# error rate past which a reachable host is only used when no other is
+MAX_ERROR_RATE = 0.5
+
+
+class SSHError(EnvironmentError):
+    """
+    SSH itself could not reach a host, as opposed to the command it ran failing.
+    """
+
+
+class SSHTransport(object):
+    """
+    A persistent, multiplexed SSH channel to a single cluster host.
+
+    The first command opens an OpenSSH control master; every later command
+    is sent as a new session over that already-authenticated connection,
+    so only one key exchange is paid per host instead of one per command.
+    """
+
+    def __init__(self, host, key_path, user='core'):
+        self.host = host
+        self.key_path = key_path
+        self.user = user
+        # a master is only reused by commands that would log in with the same key
+        key = hashlib.sha1(key_path).hexdigest()[:12]
+        self.control_path = os.path.join(ROOT_DIR, 'ctl-{user}@{host}-{key}'.format(**locals()))
+        self._lock = threading.Lock()
+        self._connected = False
+
+    def _ssh_args(self, *args):
+        return ['ssh', '-i', self.key_path] + SSH_OPTIONS + [
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath={}'.format(self.control_path),
+            '-o', 'ControlPersist={}'.format(CONTROL_PERSIST)] + list(args) + [
+            '{}@{}'.format(self.user, self.host)]
+
+    def connect(self):
+        """
+        Start the control master unless one is already serving this host
+        """
+        with self._lock:
+            if self._connected:
+                return
+            if not self._alive():
+                with open(os.devnull, 'w') as devnull:
+                    subprocess.check_call(self._ssh_args('-M', '-N', '-f'),
+                                          stdout=devnull, stderr=devnull)
+            self._connected = True
+
+    def close(self):
+        """
+        Tear down the control master
+        """
+        with self._lock:
+            with open(os.devnull, 'w') as devnull:
+                subprocess.call(self._ssh_args('-O', 'exit'), stdout=devnull, stderr=devnull)
+            self._connected = False
+
+    def run(self, command, data=None):
+        """
+        Run a command on the host, optionally streaming data to its stdin
+
+        Commands may exit with the code ssh uses for its own failures, so
+        that code only counts as a lost connection once the master is found
+        gone; only then is the command sent again, once.
+
+        :return: a tuple of the command's exit code and combined output
+        :raises SSHError: if the host cannot be reached
+        """
+        self.connect()
+        rc, output = self._exec(command, data)
+        if rc == SSH_ERROR and not self._alive():
+            # the master went away underneath us; reconnect and retry once
+            self._connected = False
+            self.connect()
+            rc, output = self._exec(command, data)
+            if rc == SSH_ERROR and not self._alive():
+                self._connected = False
+                raise SSHError(rc, output)
+        return rc, output
+
+    def _alive(self):
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call(self._ssh_args('-O', 'check'),
+                                   stdout=devnull, stderr=devnull) == 0
+
+    def _exec(self, command, data):
+        p = subprocess.Popen(self._ssh_args() + [command],
+                             stdin=subprocess.PIPE if data is not None else None,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output, _ = p.communicate(data)
+        return p.returncode, output
+
+    def check_output(self, command, data=None):
+        """
+        Run a command on the host, raising CalledProcessError on failure
+        """
+        rc, output = self.run(command, data)
+        if rc != 0:
+            raise subprocess.CalledProcessError(rc, command, output)
+        return output
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(host, key_path, transport_class=SSHTransport):
+    """
+    Return the shared transport for a host, creating it on first use
+
+    Transports are pooled per process so every FleetClient built for the
+    same cluster reuses a single multiplexed connection to each host.
+    """
+    key = (host, key_path)
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = transport_class(host, key_path)
+    return transport
+
+
+class HostSelector(object):
+    """
+    Chooses which host of a cluster to send commands to.
+
+    Each host's latency and error rate are tracked as moving averages and
+    hosts are ranked fastest healthy host first. A host that fails is taken
+    out of rotation, and a background thread probes it until it answers
+    again, so callers never wait on a host that is known to be down.
+    """
+
+    def __init__(self, hosts, probe):
+        self.hosts = hosts
+        self.probe = probe
+        self.latency = dict((host, None) for host in hosts)
+        self.errors = dict((host, 0.0) for host in hosts)
+        self.down = set()
+        self.interval = PROBE_INTERVAL
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ranked(self):
+        """
+        Return every host, the one to try first leading
+
+        Healthy hosts come first by latency, with unmeasured hosts tried
+        before measured ones; hosts that are down or erroring come last.
+        """
+        with self._lock:
+            return sorted(self.hosts, key=lambda host: (
+                host in self.down, self.errors[host] >= MAX_ERROR_RATE,
+                self.latency[host] or 0, random.random()))
+
+    def succeeded(self, host, latency=None):
+        with self._lock:
+            old = self.latency[host]
+            if latency is not None:
+                self.latency[host] = latency if old is None else \
+                    old + HEALTH_WEIGHT * (latency - old)
+            self.errors[host] -= HEALTH_WEIGHT * self.errors[host]
+            self.down.discard(host)
+
+    def failed(self, host):
+        with self._lock:
+            self.errors[host] += HEALTH_WEIGHT * (1 - self.errors[host])
+            self.down.add(host)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._probe_down)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _probe_down(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                hosts = list(self.down)
+                if not hosts:
+                    self._thread = None
+                    return
+            for host in hosts:
+                start = time.time()
+                try:
+                    ok = self.probe(host)
+                except Exception:
+                    ok = False
+                if ok:
+                    self.succeeded(host, time.time() - start)
+                else:
+                    with self._lock:
+                        self.errors[host] += HEALTH_WEIGHT * (1 - self.errors[host])
+
+
+_selectors = {}
+_selectors_lock = threading.Lock()
+
+
+def get_selector(key, hosts, probe):
+    """
+    Return the shared host selector for a cluster, creating it on first use
+
+    :param key: identifies the cluster the selector chooses hosts for
+    :param probe: called with a host that is down; returns True once it answers
+    """
+    key = (key, tuple(hosts))
+    with _selectors_lock:
+        selector = _selectors.get(key)
+        if selector is None:
+            selector = _selectors[key] = HostSelector(hosts, probe)
+    return selector
+
+
+class UnitWaiter(object):
+    """
+    A single caller waiting for a unit to reach a given state.
+    """
+
+    def __init__(self, unit, state, deadline):
+        self.unit = unit
+        self.state = state
+        self.deadline = deadline
+        self.reached = False
+        self._event = threading.Event()
+
+    def done(self, reached):
+        self.reached = reached
+        self._event.set()
+
+    def wait(self):
+        """
+        Block until the unit reaches its state or the deadline passes
+
+        :return: True if the unit reached its state in time
+        """
+        self._event.wait(max(self.deadline - time.time(), 0) + POLL_MAX_INTERVAL)
+        return self.reached
+
+
+class UnitStatePoller(object):
+    """
+    Tracks unit states for every waiter on a cluster with one shared listing.
+
+    A background thread fetches `fleetctl list-units` once per tick while
+    anyone is waiting and wakes each waiter when its unit reaches the wanted
+    state or its deadline passes. The tick backs off while nothing changes
+    and snaps back to the minimum whenever a waiter is added or released.
+    """
+
+    def __init__(self, list_units):
+        self.list_units = list_units
+        self._waiters = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def watch(self, unit, state='running', timeout=1200):
+        """
+        Register interest in a unit reaching a state within timeout seconds
+        """
+        waiter = UnitWaiter(unit, state, time.time() + timeout)
+        with self._lock:
+            self._waiters.append(waiter)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll)
+                self._thread.daemon = True
+                self._thread.start()
+        self._wakeup.set()
+        return waiter
+
+    def _poll(self):
+        interval = POLL_MIN_INTERVAL
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._thread = None
+                    return
+            try:
+                units = self.list_units()
+            except subprocess.CalledProcessError:
+                units = {}
+            now = time.time()
+            released = False
+            with self._lock:
+                for waiter in list(self._waiters):
+                    if units.get(waiter.unit) == waiter.state:
+                        waiter.done(True)
+                    elif now >= waiter.deadline:
+                        waiter.done(False)
+                    else:
+                        continue
+                    self._waiters.remove(waiter)
+                    released = True
+            interval = POLL_MIN_INTERVAL if released else min(interval * 2, POLL_MAX_INTERVAL)
+            if self._wakeup.wait(interval):
+                interval = POLL_MIN_INTERVAL
+            self._wakeup.clear()
+
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def get_poller(key, list_units):
+    """
+    Return the shared unit state poller for a cluster, creating it on first use
+
+    :param key: identifies the cluster the poller watches
+    :param list_units: returns a dict mapping each unit in the cluster to its sub-state
+    """
+    with _pollers_lock:
+        poller = _pollers.get(key)
+        if poller is None:
+            poller = _pollers[key] = UnitStatePoller(list_units)
+    return poller
+
+
+class UnitTemplate(object):
+    """
+    A unit template parsed once into its literal text and field names.
+
+    Rendering then only joins strings, instead of re-parsing the template
+    with str.format on every call.
+    """
+
+    def __init__(self, template):
+        self.parts = [(literal, field) for literal, field, _, _
+                      in string.Formatter().parse(template)]
+
+    def render(self, fields):
+        return ''.join(literal + (fields[field] if field is not None else '')
+                       for literal, field in self.parts)
+
+
+_templates = {}
+
+
+def compile_template(template):
+    """
+    Return the precompiled form of a unit template, parsing it on first use
+    """
+    compiled = _templates.get(template)
+    if compiled is None:
+        compiled = _templates[template] = UnitTemplate(template)
+    return compiled
+
+
+def render_units(name, image, command='', template=None, use_announcer=True):
+    """
+    Render the fleet units for a job as a list of (unit name, body) tuples
+    """
+    fields = {'name': name, 'image': image, 'command': command}
+    fields.update(re.match(MATCH, name).groupdict())
+    units = [(name + '.service', compile_template(template or CONTAINER_TEMPLATE).render(fields)),
+             (name + '-log.service', compile_template(LOG_TEMPLATE).render(fields))]
+    if use_announcer:
+        units.append((name + '-announce.service',
+                      compile_template(ANNOUNCE_TEMPLATE).render(fields)))
+    return units
+
+
+class UnitIndex(object):
+    """
+    Remembers a hash of every unit body submitted to a cluster.
+
+    Submitting a unit whose body fleet already has is a no-op, so callers
+    use the index to drop those units before talking to the cluster. The
+    index lives in Redis when a URL is configured so it survives restarts
+    and is shared across workers; it always keeps a local copy as well,
+    and any Redis error simply makes lookups miss.
+
+    Entries are trusted for at most ttl seconds after they were recorded,
+    in case fleet lost a unit some way the index never heard of.
+    """
+
+    def __init__(self, cluster_name, redis_url=None, ttl=None):
+        self.key = 'deis:scheduler:units:{}'.format(cluster_name)
+        self.ttl = ttl
+        self._local = {}
+        self._redis = redis.StrictRedis.from_url(redis_url) if redis_url else None
+
+    def _known(self, unit):
+        digest, recorded = self._local.get(unit, (None, None))
+        if self.ttl is not None and recorded is not None and time.time() - recorded >= self.ttl:
+            return None
+        return digest
+
+    def changed(self, units):
+        """
+        Return the (unit, body) tuples whose body differs from the one last submitted
+        """
+        if not units:
+            return []
+        names = [unit for unit, _ in units]
+        known = [self._known(unit) for unit in names]
+        if self._redis is not None and None in known:
+            try:
+                known = self._redis.hmget(self.key, names)
+            except redis.RedisError:
+                pass
+        return [(unit, body) for (unit, body), digest in zip(units, known)
+                if digest != _digest(body)]
+
+    def record(self, units):
+        """
+        Remember the bodies of units that were just submitted
+        """
+        digests = dict((unit, _digest(body)) for unit, body in units)
+        if not digests:
+            return
+        now = time.time()
+        self._local.update((unit, (digest, now)) for unit, digest in digests.items())
+        if self._redis is not None:
+            try:
+                # Redis expires the whole hash, so it lasts ttl past the latest record
+                pipe = self._redis.pipeline()
+                pipe.hmset(self.key, digests)
+                if self.ttl is not None:
+                    pipe.expire(self.key, self.ttl)
+                pipe.execute()
+            except redis.RedisError:
+                pass
+
+    def forget(self, names):
+        """
+        Drop units that were destroyed
+        """
+        if not names:
+            return
+        for unit in names:
+            self._local.pop(unit, None)
+        if self._redis is not None:
+            try:
+                self._redis.hdel(self.key, *names)
+            except redis.RedisError:
+                pass
+
+    def purge(self):
+        """
+        Drop every unit, as when the cluster itself is torn down
+        """
+        self._local.clear()
+        if self._redis is not None:
+            try:
+                self._redis.delete(self.key)
+            except redis.RedisError:
+                pass
+
+
+def _digest(body):
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_unit_index(cluster_name):
+    """
+    Return the shared unit index for a cluster, creating it on first use
+    """
+    with _indexes_lock:
+        index = _indexes.get(cluster_name)
+        if index is None:
+            index = _indexes[cluster_name] = UnitIndex(
+                cluster_name, getattr(settings, 'SCHEDULER_UNIT_CACHE', None),
+                getattr(settings, 'SCHEDULER_UNIT_CACHE_TTL', None))
+    return index
+
+
+def purge_unit_index(cluster_name):
+    """
+    Drop a cluster's unit index, shared copy and all, once the cluster is gone
+    """
+    with _indexes_lock:
+        index = _indexes.pop(cluster_name, None)
+    if index is None:
+        index = UnitIndex(cluster_name, getattr(settings, 'SCHEDULER_UNIT_CACHE', None))
+    index.purge()
+
+
 class FleetClient(object):
 
     def __init__(self, cluster_name, hosts, auth, domain, options):
@@ -21,16 +528,16 @@ class FleetClient(object):
         self.domain = domain
         self.options = options
         self.auth = auth
-        self.auth_path = os.path.join(ROOT_DIR, 'ssh-{cluster_name}'.format(**locals()))
+        # named for the key too, so a cluster's new key never shares its old
+        # key's connections
+        key = hashlib.sha1(auth).hexdigest()[:12]
+        self.auth_path = os.path.join(ROOT_DIR, 'ssh-{cluster_name}-{key}'.format(**locals()))
         with open(self.auth_path, 'w') as f:
             f.write(base64.b64decode(auth))
             os.chmod(self.auth_path, 0600)
-
-        self.env = {
-            'PATH': '/usr/local/bin:/usr/bin:/bin:{}'.format(
-                os.path.abspath(os.path.join(__file__, '..'))),
-            'FLEETW_KEY': self.auth_path,
-            'FLEETW_HOST': random.choice(self.hosts.split(','))}
+        self.selector = get_selector(self.name, self.hosts.split(','), self._probe)
+        self.poller = get_poller(self.name, self._list_units)
+        self.unit_index = get_unit_index(self.name)
 
     # scheduler setup / teardown
 
@@ -44,7 +551,7 @@ class FleetClient(object):
         """
         Tear down a CoreOS cluster including router and log aggregator
         """
-        return
+        purge_unit_index(self.name)
 
     # announcer helpers
 
@@ -54,159 +561,195 @@ class FleetClient(object):
         """
         print "-- skipping announcer {} for {}".format(action, name)
 
+    # transport helpers
+
+    def _get_transport(self):
+        return get_transport(self.selector.ranked()[0], self.auth_path)
+
+    transport = property(_get_transport)
+
+    def _probe(self, host):
+        return get_transport(host, self.auth_path).run('true')[0] == 0
+
+    def _run(self, command, data=None, timed=True):
+        """
+        Run a command on the best host, failing over to the next one whenever
+        a host cannot be reached
+
+        Only a failure to reach a host fails over; whatever the command
+        exits with once it ran, including ssh's own 255, is returned as is
+        so it never runs twice. Pass timed=False for commands that block on
+        the cluster rather than the host, so they do not skew the host's
+        latency.
+        """
+        for host in self.selector.ranked():
+            start = time.time()
+            try:
+                rc, output = get_transport(host, self.auth_path).run(command, data)
+            except (EnvironmentError, subprocess.CalledProcessError) as e:
+                rc, output = SSH_ERROR, str(e)
+                self.selector.failed(host)
+                continue
+            self.selector.succeeded(host, time.time() - start if timed else None)
+            return rc, output
+        return rc, output
+
+    def _check_output(self, command, data=None, timed=True):
+        rc, output = self._run(command, data, timed)
+        if rc != 0:
+            raise subprocess.CalledProcessError(rc, command, output)
+        return output
+
+    # fleetctl helpers
+
+    def _fleetctl(self, args, timed=True):
+        return self._check_output('fleetctl {args}'.format(**locals()), timed=timed)
+
+    def _submit(self, units):
+        """
+        Stream unit bodies to the host and submit them in a single session
+        """
+        archive = StringIO()
+        tar = tarfile.open(fileobj=archive, mode='w')
+        for unit, body in units:
+            body = body.encode('utf-8')
+            info = tarfile.TarInfo(unit.encode('utf-8'))
+            info.size = len(body)
+            info.mtime = time.time()
+            tar.addfile(info, StringIO(body))
+        tar.close()
+        # fleetctl only submits units from disk, so the bodies land in a
+        # scratch directory on the host that is removed in the same session
+        return self._check_output(
+            'd=$(mktemp -d) && tar -x -C $d && fleetctl submit $d/*; rc=$?; rm -rf $d; exit $rc',
+            data=archive.getvalue())
+
+    def _list_units(self):
+        lines = self._fleetctl('list-units').splitlines()
+        if not lines:
+            return {}
+        header = lines[0].split()
+        sub = header.index('SUB') if 'SUB' in header else 4
+        units = {}
+        for line in lines[1:]:
+            fields = line.split()
+            if len(fields) > sub:
+                units[fields[0]] = fields[sub]
+        return units
+
     # job api
 
     def create(self, name, image, command='', template=None, use_announcer=True):
         """
         Create a new job
         """
-        print 'Creating {name}'.format(**locals())
-        env = self.env.copy()
-        self._create_container(name, image, command, template or CONTAINER_TEMPLATE, env)
-        self._create_log(name, image, command, LOG_TEMPLATE, env)
-
-        if use_announcer:
-            self._create_announcer(name, image, command, ANNOUNCE_TEMPLATE, env)
-        else:
-            self._log_skipped_announcer('create', name)
-
-    def _create_container(self, name, image, command, template, env):
-        l = locals().copy()
-        l.update(re.match(MATCH, name).groupdict())
-        env.update({'FLEETW_UNIT': name + '.service'})
-        env.update({'FLEETW_UNIT_DATA': base64.b64encode(template.format(**l))})
-        return subprocess.check_call('fleetctl.sh submit {name}.service'.format(**l),
-                                     shell=True, env=env)
-
-    def _create_announcer(self, name, image, command, template, env):
-        l = locals().copy()
-        l.update(re.match(MATCH, name).groupdict())
-        env.update({'FLEETW_UNIT': name + '-announce' + '.service'})
-        env.update({'FLEETW_UNIT_DATA': base64.b64encode(template.format(**l))})
-        return subprocess.check_call('fleetctl.sh submit {name}-announce.service'.format(**l),  # noqa
-                                     shell=True, env=env)
-
-    def _create_log(self, name, image, command, template, env):
-        l = locals().copy()
-        l.update(re.match(MATCH, name).groupdict())
-        env.update({'FLEETW_UNIT': name + '-log' + '.service'})
-        env.update({'FLEETW_UNIT_DATA': base64.b64encode(template.format(**l))})
-        return subprocess.check_call('fleetctl.sh submit {name}-log.service'.format(**locals()),  # noqa
-                                     shell=True, env=env)
+        self.create_many([{'name': name, 'image': image, 'command': command,
+                           'template': template, 'use_announcer': use_announcer}])
+
+    def create_many(self, jobs):
+        """
+        Create many new jobs, submitting all of their units at once
+        """
+        units = []
+        for job in jobs:
+            print 'Creating {name}'.format(**job)
+            if not job.get('use_announcer', True):
+                self._log_skipped_announcer('create', job['name'])
+            units.extend(render_units(**job))
+        units = self.unit_index.changed(units)
+        if units:
+            self._submit(units)
+            self.unit_index.record(units)
 
     def start(self, name, use_announcer=True):
         """
         Start an idle job
         """
-        print 'Starting {name}'.format(**locals())
-        env = self.env.copy()
-        self._start_container(name, env)
-        self._start_log(name, env)
-
-        if use_announcer:
-            self._start_announcer(name, env)
-            self._wait_for_announcer(name, env)
-        else:
-            self._log_skipped_announcer('start', name)
-
-    def _start_log(self, name, env):
-        subprocess.check_call(
-            'fleetctl.sh start -no-block {name}-log.service'.format(**locals()),
-            shell=True, env=env)
-
-    def _start_container(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh start -no-block {name}.service'.format(**locals()),
-            shell=True, env=env)
-
-    def _start_announcer(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh start -no-block {name}-announce.service'.format(**locals()),
-            shell=True, env=env)
-
-    def _wait_for_announcer(self, name, env):
-        status = None
+        self.start_many([{'name': name, 'use_announcer': use_announcer}])
+
+    def start_many(self, jobs):
+        """
+        Start many idle jobs with a single fleetctl call
+        """
+        units, announced = [], []
+        for job in jobs:
+            name = job['name']
+            print 'Starting {name}'.format(**locals())
+            units.extend(['{name}.service'.format(**locals()),
+                          '{name}-log.service'.format(**locals())])
+            if job.get('use_announcer', True):
+                units.append('{name}-announce.service'.format(**locals()))
+                announced.append(name)
+            else:
+                self._log_skipped_announcer('start', name)
+        try:
+            self._fleetctl('start -no-block {}'.format(' '.join(units)))
+        except subprocess.CalledProcessError:
+            # fleet may have lost units the index still remembers submitting,
+            # so forget them and submit the jobs again before one more try
+            self.unit_index.forget(units)
+            resubmit = [job for job in jobs if 'image' in job]
+            if len(resubmit) < len(jobs):
+                raise
+            self.create_many(resubmit)
+            self._fleetctl('start -no-block {}'.format(' '.join(units)))
+        self._wait_for_announcers(announced)
+
+    def _wait_for_announcers(self, names):
         # we bump to 20 minutes here to match the timeout on the router and in the app unit files
-        for _ in range(1200):
-            status = subprocess.check_output(
-                "fleetctl.sh list-units | grep {name}-announce.service | awk '{{print $5}}'".format(**locals()),
-                shell=True, env=env).strip('\n')
-            if status == 'running':
-                break
-            time.sleep(1)
-        else:
+        waiters = [self.poller.watch('{}-announce.service'.format(name), 'running', timeout=1200)
+                   for name in names]
+        if not all([waiter.wait() for waiter in waiters]):
             raise RuntimeError('Container failed to start')
 
     def stop(self, name, use_announcer=True):
         """
         Stop a running job
         """
-        print 'Stopping {name}'.format(**locals())
-        env = self.env.copy()
+        self.stop_many([{'name': name, 'use_announcer': use_announcer}])
 
-        if use_announcer:
-            self._stop_announcer(name, env)
-        else:
-            self._log_skipped_announcer('stop', name)
-
-        self._stop_container(name, env)
-        self._stop_log(name, env)
-
-    def _stop_container(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh stop -block-attempts=600 {name}.service'.format(**locals()),
-            shell=True, env=env)
-
-    def _stop_announcer(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh stop -block-attempts=600 {name}-announce.service'.format(**locals()),
-            shell=True, env=env)
-
-    def _stop_log(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh stop -block-attempts=600 {name}-log.service'.format(**locals()),
-            shell=True, env=env)
+    def stop_many(self, jobs):
+        """
+        Stop many running jobs, announcers first so routing stops before the jobs do
+        """
+        announcers, units = self._split_units(jobs, 'stop', 'Stopping')
+        if announcers:
+            self._fleetctl('stop -block-attempts=600 {}'.format(' '.join(announcers)), False)
+        self._fleetctl('stop -block-attempts=600 {}'.format(' '.join(units)), False)
 
     def destroy(self, name, use_announcer=True):
         """
         Destroy an existing job
         """
-        print 'Destroying {name}'.format(**locals())
-        env = self.env.copy()
+        self.destroy_many([{'name': name, 'use_announcer': use_announcer}])
 
-        if use_announcer:
-            self._destroy_announcer(name, env)
-        else:
-            self._log_skipped_announcer('destroy', name)
-
-        self._destroy_container(name, env)
-        self._destroy_log(name, env)
-
-    def _destroy_container(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh destroy {name}.service'.format(**locals()),
-            shell=True, env=env)
-
-    def _destroy_announcer(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh destroy {name}-announce.service'.format(**locals()),
-            shell=True, env=env)
-
-    def _destroy_log(self, name, env):
-        return subprocess.check_call(
-            'fleetctl.sh destroy {name}-log.service'.format(**locals()),
-            shell=True, env=env)
+    def destroy_many(self, jobs):
+        """
+        Destroy many existing jobs with a single fleetctl call
+        """
+        announcers, units = self._split_units(jobs, 'destroy', 'Destroying')
+        self._fleetctl('destroy {}'.format(' '.join(announcers + units)))
+        self.unit_index.forget(announcers + units)
+
+    def _split_units(self, jobs, action, verb):
+        announcers, units = [], []
+        for job in jobs:
+            name = job['name']
+            print '{} {}'.format(verb, name)
+            if job.get('use_announcer', True):
+                announcers.append('{name}-announce.service'.format(**locals()))
+            else:
+                self._log_skipped_announcer(action, name)
+            units.extend(['{name}.service'.format(**locals()),
+                          '{name}-log.service'.format(**locals())])
+        return announcers, units
 
     def run(self, name, image, command):
         """
         Run a one-off command
         """
         print 'Running {name}'.format(**locals())
-        output = subprocess.PIPE
-        p = subprocess.Popen('fleetrun.sh {command}'.format(**locals()), shell=True, env=self.env,
-                             stdout=output, stderr=subprocess.STDOUT)
-        rc = p.wait()
-        return rc, p.stdout.read()
+        return self._run(command, timed=False)
 
     def attach(self, name):
         """
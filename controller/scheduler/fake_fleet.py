@@ -0,0 +1,130 @@
+"""
+An in-process stand-in for fleet's HTTP API.
+
+It keeps units in memory and launches them instantly, which is enough to
+test and benchmark the fleet_api scheduler without a CoreOS cluster:
+
+    python -m scheduler.fake_fleet [jobs]
+"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+import json
+import sys
+import threading
+import time
+import urllib
+import urlparse
+
+
+class FakeFleetHandler(BaseHTTPRequestHandler):
+
+    # keep connections alive like fleet does
+    protocol_version = 'HTTP/1.1'
+    # buffer each response into one write so keep-alive clients do not
+    # stall on delayed ACKs between the headers and the body
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, data=None):
+        body = json.dumps(data) if data is not None else ''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _unit_name(self):
+        path = urlparse.urlparse(self.path).path
+        prefix = '/fleet/v1/units/'
+        if path.startswith(prefix):
+            return urllib.unquote(path[len(prefix):])
+
+    def do_GET(self):
+        path = urlparse.urlparse(self.path).path
+        units = self.server.units
+        with self.server.lock:
+            if path == '/fleet/v1/units':
+                return self._send(200, {'units': units.values()})
+            if path == '/fleet/v1/state':
+                return self._send(200, {'states': [
+                    {'name': u['name'],
+                     'systemdSubState': 'running' if u['currentState'] == 'launched' else 'dead'}
+                    for u in units.values()]})
+            name = self._unit_name()
+            if name in units:
+                return self._send(200, units[name])
+        self._send(404, {'error': {'code': 404, 'message': 'unit does not exist'}})
+
+    def do_PUT(self):
+        name = self._unit_name()
+        data = json.loads(self.rfile.read(int(self.headers.getheader('Content-Length', 0))))
+        state = data.get('desiredState')
+        with self.server.lock:
+            unit = self.server.units.get(name)
+            if unit is None:
+                if 'options' not in data:
+                    return self._send(409, {'error': {'code': 409,
+                                                      'message': 'unit does not exist'}})
+                self.server.units[name] = {'name': name, 'options': data['options'],
+                                           'desiredState': state, 'currentState': state}
+                return self._send(201)
+            unit['desiredState'] = unit['currentState'] = state
+        self._send(204)
+
+    def do_DELETE(self):
+        with self.server.lock:
+            if self.server.units.pop(self._unit_name(), None) is None:
+                return self._send(404, {'error': {'code': 404,
+                                                  'message': 'unit does not exist'}})
+        self._send(204)
+
+
+class FakeFleetServer(ThreadingMixIn, HTTPServer):
+    """
+    Serve a fake fleet API on a local port from a background thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        HTTPServer.__init__(self, (host, port), FakeFleetHandler)
+        self.units = {}
+        self.lock = threading.Lock()
+        self.url = 'http://{}:{}'.format(*self.server_address)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def benchmark(jobs=100):
+    """
+    Time a full create/start/stop/destroy cycle against the fake fleet API
+    """
+    from scheduler import fleet_api
+    server = FakeFleetServer().start()
+    try:
+        client = fleet_api.SchedulerClient('benchmark', '127.0.0.1', '', 'benchmark.local',
+                                           {'fleet_api': server.url})
+        batch = [{'name': 'benchmark_v1.web.{}'.format(n), 'image': 'benchmark:v1',
+                  'command': 'start web', 'use_announcer': True} for n in range(1, jobs + 1)]
+        for action in ('create_many', 'start_many', 'stop_many', 'destroy_many'):
+            start = time.time()
+            getattr(client, action)(batch)
+            sys.stderr.write('{} {} jobs: {:.3f}s\n'.format(action, jobs, time.time() - start))
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,239 @@
+from cStringIO import StringIO
+import json
+import threading
+import urllib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scheduler import coreos
+
+
+# port fleet's HTTP API listens on when exposed over TCP
+DEFAULT_PORT = 49153
+
+# connections kept alive per fleet endpoint
+POOL_SIZE = 16
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url):
+    """
+    Return the shared keep-alive HTTP session for a fleet endpoint
+    """
+    with _sessions_lock:
+        session = _sessions.get(url)
+        if session is None:
+            session = _sessions[url] = requests.Session()
+            session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+    return session
+
+
+def unit_options(body):
+    """
+    Convert a unit file body into the list of options fleet's API expects
+    """
+    options, section = [], None
+    for line in body.splitlines():
+        line = line.strip()
+        if not line or line.startswith(('#', ';')):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            section = line[1:-1]
+            continue
+        name, value = line.split('=', 1)
+        options.append({'section': section, 'name': name, 'value': value})
+    return options
+
+
+class FleetHTTPClient(object):
+    """
+    Scheduler that drives fleet through its HTTP API.
+
+    Every call is a plain HTTP request over a pooled keep-alive session, so
+    creating, starting, stopping and destroying jobs forks no processes.
+    """
+
+    def __init__(self, cluster_name, hosts, auth, domain, options):
+        self.name = cluster_name
+        self.hosts = hosts
+        self.domain = domain
+        self.options = options or {}
+        self.auth = auth
+        self.url = self.options.get('fleet_api') or 'http://{}:{}'.format(
+            self.hosts.split(',')[0], DEFAULT_PORT)
+        self.session = get_session(self.url)
+        self.poller = coreos.get_poller(self.url, self._list_units)
+        self.unit_index = coreos.get_unit_index(self.name)
+        self._ssh = None
+
+    # scheduler setup / teardown
+
+    def setUp(self):
+        """
+        Setup a CoreOS cluster including router and log aggregator
+        """
+        return
+
+    def tearDown(self):
+        """
+        Tear down a CoreOS cluster including router and log aggregator
+        """
+        coreos.purge_unit_index(self.name)
+
+    # fleet api helpers
+
+    def _unit_url(self, unit):
+        return '{}/fleet/v1/units/{}'.format(self.url, urllib.quote(unit))
+
+    def _put_unit(self, unit, data):
+        resp = self.session.put(self._unit_url(unit), data=json.dumps(data),
+                                headers={'Content-Type': 'application/json'})
+        resp.raise_for_status()
+
+    def _delete_unit(self, unit):
+        resp = self.session.delete(self._unit_url(unit))
+        # destroying a unit that is already gone is not an error
+        if resp.status_code != 404:
+            resp.raise_for_status()
+
+    def _list_units(self):
+        units, token = {}, None
+        while True:
+            params = {'nextPageToken': token} if token else {}
+            resp = self.session.get('{}/fleet/v1/state'.format(self.url), params=params)
+            resp.raise_for_status()
+            data = resp.json()
+            for state in data.get('states', []):
+                units[state['name']] = state.get('systemdSubState')
+            token = data.get('nextPageToken')
+            if not token:
+                return units
+
+    def _job_units(self, jobs):
+        """
+        List the units of many jobs, announcers first
+        """
+        announcers, units = [], []
+        for job in jobs:
+            name = job['name']
+            if job.get('use_announcer', True):
+                announcers.append('{name}-announce.service'.format(**locals()))
+            units.extend(['{name}.service'.format(**locals()),
+                          '{name}-log.service'.format(**locals())])
+        return announcers + units
+
+    # job api
+
+    def create(self, name, image, command='', template=None, use_announcer=True):
+        """
+        Create a new job
+        """
+        self.create_many([{'name': name, 'image': image, 'command': command,
+                           'template': template, 'use_announcer': use_announcer}])
+
+    def create_many(self, jobs):
+        """
+        Create many new jobs
+        """
+        units = []
+        for job in jobs:
+            print 'Creating {name}'.format(**job)
+            units.extend(coreos.render_units(**job))
+        for unit, body in self.unit_index.changed(units):
+            self._put_unit(unit, {'desiredState': 'inactive', 'options': unit_options(body)})
+            self.unit_index.record([(unit, body)])
+
+    def start(self, name, use_announcer=True):
+        """
+        Start an idle job
+        """
+        self.start_many([{'name': name, 'use_announcer': use_announcer}])
+
+    def start_many(self, jobs):
+        """
+        Start many idle jobs and wait for their announcers
+        """
+        for job in jobs:
+            print 'Starting {name}'.format(**job)
+            units = ['{name}.service'.format(**job), '{name}-log.service'.format(**job)]
+            if job.get('use_announcer', True):
+                units.append('{name}-announce.service'.format(**job))
+            try:
+                self._launch(units)
+            except requests.HTTPError as e:
+                # fleet answers 409 for a unit it does not have, which the
+                # index may still remember submitting, so submit it again
+                if e.response.status_code != 409 or 'image' not in job:
+                    raise
+                self.unit_index.forget(units)
+                self.create_many([job])
+                self._launch(units)
+        # we bump to 20 minutes here to match the timeout on the router and in the app unit files
+        waiters = [self.poller.watch('{name}-announce.service'.format(**job), 'running', 1200)
+                   for job in jobs if job.get('use_announcer', True)]
+        if not all([waiter.wait() for waiter in waiters]):
+            raise RuntimeError('Container failed to start')
+
+    def _launch(self, units):
+        for unit in units:
+            self._put_unit(unit, {'desiredState': 'launched'})
+
+    def stop(self, name, use_announcer=True):
+        """
+        Stop a running job
+        """
+        self.stop_many([{'name': name, 'use_announcer': use_announcer}])
+
+    def stop_many(self, jobs):
+        """
+        Stop many running jobs, announcers first so routing stops before the jobs do
+        """
+        for job in jobs:
+            print 'Stopping {name}'.format(**job)
+        for unit in self._job_units(jobs):
+            self._put_unit(unit, {'desiredState': 'loaded'})
+
+    def destroy(self, name, use_announcer=True):
+        """
+        Destroy an existing job
+        """
+        self.destroy_many([{'name': name, 'use_announcer': use_announcer}])
+
+    def destroy_many(self, jobs):
+        """
+        Destroy many existing jobs
+        """
+        for job in jobs:
+            print 'Destroying {name}'.format(**job)
+        units = self._job_units(jobs)
+        for unit in units:
+            self._delete_unit(unit)
+        self.unit_index.forget(units)
+
+    def run(self, name, image, command):
+        """
+        Run a one-off command
+
+        fleet's API has no way to exec a command on a host, so this one
+        call still goes over the cluster's SSH transport.
+        """
+        return self._ssh_client.run(name, image, command)
+
+    @property
+    def _ssh_client(self):
+        # built on first use only, since it writes the cluster's key out
+        if self._ssh is None:
+            self._ssh = coreos.SchedulerClient(self.name, self.hosts, self.auth,
+                                               self.domain, self.options)
+        return self._ssh
+
+    def attach(self, name):
+        """
+        Attach to a job's stdin, stdout and stderr
+        """
+        return StringIO(), StringIO(), StringIO()
+
+SchedulerClient = FleetHTTPClient
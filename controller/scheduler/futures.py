@@ -0,0 +1,125 @@
+"""
+Future-returning access to the scheduler clients.
+
+Scheduler calls block on the network, so rather than giving every container
+its own short-lived thread, calls are queued onto one process-wide pool of
+long-lived workers whose size caps how many run at once.
+"""
+
+import Queue
+import sys
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+
+class Future(object):
+    """
+    The eventual outcome of a scheduler call.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exc_info = None
+
+    def set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._event.set()
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """
+        Block until the call finishes, then return its result or raise its error
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError('Scheduler call did not finish in time')
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+class Executor(object):
+    """
+    Runs calls on a bounded pool of long-lived worker threads.
+
+    Workers are started lazily as calls are submitted, up to max_workers,
+    and then live for the rest of the process.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a call and return the Future for its outcome
+        """
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        with self._lock:
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+        return future
+
+    def _work(self):
+        while True:
+            future, func, args, kwargs = self._queue.get()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+            finally:
+                # db connections are per thread, and these threads never end
+                # to have theirs closed, see https://code.djangoproject.com/ticket/22420
+                for conn in connections.all():
+                    if conn.connection is not None:
+                        conn.close()
+
+
+class AsyncSchedulerClient(object):
+    """
+    Wraps a scheduler client so each of its job calls returns a Future.
+
+    Any method of the wrapped client (create, start, stop, destroy, run and
+    the batched variants where supported) is available with the same
+    arguments; the call is queued on the executor instead of blocking.
+    """
+
+    def __init__(self, client, executor=None):
+        self.client = client
+        self.executor = executor or get_executor()
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def _submit(*args, **kwargs):
+            return self.executor.submit(method, *args, **kwargs)
+        return _submit
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process-wide executor, sized by settings.SCHEDULER_CONCURRENCY
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = Executor(getattr(settings, 'SCHEDULER_CONCURRENCY', 32))
+    return _executor
@@ -50,6 +50,30 @@ class MockSchedulerClient(object):
         """
         return {'state': 'inactive'}
 
+    def create_many(self, jobs):
+        """
+        Create many new jobs
+        """
+        return [{'state': 'inactive'} for _ in jobs]
+
+    def start_many(self, jobs):
+        """
+        Start many idle jobs
+        """
+        return [{'state': 'active'} for _ in jobs]
+
+    def stop_many(self, jobs):
+        """
+        Stop many running jobs
+        """
+        return [{'state': 'inactive'} for _ in jobs]
+
+    def destroy_many(self, jobs):
+        """
+        Destroy many existing jobs
+        """
+        return [{'state': 'inactive'} for _ in jobs]
+
     def run(self, name, image, command):
         """
         Run a one-off command